@@ -0,0 +1,126 @@
+# config/async_database.py
+import asyncio
+import os
+from dotenv import load_dotenv
+from psycopg import sql
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+
+load_dotenv()
+
+# Ожидание соединения для параллельного запроса в снимке, сек
+SNAPSHOT_WORKER_TIMEOUT = 1.0
+
+
+def build_conninfo():
+    """Строка подключения из тех же переменных окружения, что и у Database"""
+    return make_conninfo(
+        host=os.getenv('DB_HOST', 'localhost'),
+        dbname=os.getenv('DB_NAME', 'auto_service'),
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD', 'password'),
+        port=os.getenv('DB_PORT', '5432')
+    )
+
+
+class AsyncDatabase:
+    """Асинхронный аналог Database: один процесс обслуживает много сеансов без потока на каждый"""
+
+    def __init__(self, conninfo=None):
+        self.conninfo = conninfo or build_conninfo()
+        self.pool = None
+
+    async def open(self):
+        if self.pool is None:
+            self.pool = AsyncConnectionPool(
+                self.conninfo,
+                min_size=int(os.getenv('DB_POOL_MIN', '1')),
+                max_size=int(os.getenv('DB_POOL_MAX', '10')),
+                timeout=float(os.getenv('DB_POOL_TIMEOUT', '30')),
+                max_idle=float(os.getenv('DB_POOL_MAX_IDLE', '300')),
+                kwargs={'autocommit': True},
+                open=False
+            )
+            await self.pool.open()
+        return self
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def execute_query(self, query, params=None, fetch=False, transaction=False):
+        """Тот же контракт, что у Database.execute_query: список словарей или rowcount"""
+        if self.pool is None:
+            await self.open()
+
+        async with self.pool.connection() as conn:
+            if transaction:
+                async with conn.transaction():
+                    return await self._execute(conn, query, params, fetch)
+            return await self._execute(conn, query, params, fetch)
+
+    async def _execute(self, conn, query, params, fetch):
+        async with conn.cursor(row_factory=dict_row) as cursor:
+            await cursor.execute(query, params)
+            if fetch:
+                return await cursor.fetchall()
+            return cursor.rowcount
+
+    async def _fetch_in_snapshot(self, snapshot, query, params):
+        # Короткое ожидание покрывает открытие нового соединения пулом; дольше не ждем -
+        # запрос выполнит ведущее соединение
+        async with self.pool.connection(timeout=SNAPSHOT_WORKER_TIMEOUT) as conn:
+            async with conn.transaction():
+                await conn.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+                # SET не принимает серверные параметры - снимок подставляется литералом
+                await conn.execute(sql.SQL("SET TRANSACTION SNAPSHOT {}").format(sql.Literal(snapshot)))
+                return await self._execute(conn, query, params, True)
+
+    async def snapshot_queries(self, statements):
+        """Одновременное выполнение запросов (имя, запрос, параметры) в одном снимке данных
+
+        Как и Database.snapshot_queries: ведущее соединение держит снимок, остальные запросы
+        идут не более чем на max_size - 1 других соединениях. Запросы сверх этого и те, для
+        которых соединения не нашлось, выполняются на ведущем соединении, поэтому одновременные
+        отчеты не исчерпывают пул.
+        """
+        if self.pool is None:
+            await self.open()
+
+        async with self.pool.connection() as conn:
+            async with conn.transaction():
+                await conn.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+                cursor = await conn.execute("SELECT pg_export_snapshot()")
+                snapshot = (await cursor.fetchone())[0]
+
+                workers = max(min(len(statements) - 1, self.pool.max_size - 1), 0)
+                results = [None] * len(statements)
+                leftover = [0] + list(range(workers + 1, len(statements)))
+                fallback = []
+
+                async def run_leader():
+                    for index in leftover:
+                        _, query, params = statements[index]
+                        results[index] = await self._execute(conn, query, params, True)
+
+                async def run_worker(index):
+                    _, query, params = statements[index]
+                    try:
+                        results[index] = await self._fetch_in_snapshot(snapshot, query, params)
+                    except PoolTimeout:
+                        fallback.append(index)
+
+                # Ведущая транзакция остается открытой, пока остальные не получат снимок и не завершатся
+                await asyncio.gather(run_leader(), *[run_worker(index) for index in range(1, workers + 1)])
+                for index in fallback:
+                    _, query, params = statements[index]
+                    results[index] = await self._execute(conn, query, params, True)
+                return results
@@ -1,63 +1,838 @@
 import psycopg2
+from psycopg2 import errors, extensions
 from psycopg2.extras import RealDictCursor
+import hashlib
 import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from functools import lru_cache
 from dotenv import load_dotenv
+from config.query_stats import get_query_stats
 
 load_dotenv()
 
 
-class Database:
-    def __init__(self):
-        self.connection = None
+class PoolTimeoutError(Exception):
+    """Не удалось получить соединение из пула за отведенное время"""
+
+
+class PooledConnection(extensions.connection):
+    """Соединение пула с собственным кэшем подготовленных операторов"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = OrderedDict()
+
+
+# Строки в кавычках ('...', "...", $метка$...$метка$) и параметры psycopg2
+_PLACEHOLDER_RE = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*"|(\$\w*\$).*?\2)|%%|%s|%\((\w+)\)s""", re.S)
+
+
+@lru_cache(maxsize=256)
+def prepare_statement_text(query, interpolate=True):
+    """Имя оператора, текст для PREPARE ($1, $2, ...) и порядок именованных параметров
+
+    interpolate=False - запрос выполняется без параметров: psycopg2 тогда передает текст
+    как есть, и %% тоже не заменяется. Внутри строк в кавычках параметры не ищутся
+    (там %s - просто текст), заменяется только %% - так, как это сделал бы psycopg2.
+    """
+    names = []
+    positions = {}
+
+    def replace(match):
+        token = match.group(0)
+        if match.group(1) is not None:
+            return token.replace('%%', '%') if interpolate else token
+        if not interpolate:
+            return token
+        if token == '%%':
+            return '%'
+        name = match.group(3)
+        if name is None:
+            names.append(None)
+            return f"${len(names)}"
+        if name not in positions:
+            names.append(name)
+            positions[name] = len(names)
+        return f"${positions[name]}"
+
+    text = _PLACEHOLDER_RE.sub(replace, query)
+    digest = hashlib.md5(text.encode('utf-8')).hexdigest()[:16]
+    return f"ps_{digest}", text, tuple(names)
+
+
+class ConnectionPool:
+    """Потокобезопасный пул соединений PostgreSQL, общий для всего процесса"""
+
+    def __init__(self, minconn=1, maxconn=10, timeout=30.0, max_idle=300.0, check_idle=30.0,
+                 prepared_cache_size=64, **conn_params):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Некорректные размеры пула соединений")
+
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout          # ожидание свободного соединения, сек
+        self.max_idle = max_idle        # простой, после которого лишние соединения закрываются, сек
+        self.check_idle = check_idle    # простой, после которого соединение проверяется запросом, сек
+        self.prepared_cache_size = prepared_cache_size  # подготовленных операторов на соединение
+        self.conn_params = conn_params
+        self.closed = False
+
+        self._idle = []                 # [(соединение, время возврата в пул)]
+        self._size = 0                  # открытые соединения + резерв под открываемые
+        self._in_use = 0
+        self._waiting = 0
+        self._cond = threading.Condition(threading.Lock())
+        self._stats = {
+            'created': 0,
+            'discarded': 0,
+            'reaped': 0,
+            'checkouts': 0,
+            'timeouts': 0,
+            'wait_total': 0.0,
+            'wait_max': 0.0,
+            'prepared_hits': 0,
+            'prepared_misses': 0,
+            'prepared_evictions': 0,
+        }
+
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._size += 1
+
+    def _connect(self):
+        conn = psycopg2.connect(connection_factory=PooledConnection, **self.conn_params)
+        conn.autocommit = True
+        with self._cond:
+            self._stats['created'] += 1
+        return conn
+
+    def count(self, key, value=1):
+        """Увеличение счетчика статистики"""
+        with self._cond:
+            self._stats[key] += value
+
+    def _is_healthy(self, conn, idle_since):
+        """Проверка соединения перед выдачей"""
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() == extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        # Давно простаивающее соединение могло быть разорвано сервером
+        if time.monotonic() - idle_since > self.check_idle:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+            except psycopg2.Error:
+                return False
+        return True
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _reap_idle(self):
+        """Отбор простаивающих соединений сверх минимального размера (вызывается под блокировкой)"""
+        now = time.monotonic()
+        keep = []
+        reaped = []
+        for conn, since in self._idle:
+            if now - since > self.max_idle and self._size - len(reaped) > self.minconn:
+                reaped.append(conn)
+            else:
+                keep.append((conn, since))
+        self._idle = keep
+        self._size -= len(reaped)
+        self._stats['reaped'] += len(reaped)
+        return reaped
+
+    def getconn(self, timeout=None):
+        """Получение соединения из пула (ожидание не дольше timeout, по умолчанию self.timeout)
+
+        timeout=0 - без ожидания: PoolTimeoutError, если свободных соединений нет и пул полон.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        with self._cond:
+            while True:
+                if self.closed:
+                    raise PoolTimeoutError("Пул соединений закрыт")
+                if self._idle:
+                    conn, since = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    # Резервируем место, само соединение открываем вне блокировки
+                    self._size += 1
+                    conn, since = None, None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeoutError(
+                        f"Нет свободного соединения в пуле за {timeout} сек (максимум {self.maxconn})"
+                    )
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._in_use += 1
+
+        try:
+            if conn is not None and not self._is_healthy(conn, since):
+                self._close_quietly(conn)
+                with self._cond:
+                    self._stats['discarded'] += 1
+                conn = None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        waited = time.monotonic() - started
+        with self._cond:
+            self._stats['checkouts'] += 1
+            self._stats['wait_total'] += waited
+            self._stats['wait_max'] = max(self._stats['wait_max'], waited)
+        return conn
 
-    def get_connection(self):
-        if self.connection is None or self.connection.closed:
-            self.connection = psycopg2.connect(
+    def putconn(self, conn, close=False):
+        """Возврат соединения в пул"""
+        if not close:
+            try:
+                if conn.closed:
+                    close = True
+                else:
+                    if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                        conn.rollback()
+                    if not conn.autocommit:
+                        conn.autocommit = True
+            except psycopg2.Error:
+                close = True
+
+        with self._cond:
+            self._in_use -= 1
+            if close or self.closed:
+                self._size -= 1
+                self._stats['discarded'] += 1
+                to_close = [conn]
+            else:
+                self._idle.append((conn, time.monotonic()))
+                to_close = self._reap_idle()
+            self._cond.notify()
+
+        for item in to_close:
+            self._close_quietly(item)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Соединение из пула на время блока with"""
+        conn = self.getconn(timeout)
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.putconn(conn, close=broken)
+
+    def reap_idle(self):
+        """Принудительное закрытие давно простаивающих соединений"""
+        with self._cond:
+            reaped = self._reap_idle()
+        for conn in reaped:
+            self._close_quietly(conn)
+        return len(reaped)
+
+    def get_stats(self):
+        """Статистика пула: размер, занятые, ожидающие, задержка получения"""
+        with self._cond:
+            checkouts = self._stats['checkouts']
+            return {
+                'min': self.minconn,
+                'max': self.maxconn,
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'checkouts': checkouts,
+                'timeouts': self._stats['timeouts'],
+                'created': self._stats['created'],
+                'discarded': self._stats['discarded'],
+                'reaped': self._stats['reaped'],
+                'avg_wait_ms': (self._stats['wait_total'] / checkouts * 1000) if checkouts else 0.0,
+                'max_wait_ms': self._stats['wait_max'] * 1000,
+                'prepared_hits': self._stats['prepared_hits'],
+                'prepared_misses': self._stats['prepared_misses'],
+                'prepared_evictions': self._stats['prepared_evictions'],
+            }
+
+    def closeall(self):
+        """Закрытие всех простаивающих соединений и пула"""
+        with self._cond:
+            self.closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._size -= len(idle)
+            self._idle = []
+            self._cond.notify_all()
+        for conn in idle:
+            self._close_quietly(conn)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _pool_settings():
+    """Параметры пула из переменных окружения"""
+    return {
+        'minconn': int(os.getenv('DB_POOL_MIN', '1')),
+        'maxconn': int(os.getenv('DB_POOL_MAX', '10')),
+        'timeout': float(os.getenv('DB_POOL_TIMEOUT', '30')),
+        'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', '300')),
+        'check_idle': float(os.getenv('DB_POOL_CHECK_IDLE', '30')),
+        'prepared_cache_size': int(os.getenv('DB_PREPARED_CACHE_SIZE', '64')),
+    }
+
+
+def _credentials():
+    return {
+        'database': os.getenv('DB_NAME', 'auto_service'),
+        'user': os.getenv('DB_USER', 'postgres'),
+        'password': os.getenv('DB_PASSWORD', 'password'),
+    }
+
+
+def get_pool():
+    """Общий для процесса пул соединений (создается при первом обращении)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.closed:
+            _pool = ConnectionPool(
                 host=os.getenv('DB_HOST', 'localhost'),
-                database=os.getenv('DB_NAME', 'auto_service'),
-                user=os.getenv('DB_USER', 'postgres'),
-                password=os.getenv('DB_PASSWORD', 'password'),
-                port=os.getenv('DB_PORT', '5432')
+                port=os.getenv('DB_PORT', '5432'),
+                **_pool_settings(),
+                **_credentials()
             )
+        return _pool
 
-            self.connection.autocommit = True
-        return self.connection
 
-    def close_connection(self):
-        if self.connection and not self.connection.closed:
-            self.connection.close()
+class ReplicaRouter:
+    """Распределение читающих запросов по репликам
 
+    Реплики выбираются по кругу; недоступная реплика исключается на retry_after секунд,
+    реплика с отставанием больше max_lag секунд пропускается.
+    """
 
-    def execute_query(self, query, params=None, fetch=False, transaction=False):
-        conn = self.get_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+    LAG_QUERY = """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END AS lag
+    """
 
-        try:
-            if transaction:
-                conn.autocommit = False
+    def __init__(self, replicas, max_lag=5.0, retry_after=30.0, lag_check_interval=5.0):
+        self.replicas = [{'name': name, 'pool': pool, 'ejected_until': 0.0, 'lag': None, 'lag_checked': 0.0,
+                          'reads': 0, 'failures': 0}
+                         for name, pool in replicas]
+        self.max_lag = max_lag
+        self.retry_after = retry_after
+        self.lag_check_interval = lag_check_interval
+        self._lock = threading.Lock()
+        self._next = 0
+
+    def _lag_ok(self, replica):
+        """Проверка отставания (результат кэшируется на lag_check_interval)"""
+        now = time.monotonic()
+        if now - replica['lag_checked'] >= self.lag_check_interval:
+            with replica['pool'].connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(self.LAG_QUERY)
+                    replica['lag'] = float(cursor.fetchone()[0])
+            replica['lag_checked'] = now
+        return replica['lag'] <= self.max_lag
+
+    def choose(self):
+        """Следующая исправная реплика или None (читать с основного сервера)"""
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.replicas)
+
+        now = time.monotonic()
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            if replica['ejected_until'] > now:
+                continue
+            try:
+                if not self._lag_ok(replica):
+                    continue
+            except (psycopg2.Error, PoolTimeoutError):
+                self.eject(replica)
+                continue
+            with self._lock:
+                replica['reads'] += 1
+            return replica
+        return None
+
+    def eject(self, replica):
+        with self._lock:
+            replica['failures'] += 1
+            replica['ejected_until'] = time.monotonic() + self.retry_after
+
+    def get_status(self):
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                'name': replica['name'],
+                'healthy': replica['ejected_until'] <= now,
+                'lag': replica['lag'],
+                'reads': replica['reads'],
+                'failures': replica['failures'],
+                'pool': replica['pool'].get_stats(),
+            } for replica in self.replicas]
+
+    def closeall(self):
+        for replica in self.replicas:
+            replica['pool'].closeall()
+
+
+_router = None
+
+
+def get_router():
+    """Маршрутизатор реплик из DB_REPLICAS (None, если реплики не заданы)
+
+    DB_REPLICAS - список через запятую: host[:port] (учетные данные как у основного
+    сервера) или полный URI postgresql://...
+    """
+    global _router
+    with _pool_lock:
+        if _router is None:
+            replicas = []
+            settings = _pool_settings()
+            # Соединения с репликами открываются по требованию
+            settings['minconn'] = 0
+            for entry in os.getenv('DB_REPLICAS', '').split(','):
+                entry = entry.strip()
+                if not entry:
+                    continue
+                if '://' in entry:
+                    pool = ConnectionPool(dsn=entry, **settings)
+                else:
+                    host, _, port = entry.partition(':')
+                    pool = ConnectionPool(host=host, port=port or '5432', **settings, **_credentials())
+                replicas.append((entry, pool))
+            _router = ReplicaRouter(
+                replicas,
+                max_lag=float(os.getenv('DB_REPLICA_MAX_LAG', '5')),
+                retry_after=float(os.getenv('DB_REPLICA_RETRY', '30')),
+                lag_check_interval=float(os.getenv('DB_REPLICA_LAG_CHECK', '5'))
+            ) if replicas else False
+        return _router or None
+
+
+def close_pool():
+    """Закрытие общего пула соединений и пулов реплик (при завершении программы)"""
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+        if _router:
+            _router.closeall()
 
+
+class ReadSnapshot:
+    """Запросы в транзакции, открытой Database.read_snapshot"""
+
+    def __init__(self, db, conn):
+        self.db = db
+        self.conn = conn
+
+    def fetch(self, name, query, params=None):
+        """Все строки результата (время запроса учитывается в статистике под именем name)"""
+        with self.conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            return self.db._fetch_timed(cursor, name, query, params)
+
+    def stream(self, query, params=None, itersize=None):
+        """Построчная выдача через серверный курсор, порциями по itersize строк"""
+        if itersize is None:
+            itersize = int(os.getenv('DB_STREAM_ITERSIZE', '2000'))
+        cursor = self.conn.cursor(name=f"stream_{uuid.uuid4().hex}", cursor_factory=RealDictCursor)
+        cursor.itersize = itersize
+        try:
             cursor.execute(query, params)
+            for row in cursor:
+                yield row
+        finally:
+            cursor.close()
 
-            if fetch:
-                result = cursor.fetchall()
-            else:
-                result = cursor.rowcount
 
-            if transaction:
+class Database:
+    def __init__(self, pool=None, stats=None, router=None):
+        self.pool = pool if pool is not None else get_pool()
+        self.stats = stats if stats is not None else get_query_stats()
+        self.router = router if router is not None else get_router()
+        # Чтение своих записей: после записи чтения этого сеанса идут на основной сервер
+        self.read_your_writes = float(os.getenv('DB_READ_YOUR_WRITES', '5'))
+        self._last_write = None
+
+    def connection(self):
+        """Соединение из общего пула: with db.connection() as conn: ..."""
+        return self.pool.connection()
+
+    def close_connection(self):
+        # Соединения принадлежат общему пулу и закрываются через close_pool()
+        pass
+
+    def get_pool_stats(self):
+        return self.pool.get_stats()
+
+    def get_replica_status(self):
+        return self.router.get_status() if self.router else []
+
+    def _mark_write(self):
+        self._last_write = time.monotonic()
+
+    def _replica_for_read(self):
+        """Реплика для чтения или None, если читать нужно с основного сервера"""
+        if not self.router:
+            return None
+        if self._last_write is not None and time.monotonic() - self._last_write < self.read_your_writes:
+            return None
+        return self.router.choose()
+
+    @contextmanager
+    def transaction(self):
+        """Курсор в рамках одной транзакции: commit при успехе, rollback при ошибке"""
+        self._mark_write()
+        with self.connection() as conn:
+            conn.autocommit = False
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            try:
+                yield cursor
                 conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+                conn.autocommit = True
+
+    def _stream(self, pool, query, params, itersize):
+        with pool.connection() as conn:
+            # Именованный курсор существует только внутри транзакции
+            conn.autocommit = False
+            try:
+                yield from ReadSnapshot(self, conn).stream(query, params, itersize)
+            finally:
+                try:
+                    conn.rollback()
+                finally:
+                    conn.autocommit = True
+
+    def stream_query(self, query, params=None, itersize=None, readonly=False):
+        """Построчная выдача результата через серверный (именованный) курсор
+
+        Строки читаются с сервера порциями по itersize, поэтому память не зависит от
+        размера выборки. Соединение занято, пока генератор не исчерпан или не закрыт.
+        Реплика, недоступная до выдачи первой строки, исключается, и запрос повторяется
+        на основном сервере; после первой строки ошибка передается вызывающему.
+        """
+        if readonly:
+            replica = self._replica_for_read()
+            if replica is not None:
+                started = False
+                try:
+                    for row in self._stream(replica['pool'], query, params, itersize):
+                        started = True
+                        yield row
+                    return
+                except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                    if started:
+                        raise
+                    self.router.eject(replica)
+                except PoolTimeoutError:
+                    if started:
+                        raise
+        else:
+            self._mark_write()
+
+        yield from self._stream(self.pool, query, params, itersize)
+
+    @contextmanager
+    def _snapshot_connection(self, pool):
+        with pool.connection() as conn:
+            conn.autocommit = False
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+                yield conn
+            finally:
+                try:
+                    conn.rollback()
+                finally:
+                    conn.autocommit = True
+
+    @contextmanager
+    def read_snapshot(self, readonly=False):
+        """Читающая транзакция REPEATABLE READ: все запросы блока видят один снимок данных
+
+        with db.read_snapshot(readonly=True) as snapshot:
+            version = snapshot.fetch('data_version', queries.DATA_VERSION)
+            for row in snapshot.stream(query): ...
+
+        Соединение занято до выхода из блока. Если реплика недоступна при открытии
+        транзакции, она исключается и снимок открывается на основном сервере.
+        """
+        with ExitStack() as stack:
+            conn = None
+            if readonly:
+                replica = self._replica_for_read()
+                if replica is not None:
+                    try:
+                        conn = stack.enter_context(self._snapshot_connection(replica['pool']))
+                    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                        self.router.eject(replica)
+                    except PoolTimeoutError:
+                        pass
+            else:
+                self._mark_write()
+            if conn is None:
+                conn = stack.enter_context(self._snapshot_connection(self.pool))
+            yield ReadSnapshot(self, conn)
+
+    def _fetch_timed(self, cursor, name, query, params):
+        started = time.perf_counter()
+        try:
+            cursor.execute(query, params)
+            result = cursor.fetchall()
+        except Exception:
+            self.stats.record_error(name)
+            raise
+        self.stats.record(name, time.perf_counter() - started, len(result), query)
+        return result
 
-            return result
+    def _fetch_in_snapshot(self, pool, snapshot, name, query, params):
+        """Запрос на отдельном соединении в снимке, экспортированном ведущим соединением
 
-        except Exception as e:
-            if transaction:
+        Соединение берется без ожидания: если пул занят, PoolTimeoutError возникает сразу
+        и запрос выполняется на ведущем соединении.
+        """
+        with pool.connection(timeout=0) as conn:
+            conn.autocommit = False
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            try:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+                cursor.execute("SET TRANSACTION SNAPSHOT %s", (snapshot,))
+                return self._fetch_timed(cursor, name, query, params)
+            finally:
+                cursor.close()
                 conn.rollback()
-            raise e
+                conn.autocommit = True
 
-        finally:
-            cursor.close()
-            if transaction:
+    def _snapshot_queries(self, pool, statements):
+        with pool.connection() as conn:
+            conn.autocommit = False
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            try:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+                cursor.execute("SELECT pg_export_snapshot() AS snapshot")
+                snapshot = cursor.fetchone()['snapshot']
+
+                # Одно соединение занято ведущей транзакцией, остальные запросы - на других
+                workers = min(len(statements) - 1, pool.maxconn - 1)
+                results = [None] * len(statements)
+                leftover = list(range(1, len(statements)))
+
+                if workers > 0:
+                    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="snapshot-query") as executor:
+                        futures = {index: executor.submit(self._fetch_in_snapshot, pool, snapshot,
+                                                          *statements[index])
+                                   for index in leftover}
+                        # Снимок действителен, пока открыта ведущая транзакция: она ждет всех
+                        results[0] = self._fetch_timed(cursor, *statements[0])
+                        leftover = []
+                        for index, future in futures.items():
+                            try:
+                                results[index] = future.result()
+                            except PoolTimeoutError:
+                                # Свободных соединений не нашлось - выполним на ведущем
+                                leftover.append(index)
+                else:
+                    leftover.insert(0, 0)
+
+                for index in leftover:
+                    results[index] = self._fetch_timed(cursor, *statements[index])
+                return results
+            finally:
+                cursor.close()
+                conn.rollback()
                 conn.autocommit = True
 
+    def snapshot_queries(self, statements, readonly=False):
+        """Одновременное выполнение читающих запросов в одном согласованном снимке данных
+
+        statements - список (имя, запрос, параметры). Ведущее соединение открывает транзакцию
+        REPEATABLE READ и экспортирует снимок (pg_export_snapshot), остальные запросы идут
+        в потоках на других соединениях пула с тем же снимком. Время ответа близко ко времени
+        самого долгого запроса, а не к сумме. Возвращает списки строк в порядке statements.
+        """
+        if readonly:
+            replica = self._replica_for_read()
+            if replica is not None:
+                try:
+                    return self._snapshot_queries(replica['pool'], statements)
+                except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                    self.router.eject(replica)
+                except PoolTimeoutError:
+                    pass
+        else:
+            self._mark_write()
+
+        return self._snapshot_queries(self.pool, statements)
+
+    def _execute_prepared(self, pool, conn, cursor, query, params, touched=None):
+        """Выполнение через PREPARE/EXECUTE с LRU-кэшем операторов на соединении
+
+        touched - список, в который записываются имена, подготовленные или удаленные
+        в текущей транзакции (при ее откате кэш сверяется с сервером, см. _forget_prepared).
+        """
+        name, text, names = prepare_statement_text(query, params is not None)
+        cache = conn.prepared
+
+        if name in cache:
+            cache.move_to_end(name)
+            pool.count('prepared_hits')
+        else:
+            pool.count('prepared_misses')
+            while cache and len(cache) >= pool.prepared_cache_size:
+                evicted, _ = cache.popitem(last=False)
+                if touched is not None:
+                    touched.append(evicted)
+                cursor.execute(f"DEALLOCATE {evicted}")
+                pool.count('prepared_evictions')
+            if touched is not None:
+                touched.append(name)
+            cursor.execute(f"PREPARE {name} AS {text}")
+            cache[name] = True
+
+        if isinstance(params, dict):
+            args = tuple(params[key] for key in names)
+        else:
+            args = tuple(params or ())
+
+        if args:
+            cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(args))})", args)
+        else:
+            cursor.execute(f"EXECUTE {name}")
+
+    def _forget_prepared(self, conn, cursor, names):
+        """Сверка кэша операторов с сервером после отката транзакции
+
+        Операторы, подготовленные или удаленные в откаченной транзакции, удаляются и из
+        кэша, и с сервера: следующий вызов подготовит их заново. Вызывается после rollback.
+        """
+        conn.autocommit = True
+        for name in names:
+            conn.prepared.pop(name, None)
+            try:
+                cursor.execute(f"DEALLOCATE {name}")
+            except errors.InvalidSqlStatementName:
+                # На сервере оператора уже нет
+                pass
+            except psycopg2.Error:
+                # Соединение неисправно и будет закрыто пулом
+                conn.prepared.clear()
+                return
+
+    def execute_query(self, query, params=None, fetch=False, transaction=False, prepare=False, name=None,
+                      readonly=False):
+        """Выполнение запроса
+
+        name - имя для статистики (по умолчанию начало текста запроса);
+        readonly=True - запрос только читает и может быть выполнен на реплике.
+        """
+        if name is None:
+            name = ' '.join(query.split())[:40]
+
+        if readonly and not transaction:
+            replica = self._replica_for_read()
+            if replica is not None:
+                try:
+                    return self._execute(replica['pool'], query, params, fetch, False, prepare, name)
+                except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                    # Реплика недоступна - исключаем её и читаем с основного сервера
+                    self.router.eject(replica)
+                except PoolTimeoutError:
+                    pass
+        else:
+            self._mark_write()
+
+        return self._execute(self.pool, query, params, fetch, transaction, prepare, name)
+
+    def _execute(self, pool, query, params, fetch, transaction, prepare, name):
+        with pool.connection() as conn:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            started = time.perf_counter()
+            # Имена операторов, подготовленных или удаленных в транзакции этого вызова
+            touched = [] if transaction else None
+
+            try:
+                if transaction:
+                    conn.autocommit = False
+
+                if prepare:
+                    try:
+                        self._execute_prepared(pool, conn, cursor, query, params, touched)
+                    except errors.InvalidSqlStatementName:
+                        # Оператор удален на сервере (DEALLOCATE ALL/DISCARD) - подготавливаем заново;
+                        # в транзакции это сделает следующий вызов, текущая уже прервана
+                        conn.prepared.clear()
+                        if not conn.autocommit:
+                            raise
+                        self._execute_prepared(pool, conn, cursor, query, params)
+                else:
+                    cursor.execute(query, params)
+
+                if fetch:
+                    result = cursor.fetchall()
+                else:
+                    result = cursor.rowcount
+
+                if transaction:
+                    conn.commit()
+
+                self.stats.record(name, time.perf_counter() - started,
+                                  len(result) if fetch else result, query)
+                return result
+
+            except Exception as e:
+                self.stats.record_error(name)
+                if transaction:
+                    conn.rollback()
+                    if touched:
+                        self._forget_prepared(conn, cursor, touched)
+                raise e
+
+            finally:
+                cursor.close()
+                if transaction:
+                    conn.autocommit = True
+
 class SecurityManager:
     def __init__(self):
         self.db = Database()
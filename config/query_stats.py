@@ -0,0 +1,122 @@
+# config/query_stats.py
+import os
+import threading
+from services.logger import Logger
+
+
+class LatencyHistogram:
+    """Гистограмма задержек в стиле HDR: логарифмические диапазоны с линейным делением внутри
+
+    Значения хранятся в микросекундах, относительная погрешность не больше 1 / 2**SUB_BUCKET_BITS.
+    """
+
+    SUB_BUCKET_BITS = 5
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def _bucket(self, value):
+        """Нижняя граница ячейки для значения"""
+        shift = value.bit_length() - 1 - self.SUB_BUCKET_BITS
+        if shift <= 0:
+            return value
+        return (value >> shift) << shift
+
+    def _bucket_width(self, lower):
+        shift = lower.bit_length() - 1 - self.SUB_BUCKET_BITS
+        return 1 << shift if shift > 0 else 1
+
+    def record(self, micros):
+        micros = max(int(micros), 0)
+        bucket = self._bucket(micros)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += micros
+        self.max = max(self.max, micros)
+
+    def percentile(self, percent):
+        """Значение перцентиля (середина ячейки), мкс"""
+        if not self.count:
+            return 0
+        target = max(1, int(round(self.count * percent / 100.0)))
+        seen = 0
+        for lower in sorted(self.counts):
+            seen += self.counts[lower]
+            if seen >= target:
+                return min(lower + self._bucket_width(lower) // 2, self.max)
+        return self.max
+
+
+class QueryStats:
+    """Статистика выполнения именованных запросов и журнал медленных запросов"""
+
+    def __init__(self, slow_threshold_ms=500.0, logger=None):
+        self.slow_threshold_ms = slow_threshold_ms
+        self.logger = logger or Logger()
+        self._lock = threading.Lock()
+        self._queries = {}
+
+    def _entry(self, name):
+        entry = self._queries.get(name)
+        if entry is None:
+            entry = {'histogram': LatencyHistogram(), 'rows': 0, 'errors': 0}
+            self._queries[name] = entry
+        return entry
+
+    def record(self, name, seconds, rows, query):
+        with self._lock:
+            entry = self._entry(name)
+            entry['histogram'].record(seconds * 1000000)
+            entry['rows'] += rows if rows and rows > 0 else 0
+
+        elapsed_ms = seconds * 1000
+        if elapsed_ms >= self.slow_threshold_ms:
+            text = ' '.join(query.split())
+            self.logger.log("db", "SLOW_QUERY",
+                            f"{name}: {elapsed_ms:.1f} мс, строк: {rows}, запрос: {text[:300]}")
+
+    def record_error(self, name):
+        with self._lock:
+            self._entry(name)['errors'] += 1
+
+    def snapshot(self):
+        """Статистика по запросам, отсортированная по суммарному времени"""
+        with self._lock:
+            result = []
+            for name, entry in self._queries.items():
+                histogram = entry['histogram']
+                result.append({
+                    'name': name,
+                    'count': histogram.count,
+                    'errors': entry['errors'],
+                    'total_ms': histogram.total / 1000,
+                    'avg_ms': histogram.total / histogram.count / 1000 if histogram.count else 0.0,
+                    'p50_ms': histogram.percentile(50) / 1000,
+                    'p95_ms': histogram.percentile(95) / 1000,
+                    'p99_ms': histogram.percentile(99) / 1000,
+                    'max_ms': histogram.max / 1000,
+                    'rows': entry['rows'],
+                    'avg_rows': entry['rows'] / histogram.count if histogram.count else 0.0,
+                })
+        result.sort(key=lambda item: item['total_ms'], reverse=True)
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._queries = {}
+
+
+_query_stats = None
+_query_stats_lock = threading.Lock()
+
+
+def get_query_stats():
+    """Общая для процесса статистика запросов"""
+    global _query_stats
+    with _query_stats_lock:
+        if _query_stats is None:
+            _query_stats = QueryStats(slow_threshold_ms=float(os.getenv('DB_SLOW_QUERY_MS', '500')))
+        return _query_stats
@@ -1,10 +1,25 @@
 # main.py
 from services.auto_service import AutoService
 from models.models import AutoServiceModels
+from models.migrator import MigrationError
 from config.auth import AuthManager
 from services.logger import Logger
+from services.log_rotation import get_log_rotator
+from services.log_analytics import LogAnalytics
 from services.backup import BackupService
+from services.importer import BulkImporter
+from services.rollups import ReportRollups
+from services.plan_advisor import PlanAdvisor, merge_proposals
+from config.database import close_pool
+import csv
+import itertools
 import os
+import sys
+from datetime import datetime
+
+# Строк на странице при просмотре списков
+PAGE_SIZE = 20
+REPORT_TOP_N = 3
 
 
 def print_results(results, title):
@@ -13,12 +28,15 @@ def print_results(results, title):
     print(f"{title:^60}")
     print(f"{'=' * 60}")
 
-    if not results:
+    # results может быть списком или генератором строк (потоковая выборка)
+    rows = iter(results or [])
+    first = next(rows, None)
+    if first is None:
         print("Данные не найдены")
         return
 
     # Получаем названия колонок
-    columns = list(results[0].keys())
+    columns = list(first.keys())
 
     # Выводим заголовки
     header = " | ".join(str(col).ljust(20) for col in columns)
@@ -26,11 +44,38 @@ def print_results(results, title):
     print("-" * len(header))
 
     # Выводим данные
-    for row in results:
+    for row in itertools.chain([first], rows):
         line = " | ".join(str(row[col]).ljust(20) for col in columns)
         print(line)
 
 
+def browse_pages(fetch_page, title):
+    """Постраничный просмотр: fetch_page(token, backward) возвращает страницу из AutoService.get_page"""
+    page = fetch_page(None, False)
+    number = 1
+    while True:
+        print_results(page['rows'], f"{title} (стр. {number})")
+
+        options = []
+        if page['next']:
+            options.append("n - следующая")
+        if page['prev']:
+            options.append("p - предыдущая")
+        options.append("0 - назад")
+
+        choice = input(f"\n{', '.join(options)}: ").strip().lower()
+        if choice == '0':
+            break
+        elif choice == 'n' and page['next']:
+            page = fetch_page(page['next'], False)
+            number += 1
+        elif choice == 'p' and page['prev']:
+            page = fetch_page(page['prev'], True)
+            number -= 1
+        else:
+            print("Неверный выбор")
+
+
 def print_simple_list(items, title):
     """Вывод простого списка"""
     print(f"\n{title}:")
@@ -39,6 +84,30 @@ def print_simple_list(items, title):
         print(f"  {i}. {item}")
 
 
+def read_repairs_file(path):
+    """Чтение ремонтов из CSV: номер;ФИО работника;неисправность[;время]"""
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.reader(f, delimiter=";"):
+            if not row or not "".join(row).strip():
+                continue
+            # Необязательная строка заголовка
+            if row[0].strip().lower().startswith("номер"):
+                continue
+            yield row
+
+
+def read_date(prompt):
+    """Ввод даты ГГГГ-ММ-ДД; пустая строка - None"""
+    while True:
+        value = input(prompt).strip()
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, "%Y-%m-%d").date()
+        except ValueError:
+            print("Неверный формат даты, ожидается ГГГГ-ММ-ДД")
+
+
 def wait_for_continue():
     """Ожидание нажатия Enter для продолжения"""
     input("\nНажмите Enter для продолжения...")
@@ -131,6 +200,7 @@ def operations_menu(service, logger, username):
         print("5 - Зарегистрировать ремонт")
         print("6 - Удалить работника")
         print("7 - Изменить номер автомобиля")
+        print("8 - Пакетная регистрация ремонтов")
         print("0 - Назад в главное меню")
 
         choice = input("\nВыберите операцию: ").strip()
@@ -311,6 +381,43 @@ def operations_menu(service, logger, username):
                 print(f"✗ Ошибка: {e}")
             wait_for_continue()
 
+        elif choice == '8':
+            print("\n--- ПАКЕТНАЯ РЕГИСТРАЦИЯ РЕМОНТОВ ---")
+            путь = input("Файл CSV (номер;ФИО работника;неисправность[;время]), Enter - ручной ввод, 0 - отмена: ").strip()
+            if путь == '0':
+                continue
+            try:
+                if путь:
+                    repairs = list(read_repairs_file(путь))
+                else:
+                    print("Вводите ремонты по одному в строке: номер;ФИО работника;неисправность")
+                    print("Пустая строка - завершить ввод")
+                    repairs = []
+                    while True:
+                        line = input("> ").strip()
+                        if not line:
+                            break
+                        repairs.append(line.split(";"))
+
+                if not repairs:
+                    print("Нет данных для регистрации")
+                    wait_for_continue()
+                    continue
+
+                result = service.register_repairs(repairs)
+                logger.log(username, "ADD_REPAIRS_BATCH",
+                           f"Источник={путь or 'ввод'}, Добавлено={len(result['inserted'])}, Ошибок={len(result['failed'])}")
+
+                print(f"✓ Зарегистрировано ремонтов: {len(result['inserted'])} из {len(repairs)}")
+                if result['created_faults']:
+                    print(f"  Созданы неисправности: {', '.join(result['created_faults'])}")
+                for item in result['failed']:
+                    print(f"✗ Строка {item['row']}: {item['error']}")
+            except Exception as e:
+                logger.log(username, "ERROR", f"ADD_REPAIRS_BATCH failed: {str(e)}")
+                print(f"✗ Ошибка: {e}")
+            wait_for_continue()
+
         else:
             print("Неверный выбор, попробуйте снова")
 
@@ -325,6 +432,7 @@ def queries_menu(service, logger, username):
         print("4 - Детали ремонта")
         print("5 - Авто работника")
         print("6 - Владельцы по типу неисправности")
+        print("7 - Карточка автомобиля")
         print("0 - Назад в главное меню")
 
         sub_choice = input("Выберите запрос: ")
@@ -419,6 +527,32 @@ def queries_menu(service, logger, username):
                 print(f"✗ Ошибка: {e}")
             wait_for_continue()
 
+        elif sub_choice == '7':
+            print("\n--- КАРТОЧКА АВТОМОБИЛЯ ---")
+            номер = input("Номер госрегистрации (0 - отмена): ")
+            if номер == '0':
+                continue
+            try:
+                card = service.get_car_card(номер)
+                logger.log(username, "QUERY_CAR_CARD", f"Номер={номер}")
+                if card is None:
+                    print(f"✗ Автомобиль {номер} не найден")
+                else:
+                    print(f"\n{'=' * 60}")
+                    print(f"{'Карточка автомобиля ' + номер:^60}")
+                    print(f"{'=' * 60}")
+                    print(f"Марка:                   {card['Марка']} ({card['Год_выпуска']})")
+                    print(f"Владелец:                {card['Владелец']}")
+                    print(f"Ремонтов:                {card['Ремонтов']}")
+                    if card['Последний_ремонт'] is not None:
+                        print(f"Последний ремонт:        {card['Последний_ремонт']:%d.%m.%Y %H:%M}")
+                        print(f"Последняя неисправность: {card['Последняя_неисправность']}")
+                        print(f"Последний работник:      {card['Последний_работник']}")
+            except Exception as e:
+                logger.log(username, "ERROR", f"QUERY_CAR_CARD failed: {str(e)}")
+                print(f"✗ Ошибка: {e}")
+            wait_for_continue()
+
         else:
             print("Неверный выбор, попробуйте снова")
 
@@ -429,6 +563,7 @@ def reports_menu(service, logger, username):
         print("\n--- СПРАВКИ И ОТЧЕТЫ ---")
         print("1 - Справка о неисправностях")
         print("2 - Полный отчет о работе станции")
+        print("3 - Ремонты по дням")
         print("0 - Назад в главное меню")
 
         sub_choice = input("Выберите отчет: ")
@@ -447,7 +582,7 @@ def reports_menu(service, logger, username):
                     logger.log(username, "REPORT_FAULTS", f"Владелец={фио}")
                     print_results(results, f"Неисправности {фио}")
                 else:
-                    results = service.get_fault_report()
+                    results = service.get_fault_report(stream=True)
                     logger.log(username, "REPORT_ALL_FAULTS", "Все владельцы")
                     print_results(results, "Все неисправности")
             except Exception as e:
@@ -457,12 +592,18 @@ def reports_menu(service, logger, username):
 
         elif sub_choice == '2':
             print("\n--- ПОЛНЫЙ ОТЧЕТ О РАБОТЕ СТАНЦИИ ---")
+            date_from = read_date("Период с (ГГГГ-ММ-ДД, Enter - без ограничения): ")
+            date_to = read_date("Период по (ГГГГ-ММ-ДД, Enter - без ограничения): ")
+            top_n = input(f"Сколько неисправностей показывать по каждой марке (Enter - {REPORT_TOP_N}): ").strip()
+            top_n = int(top_n) if top_n.isdigit() and int(top_n) > 0 else REPORT_TOP_N
             try:
-                total_cars, repairs, faults, employees = service.get_station_report()
-                logger.log(username, "REPORT_STATION", "Полный отчет")
+                total_cars, repairs, faults, employees = service.get_station_report(date_from, date_to, top_n)
+                period = f"{date_from or '...'} - {date_to or '...'}" if date_from or date_to else "весь период"
+                logger.log(username, "REPORT_STATION", f"Полный отчет, {period}")
 
                 print(f"\n{'=' * 60}")
                 print(f"{'ОТЧЕТ О РАБОТЕ СТАНЦИИ':^60}")
+                print(f"{period:^60}")
                 print(f"{'=' * 60}")
 
                 print(f"\n📊 ОБЩАЯ СТАТИСТИКА:")
@@ -472,7 +613,7 @@ def reports_menu(service, logger, username):
                 for emp in employees:
                     print(f"  {emp['ФИО']}: {emp['Количество_ремонтов']} ремонтов")
 
-                print(f"\n🚗 НЕИСПРАВНОСТИ ПО МАРКАМ АВТО:")
+                print(f"\n🚗 НЕИСПРАВНОСТИ ПО МАРКАМ АВТО (до {top_n} на марку):")
                 for fault in faults:
                     print(f"  {fault['Марка']}: {fault['Тип_неисправности']} ({fault['Количество']} раз)")
 
@@ -485,6 +626,21 @@ def reports_menu(service, logger, username):
                 print(f"✗ Ошибка: {e}")
             wait_for_continue()
 
+        elif sub_choice == '3':
+            print("\n--- РЕМОНТЫ ПО ДНЯМ ---")
+            date_from = read_date("Период с (ГГГГ-ММ-ДД, Enter - без ограничения): ")
+            date_to = read_date("Период по (ГГГГ-ММ-ДД, Enter - без ограничения): ")
+            try:
+                days = service.get_repairs_by_day(date_from, date_to)
+                logger.log(username, "REPORT_BY_DAY", f"{date_from or '...'} - {date_to or '...'}")
+                print_results(days, "Ремонты по дням")
+                if days:
+                    print(f"Всего ремонтов: {sum(day['Ремонтов'] for day in days)}")
+            except Exception as e:
+                logger.log(username, "ERROR", f"REPORT_BY_DAY failed: {str(e)}")
+                print(f"✗ Ошибка: {e}")
+            wait_for_continue()
+
         else:
             print("Неверный выбор, попробуйте снова")
 
@@ -507,62 +663,63 @@ def view_data_menu(service, logger, username):
 
         elif sub_choice == '1':
             try:
-                results = service.get_all_owners()
                 logger.log(username, "VIEW_ALL_OWNERS")
-                print_results(results, "ВСЕ ВЛАДЕЛЬЦЫ")
+                browse_pages(
+                    lambda token, backward: service.get_all_owners(page_size=PAGE_SIZE, token=token, backward=backward),
+                    "ВСЕ ВЛАДЕЛЬЦЫ"
+                )
             except Exception as e:
                 logger.log(username, "ERROR", f"VIEW_ALL_OWNERS failed: {str(e)}")
                 print(f"✗ Ошибка: {e}")
-            wait_for_continue()
+                wait_for_continue()
 
         elif sub_choice == '2':
             try:
-                results = service.get_all_employees()
                 logger.log(username, "VIEW_ALL_EMPLOYEES")
-                print_results(results, "ВСЕ РАБОТНИКИ")
+                browse_pages(
+                    lambda token, backward: service.get_all_employees(page_size=PAGE_SIZE, token=token, backward=backward),
+                    "ВСЕ РАБОТНИКИ"
+                )
             except Exception as e:
                 logger.log(username, "ERROR", f"VIEW_ALL_EMPLOYEES failed: {str(e)}")
                 print(f"✗ Ошибка: {e}")
-            wait_for_continue()
+                wait_for_continue()
 
         elif sub_choice == '3':
             try:
-                results = service.get_all_cars()
                 logger.log(username, "VIEW_ALL_CARS")
-                print_results(results, "ВСЕ АВТОМОБИЛИ")
+                browse_pages(
+                    lambda token, backward: service.get_all_cars(page_size=PAGE_SIZE, token=token, backward=backward),
+                    "ВСЕ АВТОМОБИЛИ"
+                )
             except Exception as e:
                 logger.log(username, "ERROR", f"VIEW_ALL_CARS failed: {str(e)}")
                 print(f"✗ Ошибка: {e}")
-            wait_for_continue()
+                wait_for_continue()
 
         elif sub_choice == '4':
             try:
-                results = service.get_all_faults()
                 logger.log(username, "VIEW_ALL_FAULTS")
-                print_results(results, "ВСЕ НЕИСПРАВНОСТИ")
+                browse_pages(
+                    lambda token, backward: service.get_all_faults(page_size=PAGE_SIZE, token=token, backward=backward),
+                    "ВСЕ НЕИСПРАВНОСТИ"
+                )
             except Exception as e:
                 logger.log(username, "ERROR", f"VIEW_ALL_FAULTS failed: {str(e)}")
                 print(f"✗ Ошибка: {e}")
-            wait_for_continue()
+                wait_for_continue()
 
         elif sub_choice == '5':
             try:
-                results = service.db.execute_query("""
-                    SELECT фр.id_Ремонта, в.ФИО as владелец, а.Номер_госрегистрации, а.Марка, 
-                           р.ФИО as работник, н.Тип_неисправности, фр.Время_устранения
-                    FROM Факт_ремонта фр
-                    JOIN Автомобиль а ON фр.id_Автомобиля = а.id_Автомобиля
-                    JOIN Владелец в ON а.id_Владельца = в.id_Владельца
-                    JOIN Работник р ON фр.id_Работника = р.id_Работника
-                    JOIN Неисправность н ON фр.id_Неисправности = н.id_Неисправности
-                    ORDER BY фр.Время_устранения DESC
-                """, fetch=True)
                 logger.log(username, "VIEW_ALL_REPAIRS")
-                print_results(results, "ВСЕ ФАКТЫ РЕМОНТА")
+                browse_pages(
+                    lambda token, backward: service.get_all_repairs(page_size=PAGE_SIZE, token=token, backward=backward),
+                    "ВСЕ ФАКТЫ РЕМОНТА"
+                )
             except Exception as e:
                 logger.log(username, "ERROR", f"VIEW_ALL_REPAIRS failed: {str(e)}")
                 print(f"✗ Ошибка: {e}")
-            wait_for_continue()
+                wait_for_continue()
 
         else:
             print("Неверный выбор, попробуйте снова")
@@ -680,12 +837,22 @@ def backup_menu(backup_service, logger, username):
             print("Неверный выбор")
 
 
+def print_log_entry(entry):
+    print(f"{entry['ts']} | {entry['user']} | {entry['action']} | {entry['details']}")
+
+
 def view_logs_menu(logger):
     """Просмотр логов"""
     while True:
         print("\n--- ПРОСМОТР ЛОГОВ ---")
         print("1 - Логи за сегодня")
         print("2 - Логи за конкретную дату")
+        print("3 - Поиск по пользователю, действию и времени")
+        print("4 - Последние записи")
+        print("5 - Следить за журналом")
+        print("6 - Поиск за период")
+        print("7 - Состояние записи журнала")
+        print("8 - Сжать и очистить старые журналы")
         print("0 - Назад")
 
         choice = input("Выберите действие: ").strip()
@@ -716,10 +883,549 @@ def view_logs_menu(logger):
                 print(f"Логи за {date_str} отсутствуют")
             wait_for_continue()
 
+        elif choice == '3':
+            date_str = input("Дата (ГГГГ-ММ-ДД, Enter - сегодня): ").strip() or None
+            user = input("Пользователь (Enter - любой): ").strip() or None
+            action = input("Действие, например ERROR (Enter - любое): ").strip() or None
+            hours = input("Часы, например 10-12 (Enter - весь день): ").strip()
+            hour_from = hour_to = None
+            if hours:
+                try:
+                    hour_from, hour_to = (int(part) for part in hours.split('-', 1))
+                except ValueError:
+                    print("Часы указываются как ЧЧ-ЧЧ, например 10-12")
+                    continue
+            entries = logger.query(date_str, user=user, action=action, hour_from=hour_from, hour_to=hour_to)
+            if entries:
+                print(f"\nНайдено записей: {len(entries)}")
+                print("-" * 80)
+                for entry in entries:
+                    print_log_entry(entry)
+            else:
+                print("Записи не найдены")
+            wait_for_continue()
+
+        elif choice == '4':
+            count = input("Сколько последних записей показать (Enter - 100): ").strip() or '100'
+            if not count.isdigit() or int(count) < 1:
+                print("Введите положительное число")
+                continue
+            entries = logger.tail(int(count))
+            print(f"\nПоследние записи: {len(entries)}")
+            print("-" * 80)
+            for entry in entries:
+                print_log_entry(entry)
+            wait_for_continue()
+
+        elif choice == '5':
+            print("\nНовые записи журнала (Ctrl+C - остановить):")
+            print("-" * 80)
+            try:
+                for entry in logger.follow():
+                    print_log_entry(entry)
+            except KeyboardInterrupt:
+                print("\nОстановлено")
+
+        elif choice == '6':
+            date_from = read_date("Дата начала (ГГГГ-ММ-ДД, Enter - с первого дня): ")
+            date_to = read_date("Дата окончания (ГГГГ-ММ-ДД, Enter - по сегодня): ")
+            text = input("Текст (Enter - любой): ").strip() or None
+            user = input("Пользователь (Enter - любой): ").strip() or None
+            action = input("Действие (Enter - любое): ").strip() or None
+
+            # Совпадения выдаются по мере нахождения, порциями по PAGE_SIZE
+            matches = logger.search(date_from, date_to, text=text, user=user, action=action)
+            shown = 0
+            while True:
+                page = list(itertools.islice(matches, PAGE_SIZE))
+                for entry in page:
+                    print_log_entry(entry)
+                shown += len(page)
+                if len(page) < PAGE_SIZE:
+                    break
+                if input("Enter - дальше, 0 - хватит: ").strip() == '0':
+                    matches.close()
+                    break
+            print(f"Показано записей: {shown}")
+            wait_for_continue()
+
+        elif choice == '7':
+            stats = logger.get_stats()
+            print("\nФоновая запись журнала:")
+            print(f"  В очереди:              {stats['queue_depth']}")
+            print(f"  Записано:               {stats['written']} (пачек: {stats['batches']}, "
+                  f"ср. запись пачки {stats['avg_write_ms']:.2f} мс)")
+            print(f"  Задержка до диска, мс:  ср. {stats['avg_latency_ms']:.1f}, "
+                  f"p95 {stats['p95_latency_ms']:.1f}, макс. {stats['max_latency_ms']:.1f}")
+            print(f"  Ожиданий места в очереди: {stats['blocked']}")
+            wait_for_continue()
+
+        elif choice == '8':
+            rotator = get_log_rotator(logger.log_dir)
+            try:
+                report = rotator.rotate()
+            except OSError as e:
+                print(f"✗ Ошибка: {e}")
+                continue
+            print(f"Сжато файлов: {len(report['compressed'])} ({rotator.compression}), "
+                  f"освобождено {report['saved_bytes'] / 1024 / 1024:.1f} МБ")
+            print(f"Удалено по сроку хранения: {len(report['deleted'])}")
+            print(f"Журналы занимают {report['total_bytes'] / 1024 / 1024:.1f} МБ")
+            wait_for_continue()
+
+        else:
+            print("Неверный выбор")
+
+
+def pool_stats_menu(service, logger, username):
+    """Статистика пула соединений с БД"""
+    stats = service.db.get_pool_stats()
+    logger.log(username, "VIEW_POOL_STATS")
+
+    print("\n--- СТАТИСТИКА ПУЛА СОЕДИНЕНИЙ ---")
+    print(f"  Размер пула: {stats['size']} (мин. {stats['min']}, макс. {stats['max']})")
+    print(f"  Занято: {stats['in_use']}, свободно: {stats['idle']}, ожидают: {stats['waiting']}")
+    print(f"  Выдано соединений: {stats['checkouts']}, таймаутов: {stats['timeouts']}")
+    print(f"  Открыто: {stats['created']}, отброшено: {stats['discarded']}, закрыто по простою: {stats['reaped']}")
+    print(f"  Задержка получения: средняя {stats['avg_wait_ms']:.2f} мс, максимальная {stats['max_wait_ms']:.2f} мс")
+    print(f"  Подготовленные операторы: попаданий {stats['prepared_hits']}, "
+          f"промахов {stats['prepared_misses']}, вытеснено {stats['prepared_evictions']}")
+
+    replicas = service.db.get_replica_status()
+    if replicas:
+        print("\n  Реплики для чтения:")
+        for replica in replicas:
+            state = "доступна" if replica['healthy'] else "исключена"
+            lag = f"{replica['lag']:.1f} сек" if replica['lag'] is not None else "не проверялось"
+            print(f"    {replica['name']}: {state}, отставание {lag}, чтений {replica['reads']}, "
+                  f"сбоев {replica['failures']}, занято соединений {replica['pool']['in_use']}")
+    wait_for_continue()
+
+
+def query_stats_menu(service, logger, username):
+    """Статистика выполнения запросов к БД"""
+    while True:
+        stats = service.db.stats.snapshot()
+
+        print("\n--- СТАТИСТИКА ЗАПРОСОВ ---")
+        print(f"Медленными считаются запросы от {service.db.stats.slow_threshold_ms:.0f} мс (журнал SLOW_QUERY)")
+        if stats:
+            header = (f"{'Запрос':<32} | {'Кол-во':>7} | {'Ошибки':>6} | {'p50 мс':>8} | {'p95 мс':>8} | "
+                      f"{'p99 мс':>8} | {'Макс мс':>8} | {'Строк ср.':>9}")
+            print(header)
+            print("-" * len(header))
+            for item in stats:
+                print(f"{item['name'][:32]:<32} | {item['count']:>7} | {item['errors']:>6} | {item['p50_ms']:>8.2f} | "
+                      f"{item['p95_ms']:>8.2f} | {item['p99_ms']:>8.2f} | {item['max_ms']:>8.2f} | {item['avg_rows']:>9.1f}")
+        else:
+            print("Запросы еще не выполнялись")
+
+        print("\n1 - Обновить")
+        print("2 - Сбросить статистику")
+        print("0 - Назад")
+
+        choice = input("Выберите действие: ").strip()
+
+        if choice == '0':
+            break
+        elif choice == '1':
+            continue
+        elif choice == '2':
+            service.db.stats.reset()
+            logger.log(username, "QUERY_STATS_RESET")
+            print("Статистика сброшена")
+        else:
+            print("Неверный выбор")
+
+
+def reference_cache_menu(service, logger, username):
+    """Кэши справочников и запросов диспетчера"""
+    while True:
+        stats = service.refs.get_stats()
+
+        print("\n--- КЭШИ ---")
+        print("  Справочники (работники, типы неисправностей):")
+        print(f"  Подписка на изменения (LISTEN/NOTIFY): {'активна' if stats['active'] else 'нет, поиск идет в БД'}")
+        for table, size in stats['sizes'].items():
+            print(f"  {table}: {size if size is not None else 'не загружен'}")
+        print(f"  Попаданий: {stats['hits']}, промахов: {stats['misses']}")
+        print(f"  Загрузок: {stats['loads']}, сбросов: {stats['invalidations']}")
+
+        lookup_stats = service.lookups.get_stats()
+        print("\n  Кэш запросов по номеру и владельцу:")
+        if not service.lookups.active:
+            print("  Подписка на изменения не активна - кэш не используется")
+        print(f"  Записей: {lookup_stats['size']} из {lookup_stats['maxsize']}, срок жизни {lookup_stats['ttl']:.0f} сек")
+        print(f"  Попаданий: {lookup_stats['hits']}, промахов: {lookup_stats['misses']} "
+              f"(устарело {lookup_stats['expired']}), вытеснено: {lookup_stats['evictions']}, "
+              f"сброшено: {lookup_stats['invalidations']}, отброшено устаревших: {lookup_stats['stale_puts']}")
+
+        report_stats = service.reports.get_stats()
+        print("\n  Кэш отчетов (до изменения данных):")
+        print(f"  Отчетов: {report_stats['size']} из {report_stats['maxsize']}, "
+              f"каталог: {report_stats['directory'] or 'не сохраняется'}")
+        print(f"  Попаданий: {report_stats['hits']}, промахов: {report_stats['misses']}, "
+              f"сохранено: {report_stats['stores']}")
+
+        print("\n1 - Обновить справочники")
+        print("2 - Очистить кэш запросов по номеру и владельцу")
+        print("3 - Очистить кэш отчетов")
+        print("0 - Назад")
+
+        choice = input("Выберите действие: ").strip()
+
+        if choice == '0':
+            break
+        elif choice == '1':
+            try:
+                service.refs.refresh()
+                logger.log(username, "REFERENCE_CACHE_REFRESH")
+                print("✓ Справочники перезагружены")
+            except Exception as e:
+                logger.log(username, "ERROR", f"REFERENCE_CACHE_REFRESH failed: {str(e)}")
+                print(f"✗ Ошибка: {e}")
+        elif choice == '2':
+            service.lookups.clear()
+            logger.log(username, "LOOKUP_CACHE_CLEAR")
+            print("✓ Кэш очищен")
+        elif choice == '3':
+            service.reports.clear()
+            logger.log(username, "REPORT_CACHE_CLEAR")
+            print("✓ Кэш очищен")
+        else:
+            print("Неверный выбор")
+
+
+def import_menu(service, logger, username):
+    """Массовый импорт данных из CSV-файлов"""
+    kinds = {'1': 'owners', '2': 'cars', '3': 'workers', '4': 'repairs'}
+    formats = {
+        'owners': "ФИО;Адрес",
+        'cars': "Номер;Марка;Год выпуска;Изготовитель;ФИО владельца",
+        'workers': "ФИО",
+        'repairs': "Номер;ФИО работника;Тип неисправности[;Время устранения]",
+    }
+    importer = BulkImporter(service.db)
+
+    while True:
+        print("\n--- ИМПОРТ ДАННЫХ ИЗ CSV ---")
+        print("1 - Владельцы")
+        print("2 - Автомобили")
+        print("3 - Работники")
+        print("4 - Факты ремонта")
+        print("0 - Назад")
+
+        choice = input("Выберите данные: ").strip()
+
+        if choice == '0':
+            break
+
+        elif choice in kinds:
+            kind = kinds[choice]
+            print(f"Формат строки: {formats[kind]} (разделитель ';', заголовок необязателен)")
+            путь = input("Путь к файлу (0 - отмена): ").strip()
+            if путь == '0':
+                continue
+            try:
+                report = importer.import_file(kind, путь)
+                logger.log(username, "IMPORT_CSV",
+                           f"Вид={kind}, Файл={путь}, Добавлено={report['inserted']}, Отклонено={report['rejected']}")
+                print(f"✓ {report['title']}: добавлено {report['inserted']} из {report['total']} строк")
+                print(f"  Время: {report['seconds']:.2f} сек ({report['rows_per_sec']:.0f} строк/сек)")
+                if report['reject_file']:
+                    print(f"  Отклонено строк: {report['rejected']}, см. {report['reject_file']}")
+            except Exception as e:
+                logger.log(username, "ERROR", f"IMPORT_CSV failed: {str(e)}")
+                print(f"✗ Ошибка: {e}")
+            wait_for_continue()
+
+        else:
+            print("Неверный выбор")
+
+
+def schema_menu(models, logger, username):
+    """Версия схемы БД и состояние миграций"""
+    while True:
+        status = models.migrator.get_status()
+        current = models.migrator.current_version()
+
+        print("\n--- МИГРАЦИИ СХЕМЫ БД ---")
+        print(f"  Версия схемы: {current} (последняя: {models.migrator.latest_version})")
+        for migration in status:
+            if migration['applied']:
+                state = (f"применена {migration['applied_at']:%Y-%m-%d %H:%M:%S} "
+                         f"за {migration['duration_ms']} мс")
+                if migration['modified']:
+                    state += ", файл изменен после применения!"
+            else:
+                state = "не применена"
+            print(f"  {migration['version']:04d}_{migration['name']}: {state}")
+
+        print("\n1 - Применить недостающие миграции")
+        print("0 - Назад")
+
+        choice = input("Выберите действие: ").strip()
+
+        if choice == '0':
+            break
+        elif choice == '1':
+            try:
+                applied = models.migrator.migrate()
+                for migration in applied:
+                    logger.log(username, "SCHEMA_MIGRATE", f"{migration['version']:04d}_{migration['name']}")
+                print(f"✓ Применено миграций: {len(applied)}")
+            except Exception as e:
+                logger.log(username, "ERROR", f"SCHEMA_MIGRATE failed: {str(e)}")
+                print(f"✗ Ошибка: {e}")
+        else:
+            print("Неверный выбор")
+
+
+def partitions_menu(models, logger, username):
+    """Помесячные секции таблицы ремонтов"""
+    manager = models.partitions
+    while True:
+        partitions = manager.list_partitions()
+
+        print("\n--- СЕКЦИИ ТАБЛИЦЫ РЕМОНТОВ ---")
+        if not partitions:
+            print("  Таблица Факт_ремонта не секционирована (см. миграции схемы БД)")
+        for partition in partitions:
+            period = "по умолчанию" if partition['default'] else f"{partition['start']:%Y-%m}"
+            print(f"  {partition['name']}: {period}, ~{partition['rows']} строк, "
+                  f"{partition['size'] / 1024 / 1024:.1f} МБ")
+
+        print("\n1 - Создать секции на ближайшие месяцы")
+        print("2 - Перенести строки из секции по умолчанию в месячные")
+        print("3 - Удалить секции старше даты")
+        print("0 - Назад")
+
+        choice = input("Выберите действие: ").strip()
+
+        if choice == '0':
+            break
+        try:
+            if choice == '1':
+                created = manager.ensure_partitions()
+                logger.log(username, "PARTITIONS_CREATE", ", ".join(created))
+                print(f"✓ Создано секций: {len(created)}")
+            elif choice == '2':
+                report = manager.migrate_default()
+                logger.log(username, "PARTITIONS_MIGRATE",
+                           f"Секций={len(report['months'])}, Строк={report['rows']}")
+                print(f"✓ Перенесено строк: {report['rows']}, создано секций: {len(report['months'])}")
+            elif choice == '3':
+                cutoff = read_date("Удалить секции, целиком лежащие раньше (ГГГГ-ММ-ДД): ")
+                if cutoff is None:
+                    continue
+                detach_only = input("Только отключить, сохранив таблицы? (да/нет): ").strip().lower() == 'да'
+                confirm = input(f"Данные ремонтов до {cutoff} будут {'отключены' if detach_only else 'удалены'}. "
+                                f"Продолжить? (да/нет): ").strip().lower()
+                if confirm != 'да':
+                    continue
+                dropped = manager.drop_partitions_before(cutoff, detach_only=detach_only)
+                logger.log(username, "PARTITIONS_DETACH" if detach_only else "PARTITIONS_DROP", ", ".join(dropped))
+                print(f"✓ Обработано секций: {len(dropped)}")
+            else:
+                print("Неверный выбор")
+        except Exception as e:
+            logger.log(username, "ERROR", f"PARTITIONS failed: {str(e)}")
+            print(f"✗ Ошибка: {e}")
+
+
+def rollups_menu(service, logger, username):
+    """Сводки отчета о работе станции: проверка и пересчет"""
+    rollups = ReportRollups(service.db)
+
+    while True:
+        print("\n--- СВОДКИ ОТЧЕТА О РАБОТЕ СТАНЦИИ ---")
+        print("1 - Сверить сводки с данными о ремонтах")
+        print("2 - Пересчитать сводки")
+        print("0 - Назад")
+
+        choice = input("Выберите действие: ").strip()
+
+        if choice == '0':
+            break
+        elif choice == '1':
+            try:
+                mismatches = rollups.check()
+                total = sum(len(rows) for rows in mismatches.values())
+                logger.log(username, "ROLLUPS_CHECK", f"Расхождений={total}")
+                for table, rows in mismatches.items():
+                    print(f"  {table}: {'совпадает' if not rows else f'расхождений {len(rows)}'}")
+                    for row in rows[:10]:
+                        print(f"    {row['ключ']}: по данным {row['факт'] or 0}, в сводке {row['сводка'] or 0}")
+                if total:
+                    print("Для исправления выберите пересчет сводок")
+            except Exception as e:
+                logger.log(username, "ERROR", f"ROLLUPS_CHECK failed: {str(e)}")
+                print(f"✗ Ошибка: {e}")
+            wait_for_continue()
+        elif choice == '2':
+            try:
+                rollups.rebuild()
+                logger.log(username, "ROLLUPS_REBUILD")
+                print("✓ Сводки пересчитаны")
+            except Exception as e:
+                logger.log(username, "ERROR", f"ROLLUPS_REBUILD failed: {str(e)}")
+                print(f"✗ Ошибка: {e}")
+        else:
+            print("Неверный выбор")
+
+
+def print_plan_diff(report):
+    """Вывод сравнения снимков планов"""
+    if not report:
+        print("  Планы не изменились")
+        return
+    for item in report:
+        mark = "✗ РЕГРЕССИЯ" if item['regression'] else "  изменение"
+        print(f"  {mark} {item['name']}: {'; '.join(item['changes'])}")
+
+
+def plan_advisor_menu(service, logger, username):
+    """Планы запросов сервиса: сканирования, сортировки, предлагаемые индексы, снимки"""
+    advisor = PlanAdvisor(service.db)
+
+    while True:
+        snapshots = advisor.list_snapshots()
+
+        print("\n--- ПЛАНЫ ЗАПРОСОВ И ИНДЕКСЫ ---")
+        print(f"Отмечаются сканирования и сортировки от {advisor.min_rows} строк; "
+              f"снимков сохранено: {len(snapshots)}")
+        print("1 - Разобрать планы запросов")
+        print("2 - Сравнить текущие планы с сохраненным снимком")
+        print("0 - Назад")
+
+        choice = input("Выберите действие: ").strip()
+
+        if choice == '0':
+            break
+        elif choice == '1':
+            try:
+                results = advisor.analyze()
+            except Exception as e:
+                logger.log(username, "ERROR", f"PLAN_ADVISOR failed: {str(e)}")
+                print(f"✗ Ошибка: {e}")
+                continue
+
+            proposals = []
+            header = f"{'Запрос':<40} | {'Время мс':>9} | {'Блоков':>8} | Замечания"
+            print(header)
+            print("-" * len(header))
+            for item in results:
+                if item['error']:
+                    print(f"{item['name'][:40]:<40} | {'':>9} | {'':>8} | ошибка: {item['error']}")
+                    continue
+                summary = item['summary']
+                notes = []
+                for finding in item['findings']:
+                    if finding['kind'] == 'seq_scan':
+                        notes.append(f"Seq Scan {finding['relation']} ({finding['rows']} строк)")
+                    else:
+                        notes.append(f"Sort {', '.join(finding['keys'])} ({finding['rows']} строк"
+                                     f"{', на диске' if finding['disk'] else ''})")
+                print(f"{item['name'][:40]:<40} | {summary['execution_ms']:>9.2f} | "
+                      f"{summary['shared_hit'] + summary['shared_read']:>8} | {'; '.join(notes) or '-'}")
+                proposals.extend(item['proposals'])
+
+            proposals = merge_proposals(proposals)
+            if proposals:
+                print("\nПредлагаемые индексы:")
+                for proposal in proposals:
+                    print(f"  -- {proposal['reason']}")
+                    if len(proposal['statements']) > 1:
+                        print("  -- секционированная таблица: выполнять по одному, вне транзакции")
+                    print(f"  {proposal['ddl']};")
+            else:
+                print("\nНовые индексы не требуются")
+            logger.log(username, "PLAN_ADVISOR", f"Запросов={len(results)}, Индексов предложено={len(proposals)}")
+
+            if input("\nСохранить снимок планов? (да/нет): ").strip().lower() == 'да':
+                path = advisor.save_snapshot(results)
+                logger.log(username, "PLAN_SNAPSHOT_SAVE", path)
+                print(f"✓ Снимок сохранен: {path}")
+            wait_for_continue()
+        elif choice == '2':
+            if not snapshots:
+                print("Снимков еще нет: сначала разберите планы и сохраните снимок")
+                continue
+            for i, path in enumerate(snapshots[:10], 1):
+                print(f"  {i} - {os.path.basename(path)}")
+            number = input("Номер снимка (Enter - последний, 0 - отмена): ").strip() or '1'
+            if number == '0':
+                continue
+            if not number.isdigit() or not 1 <= int(number) <= min(len(snapshots), 10):
+                print("Неверный номер снимка")
+                continue
+            try:
+                old = advisor.load_snapshot(snapshots[int(number) - 1])
+                results = advisor.analyze()
+                current = {item['name']: item['summary'] for item in results if item['summary']}
+                report = advisor.diff(old['queries'], current)
+                regressions = sum(1 for item in report if item['regression'])
+                logger.log(username, "PLAN_SNAPSHOT_DIFF",
+                           f"Снимок={os.path.basename(snapshots[int(number) - 1])}, Регрессий={regressions}")
+                print(f"\nСравнение со снимком от {old['created']}:")
+                print_plan_diff(report)
+            except Exception as e:
+                logger.log(username, "ERROR", f"PLAN_SNAPSHOT_DIFF failed: {str(e)}")
+                print(f"✗ Ошибка: {e}")
+            wait_for_continue()
         else:
             print("Неверный выбор")
 
 
+def log_analytics_menu(logger, username):
+    """Число действий по пользователям, типам действий и часам за период"""
+    print("\n--- АНАЛИТИКА ЖУРНАЛА ДЕЙСТВИЙ ---")
+    date_from = read_date("Дата начала (ГГГГ-ММ-ДД, Enter - с первого дня): ")
+    date_to = read_date("Дата окончания (ГГГГ-ММ-ДД, Enter - по сегодня): ")
+
+    logger.flush()
+    analytics = LogAnalytics(logger.log_dir)
+    try:
+        summary = analytics.analyze(date_from, date_to)
+    except Exception as e:
+        logger.log(username, "ERROR", f"LOG_ANALYTICS failed: {str(e)}")
+        print(f"✗ Ошибка: {e}")
+        wait_for_continue()
+        return
+    logger.log(username, "LOG_ANALYTICS", f"С={date_from or '-'}, По={date_to or '-'}, "
+                                         f"Файлов={summary['files']}, Разобрано={summary['parsed']}")
+
+    print(f"\nФайлов журнала: {summary['files']} (разобрано заново: {summary['parsed']}, "
+          f"процессов: {analytics.workers}), записей: {summary['entries']}")
+    if not summary['entries']:
+        wait_for_continue()
+        return
+
+    print(f"\n{'Пользователь':<24} | {'Действий':>9} | {'Доля':>6}")
+    print("-" * 45)
+    for user, count in summary['users'].most_common(20):
+        print(f"{user[:24]:<24} | {count:>9} | {count / summary['entries']:>6.1%}")
+
+    print(f"\n{'Действие':<32} | {'Кол-во':>9}")
+    print("-" * 45)
+    for action, count in summary['actions'].most_common(20):
+        print(f"{action[:32]:<32} | {count:>9}")
+
+    print(f"\n{'Пользователь / действие':<44} | {'Кол-во':>9}")
+    print("-" * 57)
+    for (user, action), count in summary['user_actions'].most_common(20):
+        print(f"{(user + ' / ' + action)[:44]:<44} | {count:>9}")
+
+    # Нагрузка по часам суток - для планирования смен
+    busiest = max(summary['hours'].values())
+    print(f"\n{'Час':<5} | {'Кол-во':>9} |")
+    print("-" * 60)
+    for hour in range(24):
+        count = summary['hours'].get(f"{hour:02d}", 0)
+        print(f"{hour:02d}:00 | {count:>9} | {'#' * round(count / busiest * 40)}")
+    wait_for_continue()
+
+
 def admin_menu(auth, logger, backup_service, models, service, username):
     """Меню администратора"""
     while True:
@@ -731,6 +1437,15 @@ def admin_menu(auth, logger, backup_service, models, service, username):
         print("3 - Просмотр логов")
         print("4 - Перейти к работе с данными")
         print("5 - Тестовые данные")
+        print("6 - Статистика пула соединений")
+        print("7 - Импорт данных из CSV")
+        print("8 - Статистика запросов")
+        print("9 - Кэши")
+        print("10 - Миграции схемы БД")
+        print("11 - Секции таблицы ремонтов")
+        print("12 - Сводки отчета о работе станции")
+        print("13 - Планы запросов и индексы")
+        print("14 - Аналитика журнала действий")
         print("0 - Выход")
 
         choice = input("\nВыберите действие: ").strip()
@@ -754,6 +1469,33 @@ def admin_menu(auth, logger, backup_service, models, service, username):
         elif choice == '5':
             admin_test_data_menu(models, service, logger, username)
 
+        elif choice == '6':
+            pool_stats_menu(service, logger, username)
+
+        elif choice == '7':
+            import_menu(service, logger, username)
+
+        elif choice == '8':
+            query_stats_menu(service, logger, username)
+
+        elif choice == '9':
+            reference_cache_menu(service, logger, username)
+
+        elif choice == '10':
+            schema_menu(models, logger, username)
+
+        elif choice == '11':
+            partitions_menu(models, logger, username)
+
+        elif choice == '12':
+            rollups_menu(service, logger, username)
+
+        elif choice == '13':
+            plan_advisor_menu(service, logger, username)
+
+        elif choice == '14':
+            log_analytics_menu(logger, username)
+
         else:
             print("Неверный выбор")
 
@@ -810,6 +1552,7 @@ def main():
     # Инициализация систем
     auth = AuthManager()
     logger = Logger()
+    get_log_rotator(logger.log_dir).start()
     backup_service = BackupService()
 
     # Аутентификация
@@ -832,15 +1575,21 @@ def main():
 
     # Инициализация базы данных
     print("\nИнициализация базы данных...")
-    models = AutoServiceModels()
+    try:
+        models = AutoServiceModels()
+    except MigrationError as e:
+        print(f"✗ Ошибка при обновлении схемы базы данных: {e}")
+        print("Работа со схемой, обновленной не до конца, невозможна. Исправьте ошибку и перезапустите программу.")
+        logger.log(username, "ERROR", f"Migration failed: {str(e)}")
+        close_pool()
+        sys.exit(1)
     service = AutoService()
 
     # Проверка подключения к БД
     try:
-        conn = models.db.get_connection()
-        db_info = conn.get_dsn_parameters()
+        with models.db.connection() as conn:
+            db_info = conn.get_dsn_parameters()
         print(f"Подключение к БД: {db_info.get('dbname')} на {db_info.get('host')}:{db_info.get('port')}")
-        conn.close()
     except Exception as e:
         print(f"Ошибка подключения: {e}")
 
@@ -852,12 +1601,14 @@ def main():
         if admin_menu(auth, logger, backup_service, models, service, username):
             # Если нужно перезапустить (после восстановления бэкапа)
             print("\nПерезапустите программу для применения изменений.")
+            close_pool()
             return
     else:
         dispatcher_menu(logger, models, service, username)
 
     # Логируем выход
     logger.log(username, "LOGOUT", "Session ended")
+    close_pool()
     print("\nСеанс завершен. До свидания!")
 
 if __name__ == "__main__":
@@ -0,0 +1,40 @@
+-- Исходная схема: таблицы и индексы по внешним ключам
+
+CREATE TABLE IF NOT EXISTS Владелец (
+    ID_Владельца SERIAL PRIMARY KEY,
+    ФИО VARCHAR(100) NOT NULL,
+    Адрес VARCHAR(200)
+);
+
+CREATE TABLE IF NOT EXISTS Автомобиль (
+    ID_Автомобиля SERIAL PRIMARY KEY,
+    Номер_госрегистрации VARCHAR(15) NOT NULL UNIQUE,
+    Марка VARCHAR(50) NOT NULL,
+    Год_выпуска INTEGER,
+    Изготовитель VARCHAR(50),
+    ID_Владельца INTEGER NOT NULL REFERENCES Владелец(ID_Владельца) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS Работник (
+    ID_Работника SERIAL PRIMARY KEY,
+    ФИО VARCHAR(100) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS Неисправность (
+    ID_Неисправности SERIAL PRIMARY KEY,
+    Тип_неисправности VARCHAR(100) NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS Факт_ремонта (
+    ID_Ремонта SERIAL PRIMARY KEY,
+    ID_Автомобиля INTEGER NOT NULL REFERENCES Автомобиль(ID_Автомобиля) ON DELETE CASCADE,
+    ID_Работника INTEGER NOT NULL REFERENCES Работник(ID_Работника),
+    ID_Неисправности INTEGER NOT NULL REFERENCES Неисправность(ID_Неисправности),
+    Время_устранения TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_автомобиль_владелец ON Автомобиль(ID_Владельца);
+CREATE INDEX IF NOT EXISTS idx_автомобиль_номер ON Автомобиль(Номер_госрегистрации);
+CREATE INDEX IF NOT EXISTS idx_ремонт_автомобиль ON Факт_ремонта(ID_Автомобиля);
+CREATE INDEX IF NOT EXISTS idx_ремонт_работник ON Факт_ремонта(ID_Работника);
+CREATE INDEX IF NOT EXISTS idx_ремонт_неисправность ON Факт_ремонта(ID_Неисправности);
@@ -0,0 +1,9 @@
+-- migrate: no-transaction
+-- Составные индексы для постраничного просмотра (ключ сортировки + первичный ключ).
+-- Строятся без блокировки записи, поэтому выполняются вне транзакции.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_владелец_фио_id ON Владелец(ФИО, ID_Владельца);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_работник_фио_id ON Работник(ФИО, ID_Работника);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_автомобиль_марка_id ON Автомобиль(Марка, ID_Автомобиля);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_неисправность_тип_id ON Неисправность(Тип_неисправности, ID_Неисправности);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ремонт_время_id ON Факт_ремонта(Время_устранения, ID_Ремонта);
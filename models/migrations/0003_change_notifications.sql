@@ -0,0 +1,74 @@
+-- Уведомления об изменениях для кэшей в памяти процесса
+-- (services/reference_cache.py и services/lookup_cache.py)
+
+CREATE OR REPLACE FUNCTION notify_reference_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('reference_changed', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_работник_notify ON Работник;
+CREATE TRIGGER trg_работник_notify
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON Работник
+FOR EACH STATEMENT EXECUTE FUNCTION notify_reference_change();
+
+DROP TRIGGER IF EXISTS trg_неисправность_notify ON Неисправность;
+CREATE TRIGGER trg_неисправность_notify
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON Неисправность
+FOR EACH STATEMENT EXECUTE FUNCTION notify_reference_change();
+
+CREATE OR REPLACE FUNCTION notify_car_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM pg_notify('lookup_changed', json_build_object(
+            'plate', OLD.Номер_госрегистрации,
+            'owner', (SELECT ФИО FROM Владелец WHERE ID_Владельца = OLD.ID_Владельца))::text);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM pg_notify('lookup_changed', json_build_object(
+            'plate', NEW.Номер_госрегистрации,
+            'owner', (SELECT ФИО FROM Владелец WHERE ID_Владельца = NEW.ID_Владельца))::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION notify_owner_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM pg_notify('lookup_changed', json_build_object('owner', OLD.ФИО)::text);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM pg_notify('lookup_changed', json_build_object('owner', NEW.ФИО)::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION notify_lookup_truncate() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('lookup_changed', '{}');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_автомобиль_notify ON Автомобиль;
+CREATE TRIGGER trg_автомобиль_notify
+AFTER INSERT OR UPDATE OR DELETE ON Автомобиль
+FOR EACH ROW EXECUTE FUNCTION notify_car_change();
+
+DROP TRIGGER IF EXISTS trg_владелец_notify ON Владелец;
+CREATE TRIGGER trg_владелец_notify
+AFTER INSERT OR UPDATE OR DELETE ON Владелец
+FOR EACH ROW EXECUTE FUNCTION notify_owner_change();
+
+DROP TRIGGER IF EXISTS trg_автомобиль_truncate_notify ON Автомобиль;
+CREATE TRIGGER trg_автомобиль_truncate_notify
+AFTER TRUNCATE ON Автомобиль
+FOR EACH STATEMENT EXECUTE FUNCTION notify_lookup_truncate();
+
+DROP TRIGGER IF EXISTS trg_владелец_truncate_notify ON Владелец;
+CREATE TRIGGER trg_владелец_truncate_notify
+AFTER TRUNCATE ON Владелец
+FOR EACH STATEMENT EXECUTE FUNCTION notify_lookup_truncate();
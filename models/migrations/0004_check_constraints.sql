@@ -0,0 +1,17 @@
+-- Проверки данных. NOT VALID: ограничения сразу действуют для новых строк,
+-- а существующие строки проверяются отдельной миграцией без долгой блокировки таблиц.
+
+-- Проверка года выпуска автомобиля
+ALTER TABLE Автомобиль
+ADD CONSTRAINT check_year
+CHECK (Год_выпуска BETWEEN 1900 AND EXTRACT(YEAR FROM CURRENT_DATE) + 1) NOT VALID;
+
+-- Проверка формата номера госрегистрации
+ALTER TABLE Автомобиль
+ADD CONSTRAINT check_license_plate
+CHECK (Номер_госрегистрации SIMILAR TO '[АВЕКМНОРСТУХ][0-9]{3}[АВЕКМНОРСТУХ]{2}[0-9]{2,3}') NOT VALID;
+
+-- Ограничение на время устранения неисправности (не в будущем)
+ALTER TABLE Факт_ремонта
+ADD CONSTRAINT check_repair_time
+CHECK (Время_устранения <= CURRENT_TIMESTAMP) NOT VALID;
@@ -0,0 +1,8 @@
+-- migrate: no-transaction
+-- Проверка существующих строк (SHARE UPDATE EXCLUSIVE: чтение и запись не блокируются).
+-- Если старые данные нарушают ограничение, миграция останавливается с ошибкой;
+-- после исправления данных она будет повторена при следующем запуске.
+
+ALTER TABLE Автомобиль VALIDATE CONSTRAINT check_year;
+ALTER TABLE Автомобиль VALIDATE CONSTRAINT check_license_plate;
+ALTER TABLE Факт_ремонта VALIDATE CONSTRAINT check_repair_time;
@@ -0,0 +1,5 @@
+-- migrate: no-transaction
+-- Уникальный индекс (ID_Ремонта, Время_устранения) для будущего первичного ключа
+-- секционированной таблицы: строится заранее без блокировки записи.
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_ремонт_id_время ON Факт_ремонта(ID_Ремонта, Время_устранения);
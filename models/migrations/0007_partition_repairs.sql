@@ -0,0 +1,44 @@
+-- Секционирование Факт_ремонта по месяцам (RANGE по Время_устранения).
+-- Существующая таблица становится секцией по умолчанию, поэтому все строки остаются
+-- доступными сразу; по месячным секциям их переносит models/partitions.py порциями.
+
+ALTER TABLE Факт_ремонта RENAME TO Факт_ремонта_default;
+
+-- Первичный ключ секции должен совпадать с ключом родительской таблицы
+ALTER TABLE Факт_ремонта_default DROP CONSTRAINT Факт_ремонта_pkey;
+ALTER TABLE Факт_ремонта_default
+    ADD CONSTRAINT Факт_ремонта_default_pkey PRIMARY KEY USING INDEX idx_ремонт_id_время;
+
+ALTER INDEX idx_ремонт_автомобиль RENAME TO idx_ремонт_default_автомобиль;
+ALTER INDEX idx_ремонт_работник RENAME TO idx_ремонт_default_работник;
+ALTER INDEX idx_ремонт_неисправность RENAME TO idx_ремонт_default_неисправность;
+ALTER INDEX idx_ремонт_время_id RENAME TO idx_ремонт_default_время_id;
+
+CREATE TABLE Факт_ремонта (
+    ID_Ремонта INTEGER NOT NULL,
+    ID_Автомобиля INTEGER NOT NULL REFERENCES Автомобиль(ID_Автомобиля) ON DELETE CASCADE,
+    ID_Работника INTEGER NOT NULL REFERENCES Работник(ID_Работника),
+    ID_Неисправности INTEGER NOT NULL REFERENCES Неисправность(ID_Неисправности),
+    Время_устранения TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT Факт_ремонта_pkey PRIMARY KEY (ID_Ремонта, Время_устранения),
+    CONSTRAINT check_repair_time CHECK (Время_устранения <= CURRENT_TIMESTAMP)
+) PARTITION BY RANGE (Время_устранения);
+
+-- Нумерация ремонтов продолжается из прежней последовательности
+DO $$
+DECLARE
+    seq text := pg_get_serial_sequence('Факт_ремонта_default', 'id_Ремонта');
+BEGIN
+    EXECUTE format('ALTER TABLE Факт_ремонта ALTER COLUMN ID_Ремонта SET DEFAULT nextval(%L::regclass)', seq);
+    EXECUTE format('ALTER SEQUENCE %s OWNED BY Факт_ремонта.ID_Ремонта', seq);
+END;
+$$;
+
+-- Индексы на пустой родительской таблице создаются мгновенно; при подключении секции
+-- к ним присоединяются уже существующие индексы старой таблицы
+CREATE INDEX idx_ремонт_автомобиль ON Факт_ремонта(ID_Автомобиля);
+CREATE INDEX idx_ремонт_работник ON Факт_ремонта(ID_Работника);
+CREATE INDEX idx_ремонт_неисправность ON Факт_ремонта(ID_Неисправности);
+CREATE INDEX idx_ремонт_время_id ON Факт_ремонта(Время_устранения, ID_Ремонта);
+
+ALTER TABLE Факт_ремонта ATTACH PARTITION Факт_ремонта_default DEFAULT;
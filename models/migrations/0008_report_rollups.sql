@@ -0,0 +1,220 @@
+-- Сводки для отчета о работе станции, поддерживаемые триггерами.
+-- Триггеры на Факт_ремонта - уровня оператора с таблицами переходов: массовая вставка
+-- (импорт, пакет ремонтов) обновляет каждую строку сводки один раз за оператор.
+
+CREATE TABLE IF NOT EXISTS Сводка_марка_неисправность (
+    Марка VARCHAR(50) NOT NULL,
+    ID_Неисправности INTEGER NOT NULL,
+    Количество BIGINT NOT NULL,
+    PRIMARY KEY (Марка, ID_Неисправности)
+);
+
+CREATE TABLE IF NOT EXISTS Сводка_работник (
+    ID_Работника INTEGER PRIMARY KEY,
+    Количество BIGINT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS Сводка_день (
+    День DATE PRIMARY KEY,
+    Ремонтов BIGINT NOT NULL
+);
+
+-- Число ремонтов по автомобилю нужно, чтобы поддерживать число различных автомобилей
+CREATE TABLE IF NOT EXISTS Сводка_автомобиль (
+    ID_Автомобиля INTEGER PRIMARY KEY,
+    Ремонтов BIGINT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS Сводка_станция (
+    ID BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (ID),
+    Автомобилей BIGINT NOT NULL
+);
+
+-- Прибавление (знак = 1) или вычитание (знак = -1) набора ремонтов во всех сводках
+CREATE OR REPLACE FUNCTION rollups_add(строки Факт_ремонта[], знак integer) RETURNS void AS $$
+DECLARE
+    появилось bigint;
+    исчезло bigint;
+BEGIN
+    IF строки IS NULL OR cardinality(строки) = 0 THEN
+        RETURN;
+    END IF;
+
+    -- Ремонты автомобиля, удаляемого каскадно, сюда не попадут: автомобиль уже не виден,
+    -- его вклад в сводку по маркам вычитает rollups_car_change
+    INSERT INTO Сводка_марка_неисправность AS с (Марка, ID_Неисправности, Количество)
+    SELECT а.Марка, р.ID_Неисправности, знак * COUNT(*)
+    FROM unnest(строки) р
+    JOIN Автомобиль а ON а.ID_Автомобиля = р.ID_Автомобиля
+    GROUP BY а.Марка, р.ID_Неисправности
+    ORDER BY а.Марка, р.ID_Неисправности
+    ON CONFLICT (Марка, ID_Неисправности) DO UPDATE SET Количество = с.Количество + EXCLUDED.Количество;
+
+    INSERT INTO Сводка_работник AS с (ID_Работника, Количество)
+    SELECT р.ID_Работника, знак * COUNT(*)
+    FROM unnest(строки) р
+    GROUP BY р.ID_Работника
+    ORDER BY р.ID_Работника
+    ON CONFLICT (ID_Работника) DO UPDATE SET Количество = с.Количество + EXCLUDED.Количество;
+
+    INSERT INTO Сводка_день AS с (День, Ремонтов)
+    SELECT р.Время_устранения::date, знак * COUNT(*)
+    FROM unnest(строки) р
+    GROUP BY р.Время_устранения::date
+    ORDER BY р.Время_устранения::date
+    ON CONFLICT (День) DO UPDATE SET Ремонтов = с.Ремонтов + EXCLUDED.Ремонтов;
+
+    -- Переходы 0 -> N и N -> 0 меняют число различных автомобилей
+    WITH дельта AS (
+        SELECT р.ID_Автомобиля, знак * COUNT(*) AS n
+        FROM unnest(строки) р
+        GROUP BY р.ID_Автомобиля
+    ),
+    изменение AS (
+        INSERT INTO Сводка_автомобиль AS с (ID_Автомобиля, Ремонтов)
+        SELECT ID_Автомобиля, n FROM дельта ORDER BY ID_Автомобиля
+        ON CONFLICT (ID_Автомобиля) DO UPDATE SET Ремонтов = с.Ремонтов + EXCLUDED.Ремонтов
+        RETURNING с.ID_Автомобиля, с.Ремонтов
+    )
+    SELECT COUNT(*) FILTER (WHERE и.Ремонтов > 0 AND и.Ремонтов = д.n),
+           COUNT(*) FILTER (WHERE и.Ремонтов = 0 AND д.n < 0)
+    INTO появилось, исчезло
+    FROM изменение и
+    JOIN дельта д ON д.ID_Автомобиля = и.ID_Автомобиля;
+
+    IF появилось <> исчезло THEN
+        UPDATE Сводка_станция SET Автомобилей = Автомобилей + появилось - исчезло;
+    END IF;
+
+    IF знак < 0 THEN
+        DELETE FROM Сводка_марка_неисправность WHERE Количество = 0;
+        DELETE FROM Сводка_работник WHERE Количество = 0;
+        DELETE FROM Сводка_день с
+        USING (SELECT DISTINCT р.Время_устранения::date AS день FROM unnest(строки) р) д
+        WHERE с.День = д.день AND с.Ремонтов = 0;
+        DELETE FROM Сводка_автомобиль с
+        USING (SELECT DISTINCT р.ID_Автомобиля FROM unnest(строки) р) д
+        WHERE с.ID_Автомобиля = д.ID_Автомобиля AND с.Ремонтов = 0;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Полный пересчет сводок по исходным данным
+CREATE OR REPLACE FUNCTION rollups_rebuild() RETURNS void AS $$
+BEGIN
+    -- Запись ремонтов блокируется до конца транзакции, чтение - нет
+    LOCK TABLE Факт_ремонта IN SHARE MODE;
+
+    DELETE FROM Сводка_марка_неисправность;
+    DELETE FROM Сводка_работник;
+    DELETE FROM Сводка_день;
+    DELETE FROM Сводка_автомобиль;
+    DELETE FROM Сводка_станция;
+
+    INSERT INTO Сводка_марка_неисправность (Марка, ID_Неисправности, Количество)
+    SELECT а.Марка, фр.ID_Неисправности, COUNT(*)
+    FROM Факт_ремонта фр
+    JOIN Автомобиль а ON а.ID_Автомобиля = фр.ID_Автомобиля
+    GROUP BY а.Марка, фр.ID_Неисправности;
+
+    INSERT INTO Сводка_работник (ID_Работника, Количество)
+    SELECT ID_Работника, COUNT(*) FROM Факт_ремонта GROUP BY ID_Работника;
+
+    INSERT INTO Сводка_день (День, Ремонтов)
+    SELECT Время_устранения::date, COUNT(*) FROM Факт_ремонта GROUP BY Время_устранения::date;
+
+    INSERT INTO Сводка_автомобиль (ID_Автомобиля, Ремонтов)
+    SELECT ID_Автомобиля, COUNT(*) FROM Факт_ремонта GROUP BY ID_Автомобиля;
+
+    INSERT INTO Сводка_станция (Автомобилей)
+    SELECT COUNT(*) FROM Сводка_автомобиль;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION rollups_repairs_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM rollups_add(ARRAY(SELECT ROW(с.*)::Факт_ремонта FROM старые с), -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM rollups_add(ARRAY(SELECT ROW(н.*)::Факт_ремонта FROM новые н), 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION rollups_repairs_truncate() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM Сводка_марка_неисправность;
+    DELETE FROM Сводка_работник;
+    DELETE FROM Сводка_день;
+    DELETE FROM Сводка_автомобиль;
+    UPDATE Сводка_станция SET Автомобилей = 0;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Вклад ремонтов автомобиля в сводку по маркам (при смене марки и удалении автомобиля)
+CREATE OR REPLACE FUNCTION rollups_brand_add(авто integer, марка varchar, знак integer) RETURNS void AS $$
+BEGIN
+    INSERT INTO Сводка_марка_неисправность AS с (Марка, ID_Неисправности, Количество)
+    SELECT марка, фр.ID_Неисправности, знак * COUNT(*)
+    FROM Факт_ремонта фр
+    WHERE фр.ID_Автомобиля = авто
+    GROUP BY фр.ID_Неисправности
+    ORDER BY фр.ID_Неисправности
+    ON CONFLICT (Марка, ID_Неисправности) DO UPDATE SET Количество = с.Количество + EXCLUDED.Количество;
+
+    IF знак < 0 THEN
+        DELETE FROM Сводка_марка_неисправность с WHERE с.Марка = марка AND с.Количество = 0;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION rollups_car_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM rollups_brand_add(OLD.ID_Автомобиля, OLD.Марка, -1);
+    IF TG_OP = 'UPDATE' THEN
+        PERFORM rollups_brand_add(NEW.ID_Автомобиля, NEW.Марка, 1);
+        RETURN NEW;
+    END IF;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_ремонт_сводки_insert ON Факт_ремонта;
+CREATE TRIGGER trg_ремонт_сводки_insert
+AFTER INSERT ON Факт_ремонта
+REFERENCING NEW TABLE AS новые
+FOR EACH STATEMENT EXECUTE FUNCTION rollups_repairs_change();
+
+DROP TRIGGER IF EXISTS trg_ремонт_сводки_update ON Факт_ремонта;
+CREATE TRIGGER trg_ремонт_сводки_update
+AFTER UPDATE ON Факт_ремонта
+REFERENCING OLD TABLE AS старые NEW TABLE AS новые
+FOR EACH STATEMENT EXECUTE FUNCTION rollups_repairs_change();
+
+DROP TRIGGER IF EXISTS trg_ремонт_сводки_delete ON Факт_ремонта;
+CREATE TRIGGER trg_ремонт_сводки_delete
+AFTER DELETE ON Факт_ремонта
+REFERENCING OLD TABLE AS старые
+FOR EACH STATEMENT EXECUTE FUNCTION rollups_repairs_change();
+
+DROP TRIGGER IF EXISTS trg_ремонт_сводки_truncate ON Факт_ремонта;
+CREATE TRIGGER trg_ремонт_сводки_truncate
+AFTER TRUNCATE ON Факт_ремонта
+FOR EACH STATEMENT EXECUTE FUNCTION rollups_repairs_truncate();
+
+-- BEFORE: при удалении автомобиля его ремонты еще видны (каскад выполнится позже)
+DROP TRIGGER IF EXISTS trg_автомобиль_сводки_delete ON Автомобиль;
+CREATE TRIGGER trg_автомобиль_сводки_delete
+BEFORE DELETE ON Автомобиль
+FOR EACH ROW EXECUTE FUNCTION rollups_car_change();
+
+DROP TRIGGER IF EXISTS trg_автомобиль_сводки_update ON Автомобиль;
+CREATE TRIGGER trg_автомобиль_сводки_update
+BEFORE UPDATE OF Марка ON Автомобиль
+FOR EACH ROW WHEN (OLD.Марка IS DISTINCT FROM NEW.Марка)
+EXECUTE FUNCTION rollups_car_change();
+
+SELECT rollups_rebuild();
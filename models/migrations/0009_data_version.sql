@@ -0,0 +1,44 @@
+-- Счетчики изменений таблиц для кэша отчетов (services/report_cache.py).
+-- Счетчик увеличивается в той же транзакции, что и изменение данных, поэтому версия,
+-- прочитанная в одном снимке с отчетом, всегда соответствует его данным.
+
+CREATE TABLE IF NOT EXISTS Версия_данных (
+    Таблица VARCHAR(63) PRIMARY KEY,
+    Версия BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO Версия_данных (Таблица)
+VALUES ('Владелец'), ('Автомобиль'), ('Работник'), ('Неисправность'), ('Факт_ремонта')
+ON CONFLICT (Таблица) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_data_version() RETURNS trigger AS $$
+BEGIN
+    UPDATE Версия_данных SET Версия = Версия + 1 WHERE Таблица = TG_TABLE_NAME;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_владелец_версия ON Владелец;
+CREATE TRIGGER trg_владелец_версия
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON Владелец
+FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version();
+
+DROP TRIGGER IF EXISTS trg_автомобиль_версия ON Автомобиль;
+CREATE TRIGGER trg_автомобиль_версия
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON Автомобиль
+FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version();
+
+DROP TRIGGER IF EXISTS trg_работник_версия ON Работник;
+CREATE TRIGGER trg_работник_версия
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON Работник
+FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version();
+
+DROP TRIGGER IF EXISTS trg_неисправность_версия ON Неисправность;
+CREATE TRIGGER trg_неисправность_версия
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON Неисправность
+FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version();
+
+DROP TRIGGER IF EXISTS trg_ремонт_версия ON Факт_ремонта;
+CREATE TRIGGER trg_ремонт_версия
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON Факт_ремонта
+FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version();
@@ -0,0 +1,9 @@
+-- migrate: no-transaction
+-- Индексы для самых частых неисправностей по маркам (STATION_FAULTS_BY_BRAND*).
+
+-- Окно PARTITION BY Марка ORDER BY Количество DESC по сводке читается в порядке индекса
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_сводка_марка_количество
+    ON Сводка_марка_неисправность(Марка, Количество DESC, ID_Неисправности);
+
+-- Отчет за период читает ремонты по idx_ремонт_время_id (Время_устранения, ID_Ремонта)
+-- в отобранных секциях: отдельный индекс по тому же столбцу не нужен.
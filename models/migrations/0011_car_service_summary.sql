@@ -0,0 +1,151 @@
+-- Карточка автомобиля: последний ремонт (время, неисправность, работник) и число ремонтов
+-- хранятся в Сводка_автомобиль и поддерживаются теми же триггерами, что и сводки отчета.
+
+ALTER TABLE Сводка_автомобиль
+    ADD COLUMN IF NOT EXISTS Последний_ремонт TIMESTAMP,
+    ADD COLUMN IF NOT EXISTS ID_Последнего_ремонта INTEGER,
+    ADD COLUMN IF NOT EXISTS ID_Последней_неисправности INTEGER,
+    ADD COLUMN IF NOT EXISTS ID_Последнего_работника INTEGER;
+
+-- Поиск нового последнего ремонта после удаления текущего - по индексу
+-- idx_ремонт_автомобиль_время (миграция 0016, строится по секциям без блокировки записи).
+
+-- Прибавление (знак = 1) или вычитание (знак = -1) набора ремонтов во всех сводках
+CREATE OR REPLACE FUNCTION rollups_add(строки Факт_ремонта[], знак integer) RETURNS void AS $$
+DECLARE
+    появилось bigint;
+    исчезло bigint;
+BEGIN
+    IF строки IS NULL OR cardinality(строки) = 0 THEN
+        RETURN;
+    END IF;
+
+    -- Ремонты автомобиля, удаляемого каскадно, сюда не попадут: автомобиль уже не виден,
+    -- его вклад в сводку по маркам вычитает rollups_car_change
+    INSERT INTO Сводка_марка_неисправность AS с (Марка, ID_Неисправности, Количество)
+    SELECT а.Марка, р.ID_Неисправности, знак * COUNT(*)
+    FROM unnest(строки) р
+    JOIN Автомобиль а ON а.ID_Автомобиля = р.ID_Автомобиля
+    GROUP BY а.Марка, р.ID_Неисправности
+    ORDER BY а.Марка, р.ID_Неисправности
+    ON CONFLICT (Марка, ID_Неисправности) DO UPDATE SET Количество = с.Количество + EXCLUDED.Количество;
+
+    INSERT INTO Сводка_работник AS с (ID_Работника, Количество)
+    SELECT р.ID_Работника, знак * COUNT(*)
+    FROM unnest(строки) р
+    GROUP BY р.ID_Работника
+    ORDER BY р.ID_Работника
+    ON CONFLICT (ID_Работника) DO UPDATE SET Количество = с.Количество + EXCLUDED.Количество;
+
+    INSERT INTO Сводка_день AS с (День, Ремонтов)
+    SELECT р.Время_устранения::date, знак * COUNT(*)
+    FROM unnest(строки) р
+    GROUP BY р.Время_устранения::date
+    ORDER BY р.Время_устранения::date
+    ON CONFLICT (День) DO UPDATE SET Ремонтов = с.Ремонтов + EXCLUDED.Ремонтов;
+
+    -- Переходы 0 -> N и N -> 0 меняют число различных автомобилей
+    WITH дельта AS (
+        SELECT р.ID_Автомобиля, знак * COUNT(*) AS n
+        FROM unnest(строки) р
+        GROUP BY р.ID_Автомобиля
+    ),
+    изменение AS (
+        INSERT INTO Сводка_автомобиль AS с (ID_Автомобиля, Ремонтов)
+        SELECT ID_Автомобиля, n FROM дельта ORDER BY ID_Автомобиля
+        ON CONFLICT (ID_Автомобиля) DO UPDATE SET Ремонтов = с.Ремонтов + EXCLUDED.Ремонтов
+        RETURNING с.ID_Автомобиля, с.Ремонтов
+    )
+    SELECT COUNT(*) FILTER (WHERE и.Ремонтов > 0 AND и.Ремонтов = д.n),
+           COUNT(*) FILTER (WHERE и.Ремонтов = 0 AND д.n < 0)
+    INTO появилось, исчезло
+    FROM изменение и
+    JOIN дельта д ON д.ID_Автомобиля = и.ID_Автомобиля;
+
+    -- Последний ремонт автомобиля (карточка автомобиля). Удален последний ремонт -
+    -- ищем новый по индексу (ID_Автомобиля, Время_устранения DESC, ID_Ремонта DESC).
+    -- При UPDATE сначала вызывается вычитание старых строк: поиск уже видит новые значения.
+    IF знак < 0 THEN
+        UPDATE Сводка_автомобиль с
+        SET (Последний_ремонт, ID_Последнего_ремонта, ID_Последней_неисправности, ID_Последнего_работника) = (
+            SELECT фр.Время_устранения, фр.ID_Ремонта, фр.ID_Неисправности, фр.ID_Работника
+            FROM Факт_ремонта фр
+            WHERE фр.ID_Автомобиля = с.ID_Автомобиля
+            ORDER BY фр.Время_устранения DESC, фр.ID_Ремонта DESC
+            LIMIT 1
+        )
+        FROM (SELECT DISTINCT р.ID_Автомобиля, р.ID_Ремонта FROM unnest(строки) р) у
+        WHERE с.ID_Автомобиля = у.ID_Автомобиля AND с.ID_Последнего_ремонта = у.ID_Ремонта;
+    ELSE
+        UPDATE Сводка_автомобиль с
+        SET Последний_ремонт = п.Время_устранения,
+            ID_Последнего_ремонта = п.ID_Ремонта,
+            ID_Последней_неисправности = п.ID_Неисправности,
+            ID_Последнего_работника = п.ID_Работника
+        FROM (
+            SELECT DISTINCT ON (р.ID_Автомобиля) р.*
+            FROM unnest(строки) р
+            ORDER BY р.ID_Автомобиля, р.Время_устранения DESC, р.ID_Ремонта DESC
+        ) п
+        WHERE с.ID_Автомобиля = п.ID_Автомобиля
+          AND (с.ID_Последнего_ремонта IS NULL
+               OR (п.Время_устранения, п.ID_Ремонта) > (с.Последний_ремонт, с.ID_Последнего_ремонта));
+    END IF;
+
+    IF появилось <> исчезло THEN
+        UPDATE Сводка_станция SET Автомобилей = Автомобилей + появилось - исчезло;
+    END IF;
+
+    IF знак < 0 THEN
+        DELETE FROM Сводка_марка_неисправность WHERE Количество = 0;
+        DELETE FROM Сводка_работник WHERE Количество = 0;
+        DELETE FROM Сводка_день с
+        USING (SELECT DISTINCT р.Время_устранения::date AS день FROM unnest(строки) р) д
+        WHERE с.День = д.день AND с.Ремонтов = 0;
+        DELETE FROM Сводка_автомобиль с
+        USING (SELECT DISTINCT р.ID_Автомобиля FROM unnest(строки) р) д
+        WHERE с.ID_Автомобиля = д.ID_Автомобиля AND с.Ремонтов = 0;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Полный пересчет сводок по исходным данным
+CREATE OR REPLACE FUNCTION rollups_rebuild() RETURNS void AS $$
+BEGIN
+    -- Запись ремонтов блокируется до конца транзакции, чтение - нет
+    LOCK TABLE Факт_ремонта IN SHARE MODE;
+
+    DELETE FROM Сводка_марка_неисправность;
+    DELETE FROM Сводка_работник;
+    DELETE FROM Сводка_день;
+    DELETE FROM Сводка_автомобиль;
+    DELETE FROM Сводка_станция;
+
+    INSERT INTO Сводка_марка_неисправность (Марка, ID_Неисправности, Количество)
+    SELECT а.Марка, фр.ID_Неисправности, COUNT(*)
+    FROM Факт_ремонта фр
+    JOIN Автомобиль а ON а.ID_Автомобиля = фр.ID_Автомобиля
+    GROUP BY а.Марка, фр.ID_Неисправности;
+
+    INSERT INTO Сводка_работник (ID_Работника, Количество)
+    SELECT ID_Работника, COUNT(*) FROM Факт_ремонта GROUP BY ID_Работника;
+
+    INSERT INTO Сводка_день (День, Ремонтов)
+    SELECT Время_устранения::date, COUNT(*) FROM Факт_ремонта GROUP BY Время_устранения::date;
+
+    INSERT INTO Сводка_автомобиль (ID_Автомобиля, Ремонтов, Последний_ремонт, ID_Последнего_ремонта,
+                                   ID_Последней_неисправности, ID_Последнего_работника)
+    SELECT п.ID_Автомобиля, к.n, п.Время_устранения, п.ID_Ремонта, п.ID_Неисправности, п.ID_Работника
+    FROM (SELECT ID_Автомобиля, COUNT(*) AS n FROM Факт_ремонта GROUP BY ID_Автомобиля) к
+    JOIN (
+        SELECT DISTINCT ON (ID_Автомобиля) *
+        FROM Факт_ремонта
+        ORDER BY ID_Автомобиля, Время_устранения DESC, ID_Ремонта DESC
+    ) п ON п.ID_Автомобиля = к.ID_Автомобиля;
+
+    INSERT INTO Сводка_станция (Автомобилей)
+    SELECT COUNT(*) FROM Сводка_автомобиль;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT rollups_rebuild();
@@ -0,0 +1,106 @@
+-- Уведомления кэша запросов по номеру и владельцу (services/lookup_cache.py) - одно на оператор.
+-- Построчные триггеры из 0003 при массовом импорте отправляли NOTIFY с подзапросом на каждую строку.
+
+-- Одно уведомление со всеми номерами и ФИО, затронутыми оператором. Если сообщение
+-- не помещается в предел NOTIFY (8000 байт), отправляется пустой объект - сброс всего кэша.
+CREATE OR REPLACE FUNCTION notify_lookup_keys(номера text[], фио text[]) RETURNS void AS $$
+DECLARE
+    сообщение text;
+BEGIN
+    IF coalesce(cardinality(номера), 0) = 0 AND coalesce(cardinality(фио), 0) = 0 THEN
+        RETURN;
+    END IF;
+    сообщение := json_build_object('plates', coalesce(номера, '{}'), 'owners', coalesce(фио, '{}'))::text;
+    IF octet_length(сообщение) > 7900 THEN
+        сообщение := '{}';
+    END IF;
+    PERFORM pg_notify('lookup_changed', сообщение);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION notify_car_change() RETURNS trigger AS $$
+DECLARE
+    номера text[];
+    фио text[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(DISTINCT а.Номер_госрегистрации::text),
+               array_agg(DISTINCT в.ФИО::text) FILTER (WHERE в.ФИО IS NOT NULL)
+        INTO номера, фио
+        FROM новые а LEFT JOIN Владелец в ON в.ID_Владельца = а.ID_Владельца;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(DISTINCT а.Номер_госрегистрации::text),
+               array_agg(DISTINCT в.ФИО::text) FILTER (WHERE в.ФИО IS NOT NULL)
+        INTO номера, фио
+        FROM старые а LEFT JOIN Владелец в ON в.ID_Владельца = а.ID_Владельца;
+    ELSE
+        SELECT array_agg(DISTINCT а.Номер_госрегистрации::text),
+               array_agg(DISTINCT в.ФИО::text) FILTER (WHERE в.ФИО IS NOT NULL)
+        INTO номера, фио
+        FROM (SELECT Номер_госрегистрации, ID_Владельца FROM старые
+              UNION ALL
+              SELECT Номер_госрегистрации, ID_Владельца FROM новые) а
+        LEFT JOIN Владелец в ON в.ID_Владельца = а.ID_Владельца;
+    END IF;
+    PERFORM notify_lookup_keys(номера, фио);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION notify_owner_change() RETURNS trigger AS $$
+DECLARE
+    фио text[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(DISTINCT ФИО::text) INTO фио FROM новые;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(DISTINCT ФИО::text) INTO фио FROM старые;
+    ELSE
+        SELECT array_agg(DISTINCT и.ФИО::text) INTO фио
+        FROM (SELECT ФИО FROM старые UNION ALL SELECT ФИО FROM новые) и;
+    END IF;
+    PERFORM notify_lookup_keys('{}', фио);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Триггер с таблицами переходов обслуживает одно событие, поэтому их по три на таблицу
+DROP TRIGGER IF EXISTS trg_автомобиль_notify ON Автомобиль;
+
+DROP TRIGGER IF EXISTS trg_автомобиль_notify_insert ON Автомобиль;
+CREATE TRIGGER trg_автомобиль_notify_insert
+AFTER INSERT ON Автомобиль
+REFERENCING NEW TABLE AS новые
+FOR EACH STATEMENT EXECUTE FUNCTION notify_car_change();
+
+DROP TRIGGER IF EXISTS trg_автомобиль_notify_update ON Автомобиль;
+CREATE TRIGGER trg_автомобиль_notify_update
+AFTER UPDATE ON Автомобиль
+REFERENCING OLD TABLE AS старые NEW TABLE AS новые
+FOR EACH STATEMENT EXECUTE FUNCTION notify_car_change();
+
+DROP TRIGGER IF EXISTS trg_автомобиль_notify_delete ON Автомобиль;
+CREATE TRIGGER trg_автомобиль_notify_delete
+AFTER DELETE ON Автомобиль
+REFERENCING OLD TABLE AS старые
+FOR EACH STATEMENT EXECUTE FUNCTION notify_car_change();
+
+DROP TRIGGER IF EXISTS trg_владелец_notify ON Владелец;
+
+DROP TRIGGER IF EXISTS trg_владелец_notify_insert ON Владелец;
+CREATE TRIGGER trg_владелец_notify_insert
+AFTER INSERT ON Владелец
+REFERENCING NEW TABLE AS новые
+FOR EACH STATEMENT EXECUTE FUNCTION notify_owner_change();
+
+DROP TRIGGER IF EXISTS trg_владелец_notify_update ON Владелец;
+CREATE TRIGGER trg_владелец_notify_update
+AFTER UPDATE ON Владелец
+REFERENCING OLD TABLE AS старые NEW TABLE AS новые
+FOR EACH STATEMENT EXECUTE FUNCTION notify_owner_change();
+
+DROP TRIGGER IF EXISTS trg_владелец_notify_delete ON Владелец;
+CREATE TRIGGER trg_владелец_notify_delete
+AFTER DELETE ON Владелец
+REFERENCING OLD TABLE AS старые
+FOR EACH STATEMENT EXECUTE FUNCTION notify_owner_change();
@@ -0,0 +1,42 @@
+-- Версия данных для кэша отчетов без блокировок (вместо счетчиков из 0009).
+-- UPDATE строки Версия_данных в триггере держал блокировку строки до конца транзакции,
+-- и все пишущие в одну таблицу транзакции выстраивались за ней в очередь.
+
+-- Триггер только добавляет строку: вставки не конфликтуют друг с другом.
+CREATE TABLE IF NOT EXISTS Изменение_данных (
+    ID BIGSERIAL PRIMARY KEY,
+    Таблица VARCHAR(63) NOT NULL
+);
+
+-- Версия - число изменений, видимых в снимке: Версия_данных (свернутые изменения)
+-- плюс строки Изменение_данных. Изменение становится видимым только после фиксации,
+-- поэтому версия, прочитанная в одном снимке с отчетом, соответствует его данным
+-- и растет с каждой зафиксированной транзакцией, в каком бы порядке они ни завершались.
+CREATE OR REPLACE FUNCTION bump_data_version() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO Изменение_данных (Таблица) VALUES (TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Перенос накопленных строк Изменение_данных в счетчики Версия_данных одной транзакцией:
+-- сумма, видимая в любом снимке, не меняется. Строки незафиксированных транзакций
+-- не видны оператору DELETE и остаются до следующего вызова.
+CREATE OR REPLACE FUNCTION compact_data_changes() RETURNS bigint AS $$
+DECLARE
+    перенесено bigint;
+BEGIN
+    WITH удалено AS (
+        DELETE FROM Изменение_данных RETURNING Таблица
+    ), итоги AS (
+        SELECT Таблица, count(*) AS число FROM удалено GROUP BY Таблица
+    ), обновлено AS (
+        INSERT INTO Версия_данных AS в (Таблица, Версия)
+        SELECT Таблица, число FROM итоги
+        ON CONFLICT (Таблица) DO UPDATE SET Версия = в.Версия + EXCLUDED.Версия
+        RETURNING 1
+    )
+    SELECT coalesce(sum(число), 0) INTO перенесено FROM итоги;
+    RETURN перенесено;
+END;
+$$ LANGUAGE plpgsql;
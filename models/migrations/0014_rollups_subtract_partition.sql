@@ -0,0 +1,69 @@
+-- Вычитание отключенной секции Факт_ремонта из сводок отчета (models/partitions.py).
+-- rollups_add собирал все строки секции в массив и разбирал его одним оператором;
+-- здесь каждая сводка уменьшается на итоги GROUP BY по секции.
+
+CREATE OR REPLACE FUNCTION rollups_subtract_partition(секция regclass) RETURNS void AS $$
+DECLARE
+    исчезло bigint;
+BEGIN
+    EXECUTE format($sql$
+        INSERT INTO Сводка_марка_неисправность AS с (Марка, ID_Неисправности, Количество)
+        SELECT а.Марка, ф.ID_Неисправности, -COUNT(*)
+        FROM %s ф
+        JOIN Автомобиль а ON а.ID_Автомобиля = ф.ID_Автомобиля
+        GROUP BY а.Марка, ф.ID_Неисправности
+        ORDER BY а.Марка, ф.ID_Неисправности
+        ON CONFLICT (Марка, ID_Неисправности) DO UPDATE SET Количество = с.Количество + EXCLUDED.Количество
+    $sql$, секция);
+
+    EXECUTE format($sql$
+        INSERT INTO Сводка_работник AS с (ID_Работника, Количество)
+        SELECT ID_Работника, -COUNT(*) FROM %s GROUP BY ID_Работника ORDER BY ID_Работника
+        ON CONFLICT (ID_Работника) DO UPDATE SET Количество = с.Количество + EXCLUDED.Количество
+    $sql$, секция);
+
+    EXECUTE format($sql$
+        INSERT INTO Сводка_день AS с (День, Ремонтов)
+        SELECT Время_устранения::date, -COUNT(*) FROM %s
+        GROUP BY Время_устранения::date ORDER BY Время_устранения::date
+        ON CONFLICT (День) DO UPDATE SET Ремонтов = с.Ремонтов + EXCLUDED.Ремонтов
+    $sql$, секция);
+
+    EXECUTE format($sql$
+        WITH дельта AS (
+            SELECT ID_Автомобиля, COUNT(*) AS n FROM %s GROUP BY ID_Автомобиля
+        ), изменение AS (
+            UPDATE Сводка_автомобиль с SET Ремонтов = с.Ремонтов - д.n
+            FROM дельта д
+            WHERE с.ID_Автомобиля = д.ID_Автомобиля
+            RETURNING с.Ремонтов
+        )
+        SELECT COUNT(*) FILTER (WHERE Ремонтов = 0) FROM изменение
+    $sql$, секция) INTO исчезло;
+
+    -- Последний ремонт из отключенной секции: секция уже не входит в Факт_ремонта,
+    -- новый последний ремонт ищется по idx_ремонт_автомобиль_время
+    EXECUTE format($sql$
+        UPDATE Сводка_автомобиль с
+        SET (Последний_ремонт, ID_Последнего_ремонта, ID_Последней_неисправности, ID_Последнего_работника) = (
+            SELECT фр.Время_устранения, фр.ID_Ремонта, фр.ID_Неисправности, фр.ID_Работника
+            FROM Факт_ремонта фр
+            WHERE фр.ID_Автомобиля = с.ID_Автомобиля
+            ORDER BY фр.Время_устранения DESC, фр.ID_Ремонта DESC
+            LIMIT 1
+        )
+        WHERE с.Ремонтов > 0
+          AND EXISTS (SELECT 1 FROM %s ф
+                      WHERE ф.ID_Ремонта = с.ID_Последнего_ремонта AND ф.Время_устранения = с.Последний_ремонт)
+    $sql$, секция);
+
+    IF исчезло > 0 THEN
+        UPDATE Сводка_станция SET Автомобилей = Автомобилей - исчезло;
+    END IF;
+
+    DELETE FROM Сводка_марка_неисправность WHERE Количество = 0;
+    DELETE FROM Сводка_работник WHERE Количество = 0;
+    DELETE FROM Сводка_день WHERE Ремонтов = 0;
+    DELETE FROM Сводка_автомобиль WHERE Ремонтов = 0;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,8 @@
+-- migrate: no-transaction
+-- idx_ремонт_время_авто_неисправность (прежняя версия 0010) повторял ведущий столбец
+-- idx_ремонт_время_id и строился без CONCURRENTLY, блокируя запись ремонтов.
+-- Удаление индекса секционированной таблицы - операция над каталогом; lock_timeout
+-- не дает ей встать в очередь за долгими запросами (миграция повторится при следующем запуске).
+SET lock_timeout = '5s';
+DROP INDEX IF EXISTS idx_ремонт_время_авто_неисправность;
+RESET lock_timeout;
@@ -0,0 +1,13 @@
+-- migrate: no-transaction
+-- Индекс поиска последнего ремонта автомобиля (сводка Сводка_автомобиль, миграция 0011).
+-- Для секционированной Факт_ремонта мигратор строит его ON ONLY, затем CONCURRENTLY
+-- на каждой секции с присоединением: запись ремонтов не блокируется.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ремонт_автомобиль_время
+    ON Факт_ремонта(ID_Автомобиля, Время_устранения DESC, ID_Ремонта DESC);
+
+-- Ведущий столбец нового индекса покрывает idx_ремонт_автомобиль (и каскадное удаление
+-- ремонтов автомобиля). Удаление - операция над каталогом, lock_timeout не дает ей
+-- встать в очередь за долгими запросами.
+SET lock_timeout = '5s';
+DROP INDEX IF EXISTS idx_ремонт_автомобиль;
+RESET lock_timeout;
@@ -0,0 +1,314 @@
+-- Сводки отчета без общих горячих строк (миграции 0008, 0011, 0014).
+-- Каждый ремонт обновлял одни и те же строки (сегодняшний день, работник, марка и
+-- неисправность), и блокировки этих строк до конца транзакции выстраивали параллельные
+-- записи ремонтов в очередь. Теперь триггеры только добавляют строки изменений, а
+-- rollups_fold переносит их в сводки пачкой. Чтение идет через представления Итог_*:
+-- сводка плюс еще не перенесенные изменения.
+
+CREATE TABLE IF NOT EXISTS Дельта_марка_неисправность (
+    ID BIGSERIAL PRIMARY KEY,
+    Марка VARCHAR(50) NOT NULL,
+    ID_Неисправности INTEGER NOT NULL,
+    Количество BIGINT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS Дельта_работник (
+    ID BIGSERIAL PRIMARY KEY,
+    ID_Работника INTEGER NOT NULL,
+    Количество BIGINT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS Дельта_день (
+    ID BIGSERIAL PRIMARY KEY,
+    День DATE NOT NULL,
+    Ремонтов BIGINT NOT NULL
+);
+
+CREATE OR REPLACE VIEW Итог_марка_неисправность AS
+SELECT Марка, ID_Неисправности, SUM(Количество)::bigint AS Количество
+FROM (SELECT Марка, ID_Неисправности, Количество FROM Сводка_марка_неисправность
+      UNION ALL
+      SELECT Марка, ID_Неисправности, Количество FROM Дельта_марка_неисправность) с
+GROUP BY Марка, ID_Неисправности
+HAVING SUM(Количество) <> 0;
+
+CREATE OR REPLACE VIEW Итог_работник AS
+SELECT ID_Работника, SUM(Количество)::bigint AS Количество
+FROM (SELECT ID_Работника, Количество FROM Сводка_работник
+      UNION ALL
+      SELECT ID_Работника, Количество FROM Дельта_работник) с
+GROUP BY ID_Работника
+HAVING SUM(Количество) <> 0;
+
+CREATE OR REPLACE VIEW Итог_день AS
+SELECT День, SUM(Ремонтов)::bigint AS Ремонтов
+FROM (SELECT День, Ремонтов FROM Сводка_день
+      UNION ALL
+      SELECT День, Ремонтов FROM Дельта_день) с
+GROUP BY День
+HAVING SUM(Ремонтов) <> 0;
+
+-- Перенос накопленных изменений в сводки одной транзакцией: итоги, видимые в любом
+-- снимке, не меняются. Изменения незафиксированных транзакций DELETE не видит, они
+-- останутся до следующего вызова. Возвращает число перенесенных строк изменений.
+CREATE OR REPLACE FUNCTION rollups_fold() RETURNS bigint AS $$
+DECLARE
+    перенесено bigint := 0;
+    строк bigint;
+BEGIN
+    WITH удалено AS (
+        DELETE FROM Дельта_марка_неисправность RETURNING Марка, ID_Неисправности, Количество
+    ), итоги AS (
+        SELECT Марка, ID_Неисправности, SUM(Количество) AS n, COUNT(*) AS записей
+        FROM удалено GROUP BY Марка, ID_Неисправности
+    ), сводка AS (
+        INSERT INTO Сводка_марка_неисправность AS с (Марка, ID_Неисправности, Количество)
+        SELECT Марка, ID_Неисправности, n FROM итоги ORDER BY Марка, ID_Неисправности
+        ON CONFLICT (Марка, ID_Неисправности) DO UPDATE SET Количество = с.Количество + EXCLUDED.Количество
+    )
+    SELECT coalesce(sum(итоги.записей), 0) INTO строк FROM итоги;
+    перенесено := перенесено + строк;
+
+    WITH удалено AS (
+        DELETE FROM Дельта_работник RETURNING ID_Работника, Количество
+    ), итоги AS (
+        SELECT ID_Работника, SUM(Количество) AS n, COUNT(*) AS записей FROM удалено GROUP BY ID_Работника
+    ), сводка AS (
+        INSERT INTO Сводка_работник AS с (ID_Работника, Количество)
+        SELECT ID_Работника, n FROM итоги ORDER BY ID_Работника
+        ON CONFLICT (ID_Работника) DO UPDATE SET Количество = с.Количество + EXCLUDED.Количество
+    )
+    SELECT coalesce(sum(итоги.записей), 0) INTO строк FROM итоги;
+    перенесено := перенесено + строк;
+
+    WITH удалено AS (
+        DELETE FROM Дельта_день RETURNING День, Ремонтов
+    ), итоги AS (
+        SELECT День, SUM(Ремонтов) AS n, COUNT(*) AS записей FROM удалено GROUP BY День
+    ), сводка AS (
+        INSERT INTO Сводка_день AS с (День, Ремонтов)
+        SELECT День, n FROM итоги ORDER BY День
+        ON CONFLICT (День) DO UPDATE SET Ремонтов = с.Ремонтов + EXCLUDED.Ремонтов
+    )
+    SELECT coalesce(sum(итоги.записей), 0) INTO строк FROM итоги;
+    перенесено := перенесено + строк;
+
+    DELETE FROM Сводка_марка_неисправность WHERE Количество = 0;
+    DELETE FROM Сводка_работник WHERE Количество = 0;
+    DELETE FROM Сводка_день WHERE Ремонтов = 0;
+    RETURN перенесено;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Прибавление (знак = 1) или вычитание (знак = -1) набора ремонтов во всех сводках
+CREATE OR REPLACE FUNCTION rollups_add(строки Факт_ремонта[], знак integer) RETURNS void AS $$
+DECLARE
+    появилось bigint;
+    исчезло bigint;
+BEGIN
+    IF строки IS NULL OR cardinality(строки) = 0 THEN
+        RETURN;
+    END IF;
+
+    -- Ремонты автомобиля, удаляемого каскадно, сюда не попадут: автомобиль уже не виден,
+    -- его вклад в сводку по маркам вычитает rollups_car_change
+    INSERT INTO Дельта_марка_неисправность (Марка, ID_Неисправности, Количество)
+    SELECT а.Марка, р.ID_Неисправности, знак * COUNT(*)
+    FROM unnest(строки) р
+    JOIN Автомобиль а ON а.ID_Автомобиля = р.ID_Автомобиля
+    GROUP BY а.Марка, р.ID_Неисправности;
+
+    INSERT INTO Дельта_работник (ID_Работника, Количество)
+    SELECT р.ID_Работника, знак * COUNT(*)
+    FROM unnest(строки) р
+    GROUP BY р.ID_Работника;
+
+    INSERT INTO Дельта_день (День, Ремонтов)
+    SELECT р.Время_устранения::date, знак * COUNT(*)
+    FROM unnest(строки) р
+    GROUP BY р.Время_устранения::date;
+
+    -- Строка автомобиля общая только для ремонтов одного автомобиля; переходы 0 -> N
+    -- и N -> 0 меняют число различных автомобилей
+    WITH дельта AS (
+        SELECT р.ID_Автомобиля, знак * COUNT(*) AS n
+        FROM unnest(строки) р
+        GROUP BY р.ID_Автомобиля
+    ),
+    изменение AS (
+        INSERT INTO Сводка_автомобиль AS с (ID_Автомобиля, Ремонтов)
+        SELECT ID_Автомобиля, n FROM дельта ORDER BY ID_Автомобиля
+        ON CONFLICT (ID_Автомобиля) DO UPDATE SET Ремонтов = с.Ремонтов + EXCLUDED.Ремонтов
+        RETURNING с.ID_Автомобиля, с.Ремонтов
+    )
+    SELECT COUNT(*) FILTER (WHERE и.Ремонтов > 0 AND и.Ремонтов = д.n),
+           COUNT(*) FILTER (WHERE и.Ремонтов = 0 AND д.n < 0)
+    INTO появилось, исчезло
+    FROM изменение и
+    JOIN дельта д ON д.ID_Автомобиля = и.ID_Автомобиля;
+
+    -- Последний ремонт автомобиля (карточка автомобиля). Удален последний ремонт -
+    -- ищем новый по индексу (ID_Автомобиля, Время_устранения DESC, ID_Ремонта DESC).
+    -- При UPDATE сначала вызывается вычитание старых строк: поиск уже видит новые значения.
+    IF знак < 0 THEN
+        UPDATE Сводка_автомобиль с
+        SET (Последний_ремонт, ID_Последнего_ремонта, ID_Последней_неисправности, ID_Последнего_работника) = (
+            SELECT фр.Время_устранения, фр.ID_Ремонта, фр.ID_Неисправности, фр.ID_Работника
+            FROM Факт_ремонта фр
+            WHERE фр.ID_Автомобиля = с.ID_Автомобиля
+            ORDER BY фр.Время_устранения DESC, фр.ID_Ремонта DESC
+            LIMIT 1
+        )
+        FROM (SELECT DISTINCT р.ID_Автомобиля, р.ID_Ремонта FROM unnest(строки) р) у
+        WHERE с.ID_Автомобиля = у.ID_Автомобиля AND с.ID_Последнего_ремонта = у.ID_Ремонта;
+    ELSE
+        UPDATE Сводка_автомобиль с
+        SET Последний_ремонт = п.Время_устранения,
+            ID_Последнего_ремонта = п.ID_Ремонта,
+            ID_Последней_неисправности = п.ID_Неисправности,
+            ID_Последнего_работника = п.ID_Работника
+        FROM (
+            SELECT DISTINCT ON (р.ID_Автомобиля) р.*
+            FROM unnest(строки) р
+            ORDER BY р.ID_Автомобиля, р.Время_устранения DESC, р.ID_Ремонта DESC
+        ) п
+        WHERE с.ID_Автомобиля = п.ID_Автомобиля
+          AND (с.ID_Последнего_ремонта IS NULL
+               OR (п.Время_устранения, п.ID_Ремонта) > (с.Последний_ремонт, с.ID_Последнего_ремонта));
+    END IF;
+
+    IF появилось <> исчезло THEN
+        UPDATE Сводка_станция SET Автомобилей = Автомобилей + появилось - исчезло;
+    END IF;
+
+    IF знак < 0 THEN
+        DELETE FROM Сводка_автомобиль с
+        USING (SELECT DISTINCT р.ID_Автомобиля FROM unnest(строки) р) д
+        WHERE с.ID_Автомобиля = д.ID_Автомобиля AND с.Ремонтов = 0;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Вклад ремонтов автомобиля в сводку по маркам (при смене марки и удалении автомобиля)
+CREATE OR REPLACE FUNCTION rollups_brand_add(авто integer, марка varchar, знак integer) RETURNS void AS $$
+BEGIN
+    INSERT INTO Дельта_марка_неисправность (Марка, ID_Неисправности, Количество)
+    SELECT марка, фр.ID_Неисправности, знак * COUNT(*)
+    FROM Факт_ремонта фр
+    WHERE фр.ID_Автомобиля = авто
+    GROUP BY фр.ID_Неисправности;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION rollups_subtract_partition(секция regclass) RETURNS void AS $$
+DECLARE
+    исчезло bigint;
+BEGIN
+    EXECUTE format($sql$
+        INSERT INTO Дельта_марка_неисправность (Марка, ID_Неисправности, Количество)
+        SELECT а.Марка, ф.ID_Неисправности, -COUNT(*)
+        FROM %s ф
+        JOIN Автомобиль а ON а.ID_Автомобиля = ф.ID_Автомобиля
+        GROUP BY а.Марка, ф.ID_Неисправности
+    $sql$, секция);
+
+    EXECUTE format($sql$
+        INSERT INTO Дельта_работник (ID_Работника, Количество)
+        SELECT ID_Работника, -COUNT(*) FROM %s GROUP BY ID_Работника
+    $sql$, секция);
+
+    EXECUTE format($sql$
+        INSERT INTO Дельта_день (День, Ремонтов)
+        SELECT Время_устранения::date, -COUNT(*) FROM %s GROUP BY Время_устранения::date
+    $sql$, секция);
+
+    EXECUTE format($sql$
+        WITH дельта AS (
+            SELECT ID_Автомобиля, COUNT(*) AS n FROM %s GROUP BY ID_Автомобиля
+        ), изменение AS (
+            UPDATE Сводка_автомобиль с SET Ремонтов = с.Ремонтов - д.n
+            FROM дельта д
+            WHERE с.ID_Автомобиля = д.ID_Автомобиля
+            RETURNING с.Ремонтов
+        )
+        SELECT COUNT(*) FILTER (WHERE Ремонтов = 0) FROM изменение
+    $sql$, секция) INTO исчезло;
+
+    -- Последний ремонт из отключенной секции: секция уже не входит в Факт_ремонта,
+    -- новый последний ремонт ищется по idx_ремонт_автомобиль_время
+    EXECUTE format($sql$
+        UPDATE Сводка_автомобиль с
+        SET (Последний_ремонт, ID_Последнего_ремонта, ID_Последней_неисправности, ID_Последнего_работника) = (
+            SELECT фр.Время_устранения, фр.ID_Ремонта, фр.ID_Неисправности, фр.ID_Работника
+            FROM Факт_ремонта фр
+            WHERE фр.ID_Автомобиля = с.ID_Автомобиля
+            ORDER BY фр.Время_устранения DESC, фр.ID_Ремонта DESC
+            LIMIT 1
+        )
+        WHERE с.Ремонтов > 0
+          AND EXISTS (SELECT 1 FROM %s ф
+                      WHERE ф.ID_Ремонта = с.ID_Последнего_ремонта AND ф.Время_устранения = с.Последний_ремонт)
+    $sql$, секция);
+
+    IF исчезло > 0 THEN
+        UPDATE Сводка_станция SET Автомобилей = Автомобилей - исчезло;
+    END IF;
+    DELETE FROM Сводка_автомобиль WHERE Ремонтов = 0;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION rollups_repairs_truncate() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM Дельта_марка_неисправность;
+    DELETE FROM Дельта_работник;
+    DELETE FROM Дельта_день;
+    DELETE FROM Сводка_марка_неисправность;
+    DELETE FROM Сводка_работник;
+    DELETE FROM Сводка_день;
+    DELETE FROM Сводка_автомобиль;
+    UPDATE Сводка_станция SET Автомобилей = 0;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Полный пересчет сводок по исходным данным
+CREATE OR REPLACE FUNCTION rollups_rebuild() RETURNS void AS $$
+BEGIN
+    -- Запись ремонтов блокируется до конца транзакции, чтение - нет
+    LOCK TABLE Факт_ремонта IN SHARE MODE;
+
+    DELETE FROM Дельта_марка_неисправность;
+    DELETE FROM Дельта_работник;
+    DELETE FROM Дельта_день;
+    DELETE FROM Сводка_марка_неисправность;
+    DELETE FROM Сводка_работник;
+    DELETE FROM Сводка_день;
+    DELETE FROM Сводка_автомобиль;
+    DELETE FROM Сводка_станция;
+
+    INSERT INTO Сводка_марка_неисправность (Марка, ID_Неисправности, Количество)
+    SELECT а.Марка, фр.ID_Неисправности, COUNT(*)
+    FROM Факт_ремонта фр
+    JOIN Автомобиль а ON а.ID_Автомобиля = фр.ID_Автомобиля
+    GROUP BY а.Марка, фр.ID_Неисправности;
+
+    INSERT INTO Сводка_работник (ID_Работника, Количество)
+    SELECT ID_Работника, COUNT(*) FROM Факт_ремонта GROUP BY ID_Работника;
+
+    INSERT INTO Сводка_день (День, Ремонтов)
+    SELECT Время_устранения::date, COUNT(*) FROM Факт_ремонта GROUP BY Время_устранения::date;
+
+    INSERT INTO Сводка_автомобиль (ID_Автомобиля, Ремонтов, Последний_ремонт, ID_Последнего_ремонта,
+                                   ID_Последней_неисправности, ID_Последнего_работника)
+    SELECT п.ID_Автомобиля, к.n, п.Время_устранения, п.ID_Ремонта, п.ID_Неисправности, п.ID_Работника
+    FROM (SELECT ID_Автомобиля, COUNT(*) AS n FROM Факт_ремонта GROUP BY ID_Автомобиля) к
+    JOIN (
+        SELECT DISTINCT ON (ID_Автомобиля) *
+        FROM Факт_ремонта
+        ORDER BY ID_Автомобиля, Время_устранения DESC, ID_Ремонта DESC
+    ) п ON п.ID_Автомобиля = к.ID_Автомобиля;
+
+    INSERT INTO Сводка_станция (Автомобилей)
+    SELECT COUNT(*) FROM Сводка_автомобиль;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,335 @@
+# models/migrator.py
+import hashlib
+import os
+import re
+import time
+import psycopg2
+from psycopg2 import errors
+from config.database import Database
+from models.partitions import partitioned_index_statements
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+# Имя файла миграции: 0001_описание.sql, номер задает порядок применения
+MIGRATION_FILE_RE = re.compile(r'^(\d+)_(\w+)\.sql$')
+
+# Первая строка файла, выполняемого вне транзакции (CREATE INDEX CONCURRENTLY, VALIDATE)
+NO_TRANSACTION_MARK = '-- migrate: no-transaction'
+
+# Ключ pg_advisory_lock: одновременно миграции применяет только один процесс
+LOCK_KEY = 0x4d494752
+
+SCHEMA_VERSION_DDL = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    name VARCHAR(200) NOT NULL,
+    checksum VARCHAR(32) NOT NULL,
+    applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    duration_ms INTEGER NOT NULL
+)
+"""
+
+CONCURRENT_INDEX_RE = re.compile(
+    r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)', re.IGNORECASE
+)
+
+# CREATE INDEX CONCURRENTLY имя ON таблица (...): для секционированной таблицы разворачивается
+PARTITIONED_INDEX_RE = re.compile(
+    r'^CREATE\s+(UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)\s+ON\s+(?!ONLY\b)(\w+)\s*(.*)$',
+    re.IGNORECASE | re.DOTALL
+)
+
+# Секции таблицы и есть ли у секции индекс, уже присоединенный к индексу таблицы
+PARTITIONS_FOR_INDEX_QUERY = """
+SELECT c.relname,
+       EXISTS (SELECT 1 FROM pg_inherits ii JOIN pg_index x ON x.indexrelid = ii.inhrelid
+               WHERE ii.inhparent = to_regclass(%s) AND x.indrelid = c.oid) AS indexed
+FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+WHERE i.inhparent = to_regclass(%s)
+ORDER BY c.relname
+"""
+
+
+class MigrationError(Exception):
+    """Ошибка применения миграции схемы"""
+
+
+def fold_identifier(name):
+    """Имя объекта без кавычек так, как его хранит PostgreSQL
+
+    Сервер приводит к нижнему регистру только латиницу: кириллица в pg_class остается
+    в исходном регистре, поэтому str.lower() здесь не подходит.
+    """
+    return ''.join(char.lower() if 'A' <= char <= 'Z' else char for char in name)
+
+
+def split_statements(sql):
+    """Разбиение SQL на операторы по ';' с учетом строк, комментариев и $$-блоков"""
+    statements = []
+    current = []
+    i = 0
+    length = len(sql)
+
+    while i < length:
+        char = sql[i]
+
+        if sql.startswith('--', i):
+            end = sql.find('\n', i)
+            end = length if end == -1 else end
+            current.append(sql[i:end])
+            i = end
+            continue
+
+        if sql.startswith('/*', i):
+            end = sql.find('*/', i + 2)
+            end = length if end == -1 else end + 2
+            current.append(sql[i:end])
+            i = end
+            continue
+
+        if char in ("'", '"'):
+            end = i + 1
+            while end < length:
+                if sql[end] == char:
+                    # Удвоенная кавычка - экранирование внутри строки
+                    if end + 1 < length and sql[end + 1] == char:
+                        end += 2
+                        continue
+                    break
+                end += 1
+            current.append(sql[i:end + 1])
+            i = end + 1
+            continue
+
+        if char == '$':
+            match = re.match(r'\$(\w*)\$', sql[i:])
+            if match:
+                tag = match.group(0)
+                end = sql.find(tag, i + len(tag))
+                end = length if end == -1 else end + len(tag)
+                current.append(sql[i:end])
+                i = end
+                continue
+
+        if char == ';':
+            statements.append(''.join(current))
+            current = []
+            i += 1
+            continue
+
+        current.append(char)
+        i += 1
+
+    statements.append(''.join(current))
+
+    result = []
+    for statement in statements:
+        # Оператор, состоящий только из комментариев, не выполняем
+        code = '\n'.join(line for line in statement.splitlines() if not line.strip().startswith('--'))
+        if code.strip():
+            result.append(statement.strip())
+    return result
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """Миграции из каталога, упорядоченные по номеру"""
+    migrations = []
+    seen = {}
+
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE_RE.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in seen:
+            raise MigrationError(f"Номер миграции {version} повторяется: {seen[version]}, {filename}")
+        seen[version] = filename
+
+        with open(os.path.join(directory, filename), 'r', encoding='utf-8') as f:
+            sql = f.read()
+
+        migrations.append({
+            'version': version,
+            'name': match.group(2),
+            'sql': sql,
+            'checksum': hashlib.md5(sql.encode('utf-8')).hexdigest(),
+            'transactional': not sql.lstrip().startswith(NO_TRANSACTION_MARK),
+        })
+
+    migrations.sort(key=lambda migration: migration['version'])
+    return migrations
+
+
+class Migrator:
+    """Применение версионированных миграций схемы из models/migrations
+
+    Примененные миграции записываются в таблицу schema_version. Проверка
+    «схема актуальна» при запуске стоит одного запроса.
+    """
+
+    def __init__(self, db=None, directory=MIGRATIONS_DIR):
+        self.db = db or Database()
+        self.directory = directory
+        self._migrations = None
+
+    @property
+    def migrations(self):
+        if self._migrations is None:
+            self._migrations = load_migrations(self.directory)
+        return self._migrations
+
+    @property
+    def latest_version(self):
+        return self.migrations[-1]['version'] if self.migrations else 0
+
+    def current_version(self):
+        """Версия схемы в БД (0 - миграции еще не применялись)"""
+        try:
+            result = self.db.execute_query("SELECT MAX(version) AS version FROM schema_version",
+                                           fetch=True, name='schema_version')
+        except errors.UndefinedTable:
+            return 0
+        return result[0]['version'] or 0
+
+    def is_current(self):
+        return self.current_version() >= self.latest_version
+
+    def _applied(self, cursor):
+        cursor.execute("SELECT version, checksum FROM schema_version")
+        return {row[0]: row[1] for row in cursor.fetchall()}
+
+    def _record(self, cursor, migration, started):
+        cursor.execute(
+            "INSERT INTO schema_version (version, name, checksum, duration_ms) VALUES (%s, %s, %s, %s)",
+            (migration['version'], migration['name'], migration['checksum'],
+             int((time.perf_counter() - started) * 1000))
+        )
+
+    def _drop_invalid_index(self, cursor, statement):
+        """Удаление недостроенного индекса после сбоя CREATE INDEX CONCURRENTLY
+
+        Иначе при повторе IF NOT EXISTS пропустит невалидный индекс.
+        """
+        match = CONCURRENT_INDEX_RE.search(statement)
+        if not match:
+            return
+        cursor.execute("""
+            SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = %s AND NOT i.indisvalid
+        """, (fold_identifier(match.group(1)),))
+        if cursor.fetchone():
+            cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {match.group(1)}")
+
+    def _expand_statement(self, cursor, statement):
+        """Операторы, которыми выполняется statement миграции вне транзакции
+
+        CREATE INDEX CONCURRENTLY на секционированной таблице заменяется построением
+        по секциям (partitioned_index_statements); остальные операторы - как есть.
+        Секции, индекс которых уже присоединен (повтор после сбоя), пропускаются.
+        """
+        code = '\n'.join(line for line in statement.splitlines() if not line.strip().startswith('--'))
+        match = PARTITIONED_INDEX_RE.match(code.strip())
+        if not match:
+            return [statement]
+        unique, index, table, definition = match.groups()
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+        row = cursor.fetchone()
+        if row is None or row[0] != 'p':
+            return [statement]
+        cursor.execute("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)", (index,))
+        row = cursor.fetchone()
+        if row is not None and row[0]:
+            # Индекс уже построен по всем секциям
+            return []
+        cursor.execute(PARTITIONS_FOR_INDEX_QUERY, (index, table))
+        partitions = [name for name, indexed in cursor.fetchall() if not indexed]
+        return partitioned_index_statements(index, table, definition.strip(), partitions, unique=bool(unique))
+
+    def _apply(self, conn, migration):
+        started = time.perf_counter()
+
+        if migration['transactional']:
+            conn.autocommit = False
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(migration['sql'])
+                    self._record(cursor, migration, started)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.autocommit = True
+            return
+
+        # Вне транзакции каждый оператор фиксируется сразу, поэтому операторы
+        # таких миграций должны быть повторяемыми (IF NOT EXISTS и т.п.)
+        with conn.cursor() as cursor:
+            for statement in split_statements(migration['sql']):
+                for step in self._expand_statement(cursor, statement):
+                    try:
+                        cursor.execute(step)
+                    except psycopg2.Error:
+                        self._drop_invalid_index(cursor, step)
+                        raise
+            self._record(cursor, migration, started)
+
+    def migrate(self):
+        """Применение недостающих миграций; возвращает список примененных"""
+        if self.is_current():
+            return []
+
+        applied_now = []
+        with self.db.connection() as conn:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_lock(%s)", (LOCK_KEY,))
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(SCHEMA_VERSION_DDL)
+                    # Повторное чтение под блокировкой: другой процесс мог успеть применить миграции
+                    applied = self._applied(cursor)
+
+                for migration in self.migrations:
+                    if migration['version'] in applied:
+                        continue
+                    try:
+                        self._apply(conn, migration)
+                    except psycopg2.Error as e:
+                        raise MigrationError(
+                            f"миграция {migration['version']:04d}_{migration['name']}: {str(e).strip()}"
+                        ) from e
+                    applied_now.append(migration)
+            finally:
+                try:
+                    with conn.cursor() as cursor:
+                        cursor.execute("SELECT pg_advisory_unlock(%s)", (LOCK_KEY,))
+                except psycopg2.Error:
+                    # Соединение потеряно - блокировка снята вместе с сеансом
+                    pass
+        return applied_now
+
+    def get_status(self):
+        """Состояние миграций: применена ли, когда, совпадает ли файл с примененным"""
+        try:
+            rows = self.db.execute_query(
+                "SELECT version, checksum, applied_at, duration_ms FROM schema_version",
+                fetch=True, name='schema_version_status'
+            )
+        except errors.UndefinedTable:
+            rows = []
+        applied = {row['version']: row for row in rows}
+
+        status = []
+        for migration in self.migrations:
+            row = applied.get(migration['version'])
+            status.append({
+                'version': migration['version'],
+                'name': migration['name'],
+                'applied': row is not None,
+                'applied_at': row['applied_at'] if row else None,
+                'duration_ms': row['duration_ms'] if row else None,
+                'modified': row is not None and row['checksum'] != migration['checksum'],
+            })
+        return status
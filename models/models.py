@@ -1,9 +1,13 @@
 from config.database import Database
+from models.migrator import Migrator
+from models.partitions import PartitionManager
 
 
 class AutoServiceModels:
     def __init__(self):
         self.db = Database()
+        self.migrator = Migrator(self.db)
+        self.partitions = PartitionManager(self.db)
         self.init_database()
 
     def diagnose_database(self):
@@ -57,101 +61,22 @@ class AutoServiceModels:
             return True
 
     def init_database(self):
-        """Инициализация структуры базы данных"""
-        queries = [
-            # Таблица Владельцев
-            """
-            CREATE TABLE IF NOT EXISTS Владелец (
-                ID_Владельца SERIAL PRIMARY KEY,
-                ФИО VARCHAR(100) NOT NULL,
-                Адрес VARCHAR(200)
-            )
-            """,
-
-            # Таблица Автомобилей
-            """
-            CREATE TABLE IF NOT EXISTS Автомобиль (
-                ID_Автомобиля SERIAL PRIMARY KEY,
-                Номер_госрегистрации VARCHAR(15) NOT NULL UNIQUE,
-                Марка VARCHAR(50) NOT NULL,
-                Год_выпуска INTEGER,
-                Изготовитель VARCHAR(50),
-                ID_Владельца INTEGER NOT NULL REFERENCES Владелец(ID_Владельца) ON DELETE CASCADE
-            )
-            """,
-
-            # Таблица Работников
-            """
-            CREATE TABLE IF NOT EXISTS Работник (
-                ID_Работника SERIAL PRIMARY KEY,
-                ФИО VARCHAR(100) NOT NULL
-            )
-            """,
-
-            # Таблица Неисправностей
-            """
-            CREATE TABLE IF NOT EXISTS Неисправность (
-                ID_Неисправности SERIAL PRIMARY KEY,
-                Тип_неисправности VARCHAR(100) NOT NULL UNIQUE
-            )
-            """,
-
-            # Таблица Фактов ремонта
-            """
-            CREATE TABLE IF NOT EXISTS Факт_ремонта (
-                ID_Ремонта SERIAL PRIMARY KEY,
-                ID_Автомобиля INTEGER NOT NULL REFERENCES Автомобиль(ID_Автомобиля) ON DELETE CASCADE,
-                ID_Работника INTEGER NOT NULL REFERENCES Работник(ID_Работника),
-                ID_Неисправности INTEGER NOT NULL REFERENCES Неисправность(ID_Неисправности),
-                Время_устранения TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-            )
-            """,
-
-            # Индексы для оптимизации
-            """
-            CREATE INDEX IF NOT EXISTS idx_автомобиль_владелец ON Автомобиль(ID_Владельца)
-            """,
-            """
-            CREATE INDEX IF NOT EXISTS idx_автомобиль_номер ON Автомобиль(Номер_госрегистрации)
-            """,
-            """
-            CREATE INDEX IF NOT EXISTS idx_ремонт_автомобиль ON Факт_ремонта(ID_Автомобиля)
-            """,
-            """
-            CREATE INDEX IF NOT EXISTS idx_ремонт_работник ON Факт_ремонта(ID_Работника)
-            """,
-            """
-            CREATE INDEX IF NOT EXISTS idx_ремонт_неисправность ON Факт_ремонта(ID_Неисправности)
-            """
-        ]
-        additional_constraints = [
-            # Проверка года выпуска автомобиля
-            """
-            ALTER TABLE Автомобиль 
-            ADD CONSTRAINT check_year 
-            CHECK (Год_выпуска BETWEEN 1900 AND EXTRACT(YEAR FROM CURRENT_DATE) + 1)
-            """,
-
-            # Проверка формата номера госрегистрации
-            """
-            ALTER TABLE Автомобиль
-            ADD CONSTRAINT check_license_plate
-            CHECK (Номер_госрегистрации SIMILAR TO '[АВЕКМНОРСТУХ][0-9]{3}[АВЕКМНОРСТУХ]{2}[0-9]{2,3}')
-            """,
+        """Приведение структуры базы данных к последней версии (миграции из models/migrations)
 
-            # Ограничение на время устранения неисправности (не в будущем)
-            """
-            ALTER TABLE Факт_ремонта
-            ADD CONSTRAINT check_repair_time
-            CHECK (Время_устранения <= CURRENT_TIMESTAMP)
-            """
-        ]
+        MigrationError не перехватывается: работать со схемой, обновленной не до конца, нельзя.
+        """
+        applied = self.migrator.migrate()
+        for migration in applied:
+            print(f"Применена миграция {migration['version']:04d}_{migration['name']}")
 
-        for query in queries:
-            try:
-                self.db.execute_query(query)
-            except Exception as e:
-                print(f"Ошибка при выполнении запроса: {e}")
+        # Обычно секции уже созданы заранее: один запрос к каталогу вместо обхода месяцев
+        try:
+            if self.partitions.partitions_missing():
+                for name in self.partitions.ensure_partitions():
+                    print(f"Создана секция {name}")
+        except Exception as e:
+            print(f"Ошибка при создании секций таблицы ремонтов: {e}")
+        return True
 
     def insert_test_data(self):
         """Вставка тестовых данных (только если база пустая)"""
@@ -0,0 +1,380 @@
+# models/partitions.py
+import hashlib
+import os
+import re
+from datetime import date, datetime, time
+from config.database import Database
+
+TABLE = 'Факт_ремонта'
+DEFAULT_PARTITION = 'Факт_ремонта_default'
+
+PARTITIONS_QUERY = """
+SELECT c.relname AS name,
+       pg_get_expr(c.relpartbound, c.oid) AS bound,
+       c.reltuples::bigint AS rows,
+       pg_total_relation_size(c.oid) AS size
+FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+WHERE i.inhparent = %s::regclass
+ORDER BY c.relname
+"""
+
+BOUND_RE = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+# Ограничение секции по умолчанию: все её строки раньше границы (см. PartitionManager._horizon)
+HORIZON_CONSTRAINT = f"{DEFAULT_PARTITION}_horizon"
+HORIZON_RE = re.compile(r"< '([^']+)'")
+
+
+def partition_index_name(index, partition, table=TABLE):
+    """Имя индекса секции: имя индекса таблицы и суффикс секции (_2024_01, _default)"""
+    suffix = partition[len(table):] if partition.startswith(table) else f"_{partition}"
+    name = f"{index}{suffix}"
+    # Имена длиннее 63 байт сервер обрезает - суффиксы секций могли бы совпасть
+    if len(name.encode('utf-8')) > 63:
+        name = f"idx_{hashlib.md5(f'{index}.{partition}'.encode('utf-8')).hexdigest()}"
+    return name
+
+
+def partitioned_index_statements(index, table, definition, partitions, unique=False):
+    """Построение индекса секционированной таблицы без блокировки записи
+
+    CREATE INDEX CONCURRENTLY для секционированной таблицы не поддерживается, а обычный
+    CREATE INDEX блокирует запись во все секции на время построения. Поэтому индекс
+    создается на самой таблице (ON ONLY, без построения, пока недействителен), на каждой
+    секции строится CONCURRENTLY и присоединяется; после последней секции индекс таблицы
+    становится действительным. definition - часть после имени таблицы: (столбцы) INCLUDE ... WHERE ...
+    """
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    statements = [f"CREATE {kind} IF NOT EXISTS {index} ON ONLY {table} {definition}"]
+    for partition in partitions:
+        name = partition_index_name(index, partition, table)
+        statements.append(f"CREATE {kind} CONCURRENTLY IF NOT EXISTS {name} ON {partition} {definition}")
+        statements.append(f"ALTER INDEX {index} ATTACH PARTITION {name}")
+    return statements
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(value, months):
+    month = value.month - 1 + months
+    return date(value.year + month // 12, month % 12 + 1, 1)
+
+
+def month_bounds(month):
+    """Границы месяца [начало, начало следующего) как значения TIMESTAMP"""
+    return datetime.combine(month, time.min), datetime.combine(add_months(month, 1), time.min)
+
+
+class PartitionManager:
+    """Помесячные секции таблицы Факт_ремонта
+
+    Секции создаются заранее на months_ahead месяцев вперед. Строки, попавшие в секцию
+    по умолчанию (данные до секционирования, импорт старых ремонтов), переносятся в
+    месячные секции порциями по batch_size строк, каждая порция - отдельной транзакцией.
+
+    Секция по умолчанию один раз получает проверенное ограничение «строки раньше границы»
+    (граница - первый будущий месяц, для которого создавалась секция). После этого ATTACH
+    будущих месяцев не просматривает секцию по умолчанию. Месяцы после границы должны
+    иметь секции заранее: строка месяца без секции нарушит ограничение.
+    """
+
+    def __init__(self, db=None, months_ahead=None, batch_size=None):
+        self.db = db or Database()
+        self.months_ahead = months_ahead if months_ahead is not None else \
+            int(os.getenv('DB_PARTITION_MONTHS_AHEAD', '3'))
+        self.batch_size = batch_size if batch_size is not None else \
+            int(os.getenv('DB_PARTITION_BATCH_SIZE', '5000'))
+
+    @staticmethod
+    def partition_name(month):
+        return f"{TABLE}_{month:%Y_%m}"
+
+    def list_partitions(self):
+        """Секции с границами и оценкой числа строк (по статистике планировщика)
+
+        Пустой список - таблица еще не секционирована.
+        """
+        partitions = []
+        for row in self.db.execute_query(PARTITIONS_QUERY, (TABLE,), fetch=True, name='list_partitions'):
+            match = BOUND_RE.search(row['bound'])
+            partitions.append({
+                'name': row['name'],
+                'start': datetime.fromisoformat(match.group(1)).date() if match else None,
+                'end': datetime.fromisoformat(match.group(2)).date() if match else None,
+                'rows': max(row['rows'], 0),
+                'size': row['size'],
+                'default': row['bound'] == 'DEFAULT',
+            })
+        return partitions
+
+    def _default_has_rows(self, start, end):
+        """Есть ли в секции по умолчанию строки месяца (по индексу на Время_устранения)"""
+        result = self.db.execute_query(f"""
+            SELECT EXISTS (
+                SELECT 1 FROM {DEFAULT_PARTITION}
+                WHERE Время_устранения >= %s AND Время_устранения < %s
+            ) AS has_rows
+        """, (start, end), fetch=True, name='default_partition_has_rows')
+        return result[0]['has_rows']
+
+    def _prepare_table(self, month):
+        """Отдельная (еще не подключенная) таблица будущей секции
+
+        Индексы, внешние ключи и CHECK копируются с родительской таблицы, поэтому ATTACH
+        присоединяет готовые индексы и ограничения, а не строит и не проверяет их. Ограничение
+        с границами месяца избавляет ATTACH от проверки строк самой секции. Таблица, оставшаяся
+        от прерванного переноса, используется повторно.
+        """
+        name = self.partition_name(month)
+        start, end = month_bounds(month)
+        with self.db.transaction() as cursor:
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL AS found", (name,))
+            if cursor.fetchone()['found']:
+                return name
+            cursor.execute(f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS "
+                           f"INCLUDING INDEXES)")
+            cursor.execute("""
+                SELECT pg_get_constraintdef(oid) AS definition FROM pg_constraint
+                WHERE conrelid = %s::regclass AND contype = 'f' AND conparentid = 0
+            """, (TABLE,))
+            for row in cursor.fetchall():
+                cursor.execute(f"ALTER TABLE {name} ADD {row['definition']}")
+            cursor.execute(
+                f"ALTER TABLE {name} ADD CONSTRAINT {name}_range "
+                f"CHECK (Время_устранения >= %s AND Время_устранения < %s)",
+                (start, end)
+            )
+        return name
+
+    def _copy_from_default(self, name, start, end):
+        """Копирование строк месяца из секции по умолчанию порциями, каждая в своей транзакции
+
+        Строки остаются в секции по умолчанию, пока секция не подключена, поэтому читающие
+        запросы видят их все время. Порции идут по ключу (Время_устранения, ID_Ремонта):
+        повторный запуск продолжает с последней скопированной строки.
+        """
+        last = self.db.execute_query(
+            f"SELECT Время_устранения, ID_Ремонта FROM {name} "
+            f"ORDER BY Время_устранения DESC, ID_Ремонта DESC LIMIT 1",
+            fetch=True, name='partition_copy_resume'
+        )
+        last = (last[0]['Время_устранения'], last[0]['id_Ремонта']) if last else None
+        copied = 0
+
+        while True:
+            after = "AND (Время_устранения, ID_Ремонта) > (%s, %s)" if last else ""
+            with self.db.transaction() as cursor:
+                cursor.execute(f"""
+                    WITH порция AS (
+                        SELECT ID_Ремонта, ID_Автомобиля, ID_Работника, ID_Неисправности, Время_устранения
+                        FROM {DEFAULT_PARTITION}
+                        WHERE Время_устранения >= %s AND Время_устранения < %s {after}
+                        ORDER BY Время_устранения, ID_Ремонта
+                        LIMIT %s
+                    ), копия AS (
+                        INSERT INTO {name} (ID_Ремонта, ID_Автомобиля, ID_Работника, ID_Неисправности,
+                                            Время_устранения)
+                        SELECT * FROM порция
+                    )
+                    SELECT Время_устранения, ID_Ремонта, (SELECT COUNT(*) FROM порция) AS rows
+                    FROM порция
+                    ORDER BY Время_устранения DESC, ID_Ремонта DESC
+                    LIMIT 1
+                """, (start, end, *(last or ()), self.batch_size))
+                row = cursor.fetchone()
+            if row is None:
+                return copied
+            copied += row['rows']
+            last = (row['Время_устранения'], row['id_Ремонта'])
+
+    def _move_month(self, month):
+        """Перенос строк месяца из секции по умолчанию в новую месячную секцию
+
+        Строки копируются в отдельную таблицу порциями (каждая фиксируется сразу), затем
+        короткая транзакция дописывает изменения, сделанные во время копирования, удаляет
+        строки месяца из секции по умолчанию и подключает секцию. Эта транзакция блокирует
+        запись в секцию по умолчанию и один раз просматривает её при ATTACH.
+        Возвращает число перенесенных строк.
+        """
+        name = self._prepare_table(month)
+        start, end = month_bounds(month)
+        self._copy_from_default(name, start, end)
+
+        with self.db.transaction() as cursor:
+            cursor.execute("SET LOCAL lock_timeout = '5s'")
+            cursor.execute(f"LOCK TABLE {DEFAULT_PARTITION} IN SHARE ROW EXCLUSIVE MODE")
+            # Строки, добавленные, измененные и удаленные, пока шло копирование
+            cursor.execute(f"""
+                DELETE FROM {name} p
+                WHERE NOT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} d
+                                  WHERE d.ID_Ремонта = p.ID_Ремонта AND d.Время_устранения = p.Время_устранения)
+            """)
+            cursor.execute(f"""
+                UPDATE {name} p
+                SET ID_Автомобиля = d.ID_Автомобиля, ID_Работника = d.ID_Работника,
+                    ID_Неисправности = d.ID_Неисправности
+                FROM {DEFAULT_PARTITION} d
+                WHERE d.ID_Ремонта = p.ID_Ремонта AND d.Время_устранения = p.Время_устранения
+                  AND (p.ID_Автомобиля, p.ID_Работника, p.ID_Неисправности)
+                      IS DISTINCT FROM (d.ID_Автомобиля, d.ID_Работника, d.ID_Неисправности)
+            """)
+            cursor.execute(f"""
+                INSERT INTO {name} (ID_Ремонта, ID_Автомобиля, ID_Работника, ID_Неисправности, Время_устранения)
+                SELECT d.ID_Ремонта, d.ID_Автомобиля, d.ID_Работника, d.ID_Неисправности, d.Время_устранения
+                FROM {DEFAULT_PARTITION} d
+                WHERE d.Время_устранения >= %s AND d.Время_устранения < %s
+                  AND NOT EXISTS (SELECT 1 FROM {name} p
+                                  WHERE p.ID_Ремонта = d.ID_Ремонта AND p.Время_устранения = d.Время_устранения)
+            """, (start, end))
+            cursor.execute(f"DELETE FROM {DEFAULT_PARTITION} WHERE Время_устранения >= %s AND Время_устранения < %s",
+                           (start, end))
+            moved = cursor.rowcount
+            cursor.execute(f"ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+                           (start, end))
+            cursor.execute(f"ALTER TABLE {name} DROP CONSTRAINT {name}_range")
+        return moved
+
+    def _horizon(self):
+        """Граница проверенного ограничения секции по умолчанию (datetime) или None"""
+        result = self.db.execute_query("""
+            SELECT pg_get_constraintdef(oid) AS definition FROM pg_constraint
+            WHERE conrelid = %s::regclass AND conname = %s AND convalidated
+        """, (DEFAULT_PARTITION, HORIZON_CONSTRAINT), fetch=True, name='default_partition_horizon')
+        match = HORIZON_RE.search(result[0]['definition']) if result else None
+        return datetime.fromisoformat(match.group(1)) if match else None
+
+    def _set_horizon(self, start):
+        """Ограничение «все строки секции по умолчанию раньше start» (start - будущий месяц)
+
+        Проверка VALIDATE просматривает секцию по умолчанию один раз и не блокирует запись;
+        строк будущего месяца (check_repair_time) за это время появиться не может.
+        """
+        with self.db.transaction() as cursor:
+            cursor.execute("SET LOCAL lock_timeout = '5s'")
+            cursor.execute(f"ALTER TABLE {DEFAULT_PARTITION} DROP CONSTRAINT IF EXISTS {HORIZON_CONSTRAINT}")
+            cursor.execute(
+                f"ALTER TABLE {DEFAULT_PARTITION} ADD CONSTRAINT {HORIZON_CONSTRAINT} "
+                f"CHECK (Время_устранения < %s) NOT VALID", (start,)
+            )
+        try:
+            with self.db.transaction() as cursor:
+                cursor.execute(f"ALTER TABLE {DEFAULT_PARTITION} VALIDATE CONSTRAINT {HORIZON_CONSTRAINT}")
+        except Exception:
+            # Непроверенное ограничение не помогает ATTACH, а строки после границы отвергает
+            self.db.execute_query(f"ALTER TABLE {DEFAULT_PARTITION} DROP CONSTRAINT IF EXISTS {HORIZON_CONSTRAINT}")
+            raise
+        return start
+
+    def _attach_empty(self, month):
+        """Подключение секции месяца, строк которого в секции по умолчанию нет
+
+        Для месяца после границы (_horizon) ATTACH только сверяет ограничения, иначе
+        просматривает секцию по умолчанию под блокировкой.
+        """
+        name = self._prepare_table(month)
+        start, end = month_bounds(month)
+        with self.db.transaction() as cursor:
+            cursor.execute("SET LOCAL lock_timeout = '5s'")
+            cursor.execute(f"ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+                           (start, end))
+            cursor.execute(f"ALTER TABLE {name} DROP CONSTRAINT {name}_range")
+
+    def partitions_missing(self, today=None):
+        """Нет ли какой-то из секций с текущего месяца на months_ahead вперед (один запрос к каталогу)
+
+        Проверка при запуске: ensure_partitions нужен, только если она возвращает True.
+        Для несекционированной таблицы - False.
+        """
+        first = month_start(today or date.today())
+        names = [self.partition_name(add_months(first, offset)) for offset in range(self.months_ahead + 1)]
+        result = self.db.execute_query("""
+            SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)) AS partitioned,
+                   (SELECT COUNT(*) FROM pg_inherits
+                    WHERE inhparent = to_regclass(%s)
+                      AND inhrelid IN (SELECT to_regclass(имя) FROM unnest(%s::text[]) имя)) AS attached
+        """, (TABLE, TABLE, names), fetch=True, name='partitions_missing')
+        return result[0]['partitioned'] and result[0]['attached'] < len(names)
+
+    def ensure_partitions(self, today=None):
+        """Создание недостающих секций с текущего месяца на months_ahead вперед
+
+        Данные не переносятся: месяц, строки которого уже лежат в секции по умолчанию,
+        пропускается (его переносит migrate_default из меню администратора).
+        """
+        partitions = self.list_partitions()
+        if not partitions:
+            return []
+
+        existing = {partition['start'] for partition in partitions if not partition['default']}
+        first = month_start(today or date.today())
+        horizon = self._horizon()
+
+        created = []
+        for offset in range(self.months_ahead + 1):
+            month = add_months(first, offset)
+            if month in existing:
+                continue
+            start, end = month_bounds(month)
+            if horizon is None and start > datetime.now():
+                horizon = self._set_horizon(start)
+            # До границы строки месяца могут лежать в секции по умолчанию
+            if (horizon is None or start < horizon) and self._default_has_rows(start, end):
+                continue
+            self._attach_empty(month)
+            created.append(self.partition_name(month))
+        return created
+
+    def migrate_default(self, max_months=None):
+        """Перенос строк из секции по умолчанию в месячные секции
+
+        За один вызов обрабатывается не более max_months месяцев (None - все).
+        Возвращает {'months': [имена секций], 'rows': перенесено строк}.
+        """
+        partitions = self.list_partitions()
+        if not partitions:
+            return {'months': [], 'rows': 0}
+
+        months = self.db.execute_query(f"""
+            SELECT DISTINCT date_trunc('month', Время_устранения)::date AS month
+            FROM {DEFAULT_PARTITION}
+            ORDER BY month
+        """, fetch=True, name='default_partition_months')
+        if max_months is not None:
+            months = months[:max_months]
+
+        existing = {partition['start'] for partition in partitions if not partition['default']}
+        report = {'months': [], 'rows': 0}
+        for row in months:
+            if row['month'] in existing:
+                # Пока секция месяца существует, строки этого месяца в DEFAULT не попадают
+                continue
+            report['rows'] += self._move_month(row['month'])
+            report['months'].append(self.partition_name(row['month']))
+        return report
+
+    def drop_partitions_before(self, cutoff, detach_only=False):
+        """Отключение (и удаление) секций, целиком лежащих раньше cutoff
+
+        DETACH/DROP секции - операция над метаданными; сводки уменьшаются на итоги GROUP BY
+        по секции (rollups_subtract_partition). lock_timeout не дает запросу встать
+        в очередь за долгими транзакциями.
+        """
+        dropped = []
+        for partition in self.list_partitions():
+            if partition['default'] or partition['end'] is None or partition['end'] > cutoff:
+                continue
+            with self.db.transaction() as cursor:
+                cursor.execute("SET LOCAL lock_timeout = '5s'")
+                cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {partition['name']}")
+                # Строки секции ушли из Факт_ремонта без триггеров: вычитаем их итоги из сводок
+                # отчета (после DETACH, чтобы последний ремонт автомобиля искался без них)
+                # и меняем версию данных для кэша отчетов
+                cursor.execute("SELECT rollups_subtract_partition(%s::regclass)", (partition['name'],))
+                cursor.execute("INSERT INTO Изменение_данных (Таблица) VALUES (%s)", (TABLE,))
+                if not detach_only:
+                    cursor.execute(f"DROP TABLE {partition['name']}")
+            dropped.append(partition['name'])
+        return dropped
@@ -0,0 +1,79 @@
+# services/async_auto_service.py
+from config.async_database import AsyncDatabase
+from services import queries
+
+
+class AsyncAutoService:
+    """Асинхронные версии запросов AutoService (результаты в том же виде - список словарей)"""
+
+    def __init__(self, db=None):
+        self.db = db or AsyncDatabase()
+
+    async def __aenter__(self):
+        await self.db.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.db.close()
+
+    # ЗАПРОСЫ ДЛЯ ДИСПЕТЧЕРА
+
+    async def get_owner_by_license(self, номер_госрегистрации):
+        """ФИО и адрес владельца автомобиля с данным номером госрегистрации"""
+        return await self.db.execute_query(queries.OWNER_BY_LICENSE, (номер_госрегистрации,), fetch=True)
+
+    async def get_car_info_by_owner(self, фио_владельца):
+        """Изготовитель, марка и год выпуска автомобиля данного владельца"""
+        return await self.db.execute_query(queries.CAR_INFO_BY_OWNER, (фио_владельца,), fetch=True)
+
+    async def get_fixed_faults_by_owner(self, фио_владельца):
+        """Перечень устраненных неисправностей автомобиля данного владельца"""
+        return await self.db.execute_query(queries.FIXED_FAULTS_BY_OWNER, (фио_владельца,), fetch=True)
+
+    async def get_repair_details(self, фио_владельца, тип_неисправности):
+        """ФИО работника и время устранения данной неисправности автомобиля данного владельца"""
+        return await self.db.execute_query(queries.REPAIR_DETAILS, (фио_владельца, тип_неисправности), fetch=True)
+
+    async def get_cars_repaired_by_employee(self, фио_работника):
+        """Какие автомобили ремонтировал данный работник станции"""
+        return await self.db.execute_query(queries.CARS_REPAIRED_BY_EMPLOYEE, (фио_работника,), fetch=True)
+
+    async def get_owners_by_fault_type(self, тип_неисправности):
+        """ФИО владельцев автомобилей с указанным типом неисправности"""
+        return await self.db.execute_query(queries.OWNERS_BY_FAULT_TYPE, (тип_неисправности,), fetch=True)
+
+    async def get_car_card(self, номер_госрегистрации):
+        """Карточка автомобиля: владелец, число ремонтов, последний ремонт, неисправность и работник"""
+        result = await self.db.execute_query(queries.CAR_CARD, (номер_госрегистрации,), fetch=True)
+        return result[0] if result else None
+
+    # СПРАВКИ И ОТЧЕТЫ
+
+    async def get_fault_report(self, фио_владельца=None):
+        """Справка о наличии неисправности автомобиля любого владельца"""
+        if фио_владельца:
+            return await self.db.execute_query(queries.FAULT_REPORT_BY_OWNER, (фио_владельца,), fetch=True)
+        return await self.db.execute_query(queries.FAULT_REPORT_ALL, fetch=True)
+
+    async def get_station_report(self, date_from=None, date_to=None, top_n=None):
+        """Отчет о работе станции техобслуживания (подзапросы выполняются одновременно в одном снимке)"""
+        total_cars, repair_details, faults_by_brand, employee_stats = await self.db.snapshot_queries(
+            queries.station_report_queries(date_from, date_to, top_n)
+        )
+        return total_cars[0]['total_cars'], repair_details, faults_by_brand, employee_stats
+
+    async def get_all_owners(self):
+        """Получить всех владельцев"""
+        return await self.db.execute_query(queries.ALL_OWNERS, fetch=True)
+
+    async def get_all_employees(self):
+        """Получить всех работников"""
+        return await self.db.execute_query(queries.ALL_EMPLOYEES, fetch=True)
+
+    async def get_all_cars(self):
+        """Получить все автомобили"""
+        return await self.db.execute_query(queries.ALL_CARS, fetch=True)
+
+    async def get_all_faults(self):
+        """Получить все типы неисправностей"""
+        return await self.db.execute_query(queries.ALL_FAULTS, fetch=True)
@@ -1,78 +1,127 @@
+import psycopg2
+from psycopg2.extras import execute_values
 from config.database import Database
+from services import queries
+from services.reference_cache import get_reference_cache
+from services.lookup_cache import get_lookup_cache
+from services.report_cache import get_report_cache
 from datetime import datetime
+import base64
+import json
+import os
+
+# Сколько строк Изменение_данных накапливать до свертки в Версия_данных
+DATA_CHANGES_COMPACT = int(os.getenv('DATA_CHANGES_COMPACT', '1000'))
 
 
 class AutoService:
     def __init__(self):
         self.db = Database()
+        self.refs = get_reference_cache()
+        self.lookups = get_lookup_cache()
+        self.reports = get_report_cache()
 
     # ОПЕРАЦИИ ИЗМЕНЕНИЯ ДАННЫХ
 
     def add_owner(self, фио, адрес):
         """Добавление информации о владельце"""
         query = "INSERT INTO Владелец (ФИО, Адрес) VALUES (%s, %s) RETURNING ID_Владельца"
-        result = self.db.execute_query(query, (фио, адрес), fetch=True)
+        result = self.db.execute_query(query, (фио, адрес), fetch=True, name='add_owner')
+        self.lookups.invalidate_owner(фио)
         # Используем правильное имя колонки: id_Владельца
         return f"Владелец '{фио}' успешно добавлен с ID: {result[0]['id_Владельца']}"
 
     def add_repair(self, номер_авто, фио_работника, тип_неисправности):
         """Регистрация ремонта"""
-        try:
-            # 1. Находим ID автомобиля
-            car_query = """
-            SELECT а.ID_Автомобиля, в.ФИО as владелец
+        # Поиск автомобиля и работника, создание неисправности (если её нет) и запись ремонта
+        # выполняются одним запросом. Неисправность, отсутствующая в снимке, вставляется
+        # через ON CONFLICT DO UPDATE: при одновременном создании того же типа другим
+        # диспетчером запрос получит уже существующую строку вместо ошибки уникальности.
+        repair_query = """
+        WITH авто AS (
+            SELECT а.ID_Автомобиля, в.ФИО AS владелец
             FROM Автомобиль а
             JOIN Владелец в ON а.ID_Владельца = в.ID_Владельца
-            WHERE а.Номер_госрегистрации = %s
-            """
-            car_result = self.db.execute_query(car_query, (номер_авто,), fetch=True)
-
-            if not car_result:
-                raise ValueError(f"Автомобиль с номером '{номер_авто}' не найден.")
-
-            id_авто = car_result[0]['id_Автомобиля']
-            владелец = car_result[0]['владелец']
-
-            # 2. Находим ID работника
-            employee_query = "SELECT ID_Работника FROM Работник WHERE ФИО = %s"
-            employee_result = self.db.execute_query(employee_query, (фио_работника,), fetch=True)
-
-            if not employee_result:
-                raise ValueError(f"Работник '{фио_работника}' не найден.")
-
-            id_работника = employee_result[0]['id_Работника']
-
-            # 3. Находим ID неисправности (создаём, если не существует)
-            fault_query = "SELECT ID_Неисправности FROM Неисправность WHERE Тип_неисправности = %s"
-            fault_result = self.db.execute_query(fault_query, (тип_неисправности,), fetch=True)
-
-            if not fault_result:
-                # Автоматически создаем неисправность, если её нет
-                fault_create = """
-                INSERT INTO Неисправность (Тип_неисправности) 
-                VALUES (%s) 
-                RETURNING ID_Неисправности
-                """
-                fault_result = self.db.execute_query(fault_create, (тип_неисправности,), fetch=True)
+            WHERE а.Номер_госрегистрации = %(plate)s
+        ),
+        работник AS (
+            SELECT ID_Работника FROM Работник WHERE ФИО = %(worker)s
+            ORDER BY ID_Работника
+            LIMIT 1
+        ),
+        новая_неисправность AS (
+            INSERT INTO Неисправность (Тип_неисправности)
+            SELECT %(fault)s::varchar
+            WHERE EXISTS (SELECT 1 FROM авто)
+              AND EXISTS (SELECT 1 FROM работник)
+              AND NOT EXISTS (SELECT 1 FROM Неисправность WHERE Тип_неисправности = %(fault)s)
+            ON CONFLICT (Тип_неисправности) DO UPDATE SET Тип_неисправности = EXCLUDED.Тип_неисправности
+            RETURNING ID_Неисправности
+        ),
+        неисправность AS (
+            SELECT ID_Неисправности FROM Неисправность WHERE Тип_неисправности = %(fault)s
+            UNION ALL
+            SELECT ID_Неисправности FROM новая_неисправность
+            LIMIT 1
+        ),
+        ремонт AS (
+            INSERT INTO Факт_ремонта (ID_Автомобиля, ID_Работника, ID_Неисправности, Время_устранения)
+            SELECT авто.ID_Автомобиля, работник.ID_Работника, неисправность.ID_Неисправности, CURRENT_TIMESTAMP
+            FROM авто, работник, неисправность
+            RETURNING ID_Ремонта
+        )
+        SELECT (SELECT ID_Ремонта FROM ремонт) AS id_ремонта,
+               (SELECT владелец FROM авто) AS владелец,
+               EXISTS (SELECT 1 FROM авто) AS авто_найден,
+               EXISTS (SELECT 1 FROM работник) AS работник_найден
+        """
 
-            id_неисправности = fault_result[0]['id_Неисправности']
+        params = {'plate': номер_авто, 'worker': фио_работника, 'fault': тип_неисправности}
 
-            # 4. Добавляем запись о ремонте
+        # Если работник и неисправность известны кэшу справочников, остается найти только автомобиль
+        id_работника = self.refs.get_worker_id(фио_работника)
+        id_неисправности = self.refs.get_fault_id(тип_неисправности) if id_работника is not None else None
+        if id_работника is not None and id_неисправности is not None:
             repair_query = """
-            INSERT INTO Факт_ремонта (ID_Автомобиля, ID_Работника, ID_Неисправности, Время_устранения) 
-            VALUES (%s, %s, %s, CURRENT_TIMESTAMP) 
-            RETURNING ID_Ремонта
+            WITH авто AS (
+                SELECT а.ID_Автомобиля, в.ФИО AS владелец
+                FROM Автомобиль а
+                JOIN Владелец в ON а.ID_Владельца = в.ID_Владельца
+                WHERE а.Номер_госрегистрации = %(plate)s
+            ),
+            ремонт AS (
+                INSERT INTO Факт_ремонта (ID_Автомобиля, ID_Работника, ID_Неисправности, Время_устранения)
+                SELECT авто.ID_Автомобиля, %(worker_id)s::integer, %(fault_id)s::integer, CURRENT_TIMESTAMP
+                FROM авто
+                RETURNING ID_Ремонта
+            )
+            SELECT (SELECT ID_Ремонта FROM ремонт) AS id_ремонта,
+                   (SELECT владелец FROM авто) AS владелец,
+                   EXISTS (SELECT 1 FROM авто) AS авто_найден,
+                   TRUE AS работник_найден
             """
+            params = {'plate': номер_авто, 'worker_id': id_работника, 'fault_id': id_неисправности}
 
+        try:
             result = self.db.execute_query(
                 repair_query,
-                (id_авто, id_работника, id_неисправности),
-                fetch=True
-            )
+                params,
+                fetch=True,
+                prepare=True,
+                name='add_repair'
+            )[0]
 
-            repair_id = result[0]['id_Ремонта']
+            if not result['авто_найден']:
+                raise ValueError(f"Автомобиль с номером '{номер_авто}' не найден.")
+            if not result['работник_найден']:
+                raise ValueError(f"Работник '{фио_работника}' не найден.")
+
+            repair_id = result['id_ремонта']
+            владелец = result['владелец']
             return {
                 'success': True,
+                'id': repair_id,
+                'owner': владелец,
                 'message': f"Ремонт #{repair_id} успешно зарегистрирован",
                 'details': f"Автомобиль: {номер_авто}, Владелец: {владелец}, Работник: {фио_работника}, Неисправность: {тип_неисправности}"
             }
@@ -82,6 +131,8 @@ class AutoService:
             error_msg = str(e).lower()
 
             if "foreign key constraint" in error_msg:
+                # ID из кэша справочников мог устареть
+                self.refs.invalidate()
                 if "id_автомобиля" in error_msg:
                     raise ValueError(f"Автомобиль с номером '{номер_авто}' не существует")
                 elif "id_работника" in error_msg:
@@ -92,17 +143,160 @@ class AutoService:
                 raise ValueError("Такой ремонт уже зарегистрирован")
             else:
                 raise Exception(f"Ошибка при регистрации ремонта: {str(e)}")
+
+    def register_repairs(self, repairs):
+        """Пакетная регистрация ремонтов за смену
+
+        repairs - итерируемое из кортежей (номер_авто, фио_работника, тип_неисправности[, время_устранения]).
+        Ошибочные строки не прерывают пакет: они возвращаются в 'failed' с номером строки.
+        """
+        result = {'inserted': [], 'failed': [], 'created_faults': []}
+
+        # 1. Проверка формата строк
+        rows = []
+        for row_num, item in enumerate(repairs, 1):
+            fields = [str(value).strip() if value is not None else '' for value in item]
+            if len(fields) not in (3, 4) or not all(fields[:3]):
+                result['failed'].append({
+                    'row': row_num,
+                    'data': item,
+                    'error': "Ожидается: номер автомобиля, ФИО работника, тип неисправности[, время устранения]"
+                })
+                continue
+            if len(fields[2]) > 100:
+                result['failed'].append({
+                    'row': row_num,
+                    'data': item,
+                    'error': "Тип неисправности слишком длинный (макс. 100 символов)"
+                })
+                continue
+            время = fields[3] if len(fields) == 4 and fields[3] else None
+            rows.append((row_num, fields[0], fields[1], fields[2], время))
+
+        if not rows:
+            return result
+
+        with self.db.transaction() as cursor:
+            # 2. Разрешение номеров и ФИО множественными запросами
+            cursor.execute(
+                "SELECT Номер_госрегистрации, ID_Автомобиля FROM Автомобиль WHERE Номер_госрегистрации = ANY(%s)",
+                (list({row[1] for row in rows}),)
+            )
+            cars = {car['Номер_госрегистрации']: car['id_Автомобиля'] for car in cursor.fetchall()}
+
+            # Работники и неисправности сначала ищутся в кэше справочников, в БД - только неизвестные
+            employees = {}
+            for фио in {row[2] for row in rows}:
+                id_работника = self.refs.get_worker_id(фио)
+                if id_работника is not None:
+                    employees[фио] = id_работника
+            unknown = [фио for фио in {row[2] for row in rows} if фио not in employees]
+            if unknown:
+                cursor.execute(
+                    """
+                    SELECT DISTINCT ON (ФИО) ФИО, ID_Работника
+                    FROM Работник
+                    WHERE ФИО = ANY(%s)
+                    ORDER BY ФИО, ID_Работника
+                    """,
+                    (unknown,)
+                )
+                employees.update({emp['ФИО']: emp['id_Работника'] for emp in cursor.fetchall()})
+
+            ready = []
+            for row in rows:
+                row_num, номер_авто, фио_работника = row[0], row[1], row[2]
+                if номер_авто not in cars:
+                    result['failed'].append({'row': row_num, 'data': row[1:], 'error': f"Автомобиль с номером '{номер_авто}' не найден"})
+                elif фио_работника not in employees:
+                    result['failed'].append({'row': row_num, 'data': row[1:], 'error': f"Работник '{фио_работника}' не найден"})
+                else:
+                    ready.append(row)
+
+            if ready:
+                # 3. Неисправности: недостающие создаются одним запросом (в порядке сортировки,
+                # чтобы параллельные пакеты не взаимоблокировались)
+                fault_types = sorted({row[3] for row in ready})
+                faults = {}
+                for fault_type in fault_types:
+                    id_неисправности = self.refs.get_fault_id(fault_type)
+                    if id_неисправности is not None:
+                        faults[fault_type] = id_неисправности
+                unknown = [fault_type for fault_type in fault_types if fault_type not in faults]
+                if unknown:
+                    cursor.execute(
+                        "SELECT Тип_неисправности, ID_Неисправности FROM Неисправность WHERE Тип_неисправности = ANY(%s)",
+                        (unknown,)
+                    )
+                    faults.update({fault['Тип_неисправности']: fault['id_Неисправности'] for fault in cursor.fetchall()})
+
+                missing = [(fault_type,) for fault_type in fault_types if fault_type not in faults]
+                if missing:
+                    created = execute_values(
+                        cursor,
+                        """
+                        INSERT INTO Неисправность (Тип_неисправности) VALUES %s
+                        ON CONFLICT (Тип_неисправности) DO UPDATE SET Тип_неисправности = EXCLUDED.Тип_неисправности
+                        RETURNING Тип_неисправности, ID_Неисправности
+                        """,
+                        missing,
+                        page_size=len(missing),
+                        fetch=True
+                    )
+                    for fault in created:
+                        faults[fault['Тип_неисправности']] = fault['id_Неисправности']
+                        result['created_faults'].append(fault['Тип_неисправности'])
+
+                # 4. Вставка всех ремонтов одним запросом
+                values = [(cars[row[1]], employees[row[2]], faults[row[3]], row[4]) for row in ready]
+                insert_query = """
+                INSERT INTO Факт_ремонта (ID_Автомобиля, ID_Работника, ID_Неисправности, Время_устранения)
+                VALUES %s
+                RETURNING ID_Ремонта
+                """
+                template = "(%s, %s, %s, COALESCE(%s::timestamp, CURRENT_TIMESTAMP))"
+
+                cursor.execute("SAVEPOINT repairs_batch")
+                try:
+                    inserted = execute_values(cursor, insert_query, values, template=template,
+                                              page_size=len(values), fetch=True)
+                    cursor.execute("RELEASE SAVEPOINT repairs_batch")
+                    pairs = zip(ready, (item['id_Ремонта'] for item in inserted))
+                except psycopg2.Error:
+                    # Пакет отвергнут базой - вставляем построчно, чтобы найти ошибочные строки
+                    cursor.execute("ROLLBACK TO SAVEPOINT repairs_batch")
+                    pairs = []
+                    for row, row_values in zip(ready, values):
+                        cursor.execute("SAVEPOINT repair_row")
+                        try:
+                            inserted = execute_values(cursor, insert_query, [row_values], template=template, fetch=True)
+                            cursor.execute("RELEASE SAVEPOINT repair_row")
+                            pairs.append((row, inserted[0]['id_Ремонта']))
+                        except psycopg2.Error as e:
+                            cursor.execute("ROLLBACK TO SAVEPOINT repair_row")
+                            result['failed'].append({'row': row[0], 'data': row[1:], 'error': str(e).strip()})
+
+                for row, repair_id in pairs:
+                    result['inserted'].append({
+                        'row': row[0],
+                        'id': repair_id,
+                        'details': f"Автомобиль: {row[1]}, Работник: {row[2]}, Неисправность: {row[3]}"
+                    })
+
+        result['failed'].sort(key=lambda item: item['row'])
+        return result
+
     def delete_employee(self, id_работника):
         """Удаление информации о работнике станции"""
         query = "DELETE FROM Работник WHERE ID_Работника = %s"
-        self.db.execute_query(query, (id_работника,))
+        self.db.execute_query(query, (id_работника,), name='delete_employee')
         return f"Работник с ID {id_работника} удален"
 
     def update_car_license(self, id_автомобиля, новый_номер):
         """Изменение номера автомобиля с полной проверкой"""
         # 1. Проверить существование авто
         check_query = "SELECT Номер_госрегистрации, Марка FROM Автомобиль WHERE ID_Автомобиля = %s"
-        car = self.db.execute_query(check_query, (id_автомобиля,), fetch=True)
+        car = self.db.execute_query(check_query, (id_автомобиля,), fetch=True, name='car_by_id')
 
         if not car:
             raise ValueError(f"Автомобиль с ID={id_автомобиля} не найден")
@@ -117,7 +311,8 @@ class AutoService:
             FROM Автомобиль 
             WHERE Номер_госрегистрации = %s AND ID_Автомобиля != %s
             """
-            duplicate = self.db.execute_query(duplicate_query, (новый_номер, id_автомобиля), fetch=True)
+            duplicate = self.db.execute_query(duplicate_query, (новый_номер, id_автомобиля), fetch=True,
+                                              name='car_license_duplicate')
 
             if duplicate:
                 duplicate_id = duplicate[0]['id_Автомобиля']
@@ -130,7 +325,9 @@ class AutoService:
         update_query = "UPDATE Автомобиль SET Номер_госрегистрации = %s WHERE ID_Автомобиля = %s"
 
         try:
-            rowcount = self.db.execute_query(update_query, (новый_номер, id_автомобиля))
+            rowcount = self.db.execute_query(update_query, (новый_номер, id_автомобиля), name='update_car_license')
+            self.lookups.invalidate_plate(old_license)
+            self.lookups.invalidate_plate(новый_номер)
 
             if rowcount == 0:
                 # Технически сюда не должны попасть, т.к. уже проверили существование
@@ -165,7 +362,7 @@ class AutoService:
     def add_employee(self, фио):
         """Добавление работника"""
         query = "INSERT INTO Работник (ФИО) VALUES (%s) RETURNING ID_Работника"
-        result = self.db.execute_query(query, (фио,), fetch=True)
+        result = self.db.execute_query(query, (фио,), fetch=True, name='add_employee')
         return f"Работник '{фио}' добавлен с ID: {result[0]['id_Работника']}"
 
     def add_fault(self, тип_неисправности):
@@ -177,12 +374,15 @@ class AutoService:
         if len(тип_неисправности.strip()) > 100:
             raise ValueError("Тип неисправности слишком длинный (макс. 100 символов)")
 
-        # Проверка существования
-        check_query = "SELECT ID_Неисправности FROM Неисправность WHERE Тип_неисправности = %s"
-        existing = self.db.execute_query(check_query, (тип_неисправности.strip(),), fetch=True)
+        # Проверка существования (сначала по кэшу справочников)
+        fault_id = self.refs.get_fault_id(тип_неисправности.strip())
+        if fault_id is None:
+            check_query = "SELECT ID_Неисправности FROM Неисправность WHERE Тип_неисправности = %s"
+            existing = self.db.execute_query(check_query, (тип_неисправности.strip(),), fetch=True, name='fault_id')
+            if existing:
+                fault_id = existing[0]['id_Неисправности']
 
-        if existing:
-            fault_id = existing[0]['id_Неисправности']
+        if fault_id is not None:
             return {
                 'status': 'exists',
                 'message': f"Неисправность '{тип_неисправности}' уже существует",
@@ -197,7 +397,7 @@ class AutoService:
         """
 
         try:
-            result = self.db.execute_query(insert_query, (тип_неисправности.strip(),), fetch=True)
+            result = self.db.execute_query(insert_query, (тип_неисправности.strip(),), fetch=True, name='add_fault')
             fault_id = result[0]['id_Неисправности']
             return {
                 'status': 'created',
@@ -212,57 +412,42 @@ class AutoService:
 
     def get_owner_by_license(self, номер_госрегистрации):
         """ФИО и адрес владельца автомобиля с данным номером госрегистрации"""
-        query = """
-        SELECT в.ФИО, в.Адрес 
-        FROM Владелец в
-        JOIN Автомобиль а ON в.ID_Владельца = а.ID_Владельца
-        WHERE а.Номер_госрегистрации = %s
-        """
-        return self.db.execute_query(query, (номер_госрегистрации,), fetch=True)
+        key = ('owner_by_license', номер_госрегистрации)
+        generation = self.lookups.generation
+        result = self.lookups.get(key)
+        if result is None:
+            result = self.db.execute_query(queries.OWNER_BY_LICENSE, (номер_госрегистрации,), fetch=True,
+                                           prepare=True, name='owner_by_license', readonly=True)
+            self.lookups.put(key, result, generation)
+        return result
 
     def get_car_info_by_owner(self, фио_владельца):
         """Изготовитель, марка и год выпуска автомобиля данного владельца"""
-        query = """
-        SELECT а.Номер_госрегистрации, а.Марка, а.Год_выпуска, а.Изготовитель
-        FROM Автомобиль а
-        JOIN Владелец в ON а.ID_Владельца = в.ID_Владельца
-        WHERE в.ФИО = %s
-        """
-        return self.db.execute_query(query, (фио_владельца,), fetch=True)
+        key = ('car_info_by_owner', фио_владельца)
+        generation = self.lookups.generation
+        result = self.lookups.get(key)
+        if result is None:
+            result = self.db.execute_query(queries.CAR_INFO_BY_OWNER, (фио_владельца,), fetch=True,
+                                           prepare=True, name='car_info_by_owner', readonly=True)
+            self.lookups.put(key, result, generation)
+        return result
 
     def get_fixed_faults_by_owner(self, фио_владельца):
         """Перечень устраненных неисправностей автомобиля данного владельца"""
-        query = """
-        SELECT DISTINCT н.Тип_неисправности as тип_неисправности
-        FROM Факт_ремонта фр
-        JOIN Автомобиль а ON фр.ID_Автомобиля = а.ID_Автомобиля
-        JOIN Владелец в ON а.ID_Владельца = в.ID_Владельца
-        JOIN Неисправность н ON фр.ID_Неисправности = н.ID_Неисправности
-        WHERE в.ФИО = %s
-        ORDER BY н.Тип_неисправности
-        """
-        return self.db.execute_query(query, (фио_владельца,), fetch=True)
+        return self.db.execute_query(queries.FIXED_FAULTS_BY_OWNER, (фио_владельца,), fetch=True, prepare=True,
+                                     name='fixed_faults_by_owner', readonly=True)
 
     def get_repair_details(self, фио_владельца, тип_неисправности):
         """ФИО работника и время устранения данной неисправности автомобиля данного владельца"""
-        query = """
-        SELECT р.ФИО as Работник, а.Номер_госрегистрации, фр.Время_устранения
-        FROM Факт_ремонта фр
-        JOIN Автомобиль а ON фр.ID_Автомобиля = а.ID_Автомобиля
-        JOIN Владелец в ON а.ID_Владельца = в.ID_Владельца
-        JOIN Работник р ON фр.ID_Работника = р.ID_Работника
-        JOIN Неисправность н ON фр.ID_Неисправности = н.ID_Неисправности
-        WHERE в.ФИО = %s AND н.Тип_неисправности = %s
-        ORDER BY фр.Время_устранения DESC
-        """
-        return self.db.execute_query(query, (фио_владельца, тип_неисправности), fetch=True)
+        return self.db.execute_query(queries.REPAIR_DETAILS, (фио_владельца, тип_неисправности), fetch=True, prepare=True,
+                                     name='repair_details', readonly=True)
 
     def add_car(self, номер_госрегистрации, марка, год_выпуска, изготовитель, фио_владельца):
         """Добавление автомобиля с указанием владельца"""
         try:
             # 1. Находим ID владельца
             owner_query = "SELECT ID_Владельца FROM Владелец WHERE ФИО = %s"
-            owner_result = self.db.execute_query(owner_query, (фио_владельца,), fetch=True)
+            owner_result = self.db.execute_query(owner_query, (фио_владельца,), fetch=True, name='owner_id')
 
             if not owner_result:
                 raise ValueError(f"Владелец '{фио_владельца}' не найден. Сначала добавьте владельца.")
@@ -271,7 +456,7 @@ class AutoService:
 
             # 2. Проверяем уникальность номера
             check_query = "SELECT ID_Автомобиля FROM Автомобиль WHERE Номер_госрегистрации = %s"
-            existing = self.db.execute_query(check_query, (номер_госрегистрации,), fetch=True)
+            existing = self.db.execute_query(check_query, (номер_госрегистрации,), fetch=True, name='car_id')
 
             if existing:
                 raise ValueError(f"Автомобиль с номером '{номер_госрегистрации}' уже существует")
@@ -291,10 +476,13 @@ class AutoService:
             result = self.db.execute_query(
                 insert_query,
                 (номер_госрегистрации, марка, год_выпуска, изготовитель, id_владельца),
-                fetch=True
+                fetch=True,
+                name='add_car'
             )
 
             car_id = result[0]['id_Автомобиля']
+            self.lookups.invalidate_plate(номер_госрегистрации)
+            self.lookups.invalidate_owner(фио_владельца)
             return {
                 'success': True,
                 'message': f"Автомобиль {марка} ({номер_госрегистрации}) успешно добавлен",
@@ -315,114 +503,182 @@ class AutoService:
 
     def get_cars_repaired_by_employee(self, фио_работника):
         """Какие автомобили ремонтировал данный работник станции"""
-        query = """
-        SELECT DISTINCT а.Марка, а.Номер_госрегистрации, в.ФИО as Владелец, н.Тип_неисправности
-        FROM Факт_ремонта фр
-        JOIN Автомобиль а ON фр.ID_Автомобиля = а.ID_Автомобиля
-        JOIN Владелец в ON а.ID_Владельца = в.ID_Владельца
-        JOIN Работник р ON фр.ID_Работника = р.ID_Работника
-        JOIN Неисправность н ON фр.ID_Неисправности = н.ID_Неисправности
-        WHERE р.ФИО = %s
-        ORDER BY а.Марка
-        """
-        return self.db.execute_query(query, (фио_работника,), fetch=True)
+        return self.db.execute_query(queries.CARS_REPAIRED_BY_EMPLOYEE, (фио_работника,), fetch=True,
+                                     name='cars_repaired_by_employee', readonly=True)
 
     def get_owners_by_fault_type(self, тип_неисправности):
         """ФИО владельцев автомобилей с указанным типом неисправности"""
-        query = """
-        SELECT DISTINCT в.ФИО, а.Номер_госрегистрации, а.Марка
-        FROM Факт_ремонта фр
-        JOIN Автомобиль а ON фр.ID_Автомобиля = а.ID_Автомобиля
-        JOIN Владелец в ON а.ID_Владельца = в.ID_Владельца
-        JOIN Неисправность н ON фр.ID_Неисправности = н.ID_Неисправности
-        WHERE н.Тип_неисправности = %s
-        ORDER BY в.ФИО
+        return self.db.execute_query(queries.OWNERS_BY_FAULT_TYPE, (тип_неисправности,), fetch=True,
+                                     name='owners_by_fault_type', readonly=True)
+
+    def get_car_card(self, номер_госрегистрации):
+        """Карточка автомобиля: владелец, число ремонтов, последний ремонт, неисправность и работник
+
+        Возвращает словарь или None, если автомобиля с таким номером нет.
         """
-        return self.db.execute_query(query, (тип_неисправности,), fetch=True)
+        result = self.db.execute_query(queries.CAR_CARD, (номер_госрегистрации,), fetch=True, prepare=True,
+                                       name='car_card', readonly=True)
+        return result[0] if result else None
 
     # СПРАВКИ И ОТЧЕТЫ
 
-    def get_fault_report(self, фио_владельца=None):
-        """Справка о наличии неисправности автомобиля любого владельца"""
-        if фио_владельца:
-            query = """
-            SELECT в.ФИО, а.Марка, а.Номер_госрегистрации, 
-                   н.Тип_неисправности, фр.Время_устранения
-            FROM Факт_ремонта фр
-            JOIN Автомобиль а ON фр.ID_Автомобиля = а.ID_Автомобиля
-            JOIN Владелец в ON а.ID_Владельца = в.ID_Владельца
-            JOIN Неисправность н ON фр.ID_Неисправности = н.ID_Неисправности
-            WHERE в.ФИО = %s
-            ORDER BY фр.Время_устранения DESC
-            """
-            return self.db.execute_query(query, (фио_владельца,), fetch=True)
-        else:
-            query = """
-            SELECT в.ФИО, а.Марка, а.Номер_госрегистрации, 
-                   н.Тип_неисправности, фр.Время_устранения
-            FROM Факт_ремонта фр
-            JOIN Автомобиль а ON фр.ID_Автомобиля = а.ID_Автомобиля
-            JOIN Владелец в ON а.ID_Владельца = в.ID_Владельца
-            JOIN Неисправность н ON фр.ID_Неисправности = н.ID_Неисправности
-            ORDER BY в.ФИО, фр.Время_устранения DESC
-            """
-            return self.db.execute_query(query, fetch=True)
-
-    def get_station_report(self):
-        """Отчет о работе станции техобслуживания"""
-        # Количество ремонтируемых автомобилей
-        query1 = "SELECT COUNT(DISTINCT ID_Автомобиля) as total_cars FROM Факт_ремонта"
-        total_cars = self.db.execute_query(query1, fetch=True)[0]['total_cars']
-
-        # Детали ремонтов
-        query2 = """
-        SELECT а.Номер_госрегистрации, в.ФИО as Владелец, 
-               р.ФИО as Работник, н.Тип_неисправности, фр.Время_устранения
-        FROM Факт_ремонта фр
-        JOIN Автомобиль а ON фр.ID_Автомобиля = а.ID_Автомобиля
-        JOIN Владелец в ON а.ID_Владельца = в.ID_Владельца
-        JOIN Работник р ON фр.ID_Работника = р.ID_Работника
-        JOIN Неисправность н ON фр.ID_Неисправности = н.ID_Неисправности
-        ORDER BY фр.Время_устранения DESC
-        LIMIT 50
+    def _data_version(self):
+        row = self.db.execute_query(queries.DATA_VERSION, fetch=True, name='data_version',
+                                    readonly=True)[0]
+        if row['changes'] > DATA_CHANGES_COMPACT:
+            # Версия считается по строкам журнала изменений: сворачиваем их в счетчики,
+            # чтобы чтение версии оставалось дешевым (сама версия при этом не меняется).
+            # Заодно в сводки переносятся накопленные изменения сводок (rollups_fold)
+            self.db.execute_query(queries.COMPACT_DATA_CHANGES, fetch=True, name='compact_data_changes')
+        return row['version']
+
+    def _cached_report(self, report, params, statements):
+        """Результаты подзапросов отчета из кэша, если данные не менялись
+
+        Иначе подзапросы выполняются вместе с чтением версии данных в одном снимке,
+        так что сохраненный результат всегда соответствует своей версии.
         """
-        repair_details = self.db.execute_query(query2, fetch=True)
-
-        # Неисправности по маркам
-        query3 = """
-        SELECT а.Марка, н.Тип_неисправности, COUNT(*) as Количество
-        FROM Факт_ремонта фр
-        JOIN Автомобиль а ON фр.ID_Автомобиля = а.ID_Автомобиля
-        JOIN Неисправность н ON фр.ID_Неисправности = н.ID_Неисправности
-        GROUP BY а.Марка, н.Тип_неисправности
-        ORDER BY а.Марка, Количество DESC
+        results = self.reports.get(report, params, self._data_version())
+        if results is None:
+            version, *results = self.db.snapshot_queries(
+                [('data_version', queries.DATA_VERSION, None)] + statements, readonly=True
+            )
+            results = [[dict(row) for row in rows] for rows in results]
+            self.reports.put(report, params, version[0]['version'], results)
+        return results
+
+    def _stream_cached_report(self, report, params, query):
+        """Построчная выдача отчета с сохранением в кэш, если строк не больше max_rows"""
+        with self.db.read_snapshot(readonly=True) as snapshot:
+            # Версия читается в том же снимке, что и строки отчета
+            version = snapshot.fetch('data_version', queries.DATA_VERSION)[0]['version']
+            collected = []
+            for row in snapshot.stream(query):
+                if collected is not None:
+                    collected.append(dict(row))
+                    if len(collected) > self.reports.max_rows:
+                        collected = None
+                yield row
+        if collected is not None:
+            self.reports.put(report, params, version, [collected])
+
+    def get_fault_report(self, фио_владельца=None, stream=False):
+        """Справка о наличии неисправности автомобиля любого владельца
+
+        stream=True - генератор строк через серверный курсор вместо списка.
+        Результат кэшируется до изменения данных.
         """
-        faults_by_brand = self.db.execute_query(query3, fetch=True)
-
-        # Статистика по работникам
-        query4 = """
-        SELECT р.ФИО, COUNT(*) as Количество_ремонтов
-        FROM Факт_ремонта фр
-        JOIN Работник р ON фр.ID_Работника = р.ID_Работника
-        GROUP BY р.ФИО
-        ORDER BY Количество_ремонтов DESC
+        if фио_владельца:
+            return self._cached_report('fault_report', (фио_владельца,), [
+                ('fault_report_by_owner', queries.FAULT_REPORT_BY_OWNER, (фио_владельца,))
+            ])[0]
+        elif stream:
+            cached = self.reports.get('fault_report', (None,), self._data_version())
+            if cached is not None:
+                return iter(cached[0])
+            return self._stream_cached_report('fault_report', (None,), queries.FAULT_REPORT_ALL)
+        else:
+            return self._cached_report('fault_report', (None,), [
+                ('fault_report_all', queries.FAULT_REPORT_ALL, None)
+            ])[0]
+
+    def get_station_report(self, date_from=None, date_to=None, top_n=None):
+        """Отчет о работе станции техобслуживания (за период с date_from по date_to включительно)
+
+        top_n - сколько самых частых неисправностей показывать по каждой марке (None - все).
+        Подзапросы выполняются одновременно на разных соединениях в одном снимке данных;
+        результат кэшируется до изменения данных.
         """
-        employee_stats = self.db.execute_query(query4, fetch=True)
+        total_cars, repair_details, faults_by_brand, employee_stats = self._cached_report(
+            'station_report', (date_from, date_to, top_n),
+            queries.station_report_queries(date_from, date_to, top_n)
+        )
+        return total_cars[0]['total_cars'], repair_details, faults_by_brand, employee_stats
 
-        return total_cars, repair_details, faults_by_brand, employee_stats
+    def get_repairs_by_day(self, date_from=None, date_to=None):
+        """Число ремонтов по дням за период (по сводке)"""
+        return self.db.execute_query(queries.REPAIRS_BY_DAY, queries.period_params(date_from, date_to),
+                                     fetch=True, name='repairs_by_day', readonly=True)
 
-    def get_all_owners(self):
-        """Получить всех владельцев"""
-        return self.db.execute_query("SELECT * FROM Владелец ORDER BY ФИО", fetch=True)
+    # ПОСТРАНИЧНЫЙ ПРОСМОТР
 
-    def get_all_employees(self):
-        """Получить всех работников"""
-        return self.db.execute_query("SELECT * FROM Работник ORDER BY ФИО", fetch=True)
+    def _encode_token(self, listing, row):
+        key = [row[column] for column in queries.PAGED_LISTINGS[listing]['row_key']]
+        raw = json.dumps(key, default=str, ensure_ascii=False).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii')
 
-    def get_all_cars(self):
-        """Получить все автомобили"""
-        return self.db.execute_query("SELECT * FROM Автомобиль ORDER BY Марка", fetch=True)
+    def _decode_token(self, token):
+        try:
+            return json.loads(base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8'))
+        except (ValueError, UnicodeError):
+            raise ValueError("Некорректный маркер страницы")
+
+    def get_page(self, listing, page_size=20, token=None, backward=False):
+        """Страница списка по ключу сортировки (keyset-пагинация)
 
-    def get_all_faults(self):
-        """Получить все типы неисправностей"""
-        return self.db.execute_query("SELECT * FROM Неисправность ORDER BY Тип_неисправности", fetch=True)
\ No newline at end of file
+        token - маркер из 'next' (вперед) или 'prev' (backward=True) предыдущей страницы.
+        Возвращает {'rows': [...], 'next': маркер или None, 'prev': маркер или None}.
+        """
+        if page_size < 1:
+            raise ValueError("Размер страницы должен быть положительным")
+
+        params = []
+        if token is not None:
+            params.extend(self._decode_token(token))
+        params.append(page_size + 1)
+
+        rows = self.db.execute_query(
+            queries.page_query(listing, token is not None, backward), tuple(params), fetch=True,
+            name=f"page_{listing}", readonly=True
+        )
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if backward:
+            rows.reverse()
+
+        if not rows:
+            return {'rows': [], 'next': None, 'prev': None}
+
+        # Вперед: есть следующая, если выбрано больше страницы; предыдущая - если пришли по маркеру.
+        # Назад - наоборот.
+        has_next = token is not None if backward else has_more
+        has_prev = has_more if backward else token is not None
+        return {
+            'rows': rows,
+            'next': self._encode_token(listing, rows[-1]) if has_next else None,
+            'prev': self._encode_token(listing, rows[0]) if has_prev else None,
+        }
+
+    def get_all_owners(self, page_size=None, token=None, backward=False):
+        """Получить всех владельцев (постранично, если задан page_size)"""
+        if page_size:
+            return self.get_page('owners', page_size, token, backward)
+        return self.db.execute_query(queries.ALL_OWNERS, fetch=True, name='all_owners', readonly=True)
+
+    def get_all_employees(self, page_size=None, token=None, backward=False):
+        """Получить всех работников (постранично, если задан page_size)"""
+        if page_size:
+            return self.get_page('employees', page_size, token, backward)
+        return self.db.execute_query(queries.ALL_EMPLOYEES, fetch=True, name='all_employees', readonly=True)
+
+    def get_all_cars(self, stream=False, page_size=None, token=None, backward=False):
+        """Получить все автомобили (постранично, если задан page_size)"""
+        if page_size:
+            return self.get_page('cars', page_size, token, backward)
+        if stream:
+            return self.db.stream_query(queries.ALL_CARS, readonly=True)
+        return self.db.execute_query(queries.ALL_CARS, fetch=True, name='all_cars', readonly=True)
+
+    def get_all_faults(self, page_size=None, token=None, backward=False):
+        """Получить все типы неисправностей (постранично, если задан page_size)"""
+        if page_size:
+            return self.get_page('faults', page_size, token, backward)
+        return self.db.execute_query(queries.ALL_FAULTS, fetch=True, name='all_faults', readonly=True)
+
+    def get_all_repairs(self, stream=False, page_size=None, token=None, backward=False):
+        """Получить все факты ремонта (постранично, если задан page_size)"""
+        if page_size:
+            return self.get_page('repairs', page_size, token, backward)
+        if stream:
+            return self.db.stream_query(queries.ALL_REPAIRS, readonly=True)
+        return self.db.execute_query(queries.ALL_REPAIRS, fetch=True, name='all_repairs', readonly=True)
@@ -0,0 +1,337 @@
+# services/importer.py
+import csv
+import io
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from config.database import Database
+
+# Формат номера из ограничения check_license_plate
+LICENSE_PLATE_RE = re.compile(r'^[АВЕКМНОРСТУХ][0-9]{3}[АВЕКМНОРСТУХ]{2}[0-9]{2,3}$')
+
+# Латинские буквы, совпадающие по написанию с допустимыми буквами номера
+LATIN_TO_CYRILLIC = str.maketrans('ABEKMHOPCTYX', 'АВЕКМНОРСТУХ')
+
+CHUNK_ROWS = 20000
+
+
+def normalize_name(value, field, max_len=100, required=True):
+    value = ' '.join(value.split())
+    if not value:
+        if required:
+            raise ValueError(f"Пустое поле '{field}'")
+        return None
+    if len(value) > max_len:
+        raise ValueError(f"Поле '{field}' длиннее {max_len} символов")
+    return value
+
+
+def normalize_license_plate(value):
+    plate = ''.join(value.split()).upper().translate(LATIN_TO_CYRILLIC)
+    if not LICENSE_PLATE_RE.match(plate):
+        raise ValueError(f"Номер '{value}' имеет неверный формат (требуется: А123ВС77)")
+    return plate
+
+
+def normalize_year(value):
+    try:
+        year = int(value)
+    except ValueError:
+        raise ValueError(f"Год выпуска '{value}' не является числом")
+    текущий_год = datetime.now().year
+    if not (1900 <= year <= текущий_год + 1):
+        raise ValueError(f"Год выпуска должен быть между 1900 и {текущий_год + 1}")
+    return year
+
+
+def normalize_time(value):
+    value = value.strip()
+    if not value:
+        return None
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Время '{value}' не в формате ГГГГ-ММ-ДД ЧЧ:ММ[:СС]")
+    if moment > datetime.now():
+        raise ValueError("Время устранения не может быть в будущем")
+    return moment.isoformat(sep=' ')
+
+
+def _normalize_owner(row):
+    return [normalize_name(row[0], 'ФИО'),
+            normalize_name(row[1] if len(row) > 1 else '', 'Адрес', 200, required=False)]
+
+
+def _normalize_car(row):
+    if len(row) < 5:
+        raise ValueError("Ожидается: номер;марка;год;изготовитель;ФИО владельца")
+    return [normalize_license_plate(row[0]),
+            normalize_name(row[1], 'Марка', 50),
+            normalize_year(row[2]),
+            normalize_name(row[3], 'Изготовитель', 50, required=False),
+            normalize_name(row[4], 'ФИО владельца')]
+
+
+def _normalize_worker(row):
+    return [normalize_name(row[0], 'ФИО')]
+
+
+def _normalize_repair(row):
+    if len(row) < 3:
+        raise ValueError("Ожидается: номер;ФИО работника;неисправность[;время]")
+    return [normalize_license_plate(row[0]),
+            normalize_name(row[1], 'ФИО работника'),
+            normalize_name(row[2], 'Тип неисправности'),
+            normalize_time(row[3] if len(row) > 3 else '')]
+
+
+# Описание видов импорта: нормализация строки, промежуточная таблица,
+# set-based разрешение внешних ключей и итоговая вставка
+IMPORT_SPECS = {
+    'owners': {
+        'title': 'Владельцы',
+        'header': 'фио',
+        'normalize': _normalize_owner,
+        'columns': ['фио', 'адрес'],
+        'stage': """
+        CREATE TEMP TABLE stage_import (
+            line_no INTEGER, фио VARCHAR(100), адрес VARCHAR(200), ошибка TEXT
+        ) ON COMMIT DROP
+        """,
+        'resolve': [],
+        'insert': """
+        INSERT INTO Владелец (ФИО, Адрес)
+        SELECT фио, адрес FROM stage_import WHERE ошибка IS NULL ORDER BY line_no
+        """,
+    },
+    'cars': {
+        'title': 'Автомобили',
+        'header': 'номер',
+        'normalize': _normalize_car,
+        'columns': ['номер', 'марка', 'год', 'изготовитель', 'владелец'],
+        'stage': """
+        CREATE TEMP TABLE stage_import (
+            line_no INTEGER, номер VARCHAR(15), марка VARCHAR(50), год INTEGER,
+            изготовитель VARCHAR(50), владелец VARCHAR(100), id_владельца INTEGER, ошибка TEXT
+        ) ON COMMIT DROP
+        """,
+        'resolve': [
+            """
+            UPDATE stage_import s SET id_владельца = в.ID_Владельца
+            FROM (SELECT DISTINCT ON (ФИО) ФИО, ID_Владельца FROM Владелец ORDER BY ФИО, ID_Владельца) в
+            WHERE в.ФИО = s.владелец
+            """,
+            "UPDATE stage_import SET ошибка = 'Владелец не найден' WHERE id_владельца IS NULL",
+            """
+            UPDATE stage_import s SET ошибка = 'Автомобиль с таким номером уже существует'
+            FROM Автомобиль а
+            WHERE а.Номер_госрегистрации = s.номер AND s.ошибка IS NULL
+            """,
+            """
+            UPDATE stage_import s SET ошибка = 'Номер повторяется в файле'
+            WHERE s.ошибка IS NULL AND EXISTS (
+                SELECT 1 FROM stage_import d WHERE d.номер = s.номер AND d.line_no < s.line_no
+            )
+            """,
+        ],
+        'insert': """
+        INSERT INTO Автомобиль (Номер_госрегистрации, Марка, Год_выпуска, Изготовитель, ID_Владельца)
+        SELECT номер, марка, год, изготовитель, id_владельца
+        FROM stage_import WHERE ошибка IS NULL ORDER BY line_no
+        """,
+    },
+    'workers': {
+        'title': 'Работники',
+        'header': 'фио',
+        'normalize': _normalize_worker,
+        'columns': ['фио'],
+        'stage': """
+        CREATE TEMP TABLE stage_import (
+            line_no INTEGER, фио VARCHAR(100), ошибка TEXT
+        ) ON COMMIT DROP
+        """,
+        'resolve': [],
+        'insert': """
+        INSERT INTO Работник (ФИО)
+        SELECT фио FROM stage_import WHERE ошибка IS NULL ORDER BY line_no
+        """,
+    },
+    'repairs': {
+        'title': 'Факты ремонта',
+        'header': 'номер',
+        'normalize': _normalize_repair,
+        'columns': ['номер', 'работник', 'неисправность', 'время'],
+        'stage': """
+        CREATE TEMP TABLE stage_import (
+            line_no INTEGER, номер VARCHAR(15), работник VARCHAR(100), неисправность VARCHAR(100),
+            время TIMESTAMP, id_автомобиля INTEGER, id_работника INTEGER, id_неисправности INTEGER, ошибка TEXT
+        ) ON COMMIT DROP
+        """,
+        'resolve': [
+            """
+            UPDATE stage_import s SET id_автомобиля = а.ID_Автомобиля
+            FROM Автомобиль а WHERE а.Номер_госрегистрации = s.номер
+            """,
+            """
+            UPDATE stage_import s SET id_работника = р.ID_Работника
+            FROM (SELECT DISTINCT ON (ФИО) ФИО, ID_Работника FROM Работник ORDER BY ФИО, ID_Работника) р
+            WHERE р.ФИО = s.работник
+            """,
+            "UPDATE stage_import SET ошибка = 'Автомобиль не найден' WHERE id_автомобиля IS NULL",
+            "UPDATE stage_import SET ошибка = 'Работник не найден' WHERE id_работника IS NULL AND ошибка IS NULL",
+            """
+            INSERT INTO Неисправность (Тип_неисправности)
+            SELECT DISTINCT неисправность FROM stage_import WHERE ошибка IS NULL ORDER BY 1
+            ON CONFLICT (Тип_неисправности) DO NOTHING
+            """,
+            """
+            UPDATE stage_import s SET id_неисправности = н.ID_Неисправности
+            FROM Неисправность н WHERE н.Тип_неисправности = s.неисправность AND s.ошибка IS NULL
+            """,
+        ],
+        'insert': """
+        INSERT INTO Факт_ремонта (ID_Автомобиля, ID_Работника, ID_Неисправности, Время_устранения)
+        SELECT id_автомобиля, id_работника, id_неисправности, COALESCE(время, CURRENT_TIMESTAMP)
+        FROM stage_import WHERE ошибка IS NULL ORDER BY line_no
+        """,
+    },
+}
+
+
+def _parse_chunk(kind, records):
+    """Разбор и нормализация куска файла (выполняется в дочернем процессе)
+
+    records - список (номер строки файла, поля записи). Возвращает текст для COPY
+    (CSV с номером строки в первой колонке), число принятых строк и список отвергнутых строк.
+    """
+    normalize = IMPORT_SPECS[kind]['normalize']
+    out = io.StringIO()
+    writer = csv.writer(out)
+    accepted = 0
+    rejects = []
+
+    for line_no, row in records:
+        if not row or not ''.join(row).strip():
+            continue
+        try:
+            values = normalize(row)
+        except ValueError as e:
+            rejects.append((line_no, str(e), row))
+            continue
+        # Пустые значения передаются в COPY как NULL (пустое поле без кавычек)
+        writer.writerow([line_no] + ['' if value is None else value for value in values])
+        accepted += 1
+
+    return out.getvalue(), accepted, rejects
+
+
+def _read_chunks(path, header):
+    """Потоковое чтение файла кусками по CHUNK_ROWS записей
+
+    Файл разбирается одним csv.reader, поэтому поле в кавычках с переводом строки
+    остается одной записью. Номер записи - строка файла, с которой она начинается.
+    """
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f, delimiter=';')
+        chunk = []
+        line_no = 1
+        for row in reader:
+            is_header = line_no == 1 and row and row[0].strip().lower().startswith(header)
+            if not is_header:
+                chunk.append((line_no, row))
+            # Следующая запись начинается со строки после последней прочитанной
+            line_no = reader.line_num + 1
+            if len(chunk) >= CHUNK_ROWS:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+class BulkImporter:
+    """Массовая загрузка CSV через COPY в промежуточные таблицы"""
+
+    def __init__(self, db=None, workers=None):
+        self.db = db or Database()
+        self.workers = workers or os.cpu_count() or 1
+
+    def _parsed_chunks(self, kind, path):
+        """Разбор кусков в пуле процессов с ограниченным числом кусков в работе"""
+        chunks = _read_chunks(path, IMPORT_SPECS[kind]['header'])
+
+        if self.workers <= 1:
+            for records in chunks:
+                yield _parse_chunk(kind, records)
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending = []
+            for records in chunks:
+                pending.append(executor.submit(_parse_chunk, kind, records))
+                if len(pending) >= self.workers * 2:
+                    yield pending.pop(0).result()
+            for future in pending:
+                yield future.result()
+
+    def import_file(self, kind, path, reject_path=None):
+        """Импорт CSV-файла (разделитель ';') указанного вида: owners, cars, workers, repairs"""
+        if kind not in IMPORT_SPECS:
+            raise ValueError(f"Неизвестный вид импорта '{kind}'")
+        if not os.path.exists(path):
+            raise ValueError(f"Файл '{path}' не найден")
+
+        spec = IMPORT_SPECS[kind]
+        reject_path = reject_path or f"{os.path.splitext(path)[0]}.rejects.csv"
+        started = time.monotonic()
+        total = 0
+        rejects = []
+
+        with self.db.transaction() as cursor:
+            cursor.execute(spec['stage'])
+            copy_sql = (f"COPY stage_import (line_no, {', '.join(spec['columns'])}) "
+                        f"FROM STDIN WITH (FORMAT csv)")
+
+            for text, accepted, chunk_rejects in self._parsed_chunks(kind, path):
+                total += accepted + len(chunk_rejects)
+                rejects.extend(chunk_rejects)
+                if accepted:
+                    cursor.copy_expert(copy_sql, io.StringIO(text))
+
+            cursor.execute("ANALYZE stage_import")
+            for query in spec['resolve']:
+                cursor.execute(query)
+            cursor.execute(spec['insert'])
+            inserted = cursor.rowcount
+
+            cursor.execute(
+                f"SELECT line_no, ошибка, {', '.join(spec['columns'])} "
+                f"FROM stage_import WHERE ошибка IS NOT NULL"
+            )
+            for row in cursor.fetchall():
+                values = ['' if row[column] is None else str(row[column]) for column in spec['columns']]
+                rejects.append((row['line_no'], row['ошибка'], values))
+
+        elapsed = time.monotonic() - started
+        rejects.sort(key=lambda item: item[0])
+        if rejects:
+            self._write_rejects(reject_path, rejects)
+
+        return {
+            'kind': kind,
+            'title': spec['title'],
+            'total': total,
+            'inserted': inserted,
+            'rejected': len(rejects),
+            'seconds': elapsed,
+            'rows_per_sec': total / elapsed if elapsed > 0 else 0.0,
+            'reject_file': reject_path if rejects else None,
+        }
+
+    def _write_rejects(self, path, rejects):
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f, delimiter=';')
+            writer.writerow(['строка', 'ошибка', 'данные'])
+            for line_no, error, row in rejects:
+                writer.writerow([line_no, error] + list(row))
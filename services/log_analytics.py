@@ -0,0 +1,152 @@
+# services/log_analytics.py
+import json
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from services.log_reader import read_entries
+from services.logger import LOG_FILE_RE
+
+# Счетчики, которые собираются по каждому дню
+COUNTERS = ('users', 'actions', 'hours', 'user_actions')
+
+# Разделитель пользователя и действия в ключе user_actions (ключи JSON - строки)
+KEY_SEPARATOR = '\t'
+
+# Сколько раз перечитывать каталог, если ротация переименовала или удалила файлы во время разбора
+RESCAN_ATTEMPTS = 3
+
+
+def count_file(path):
+    """Счетчики записей одного файла журнала (выполняется в процессе пула)
+
+    None - файл исчез (ротация сжала или удалила его после составления списка);
+    LogAnalytics.analyze тогда перечитывает каталог и разбирает сжатую копию дня.
+    """
+    counts = {name: Counter() for name in COUNTERS}
+    entries = 0
+    try:
+        for entry in read_entries(path):
+            user, action = str(entry['user']), str(entry['action'])
+            counts['users'][user] += 1
+            counts['actions'][action] += 1
+            counts['hours'][str(entry['ts'])[11:13]] += 1
+            counts['user_actions'][f"{user}{KEY_SEPARATOR}{action}"] += 1
+            entries += 1
+    except FileNotFoundError:
+        return None
+    result = {name: dict(counter) for name, counter in counts.items()}
+    result['entries'] = entries
+    return result
+
+
+class LogAnalytics:
+    """Сводка журнала действий за много дней: число записей по пользователям, действиям и часам
+
+    Файлы дней разбираются параллельно в пуле процессов, частичные счетчики складываются.
+    Результат по каждому файлу кэшируется с ключом (размер, время изменения): повторный
+    запуск разбирает только новые и изменившиеся файлы (обычно - текущий день).
+    """
+
+    def __init__(self, log_dir="logs", cache_path=None, workers=None):
+        self.log_dir = log_dir
+        self.cache_path = cache_path or os.getenv('LOG_ANALYTICS_CACHE') or \
+            os.path.join(log_dir, 'analytics_cache.json')
+        self.workers = workers or int(os.getenv('LOG_ANALYTICS_WORKERS', '0')) or os.cpu_count() or 1
+        self._lock = threading.Lock()
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cache(self, cache):
+        temp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(temp_path, self.cache_path)
+
+    def _files(self, date_from=None, date_to=None):
+        low = date_from.isoformat() if date_from else ''
+        high = date_to.isoformat() if date_to else '9999-99-99'
+        files = []
+        for name in sorted(os.listdir(self.log_dir)):
+            match = LOG_FILE_RE.match(name)
+            if match and low <= match.group(1) <= high:
+                files.append(name)
+        return files
+
+    def _count_all(self, paths):
+        """Счетчики по файлам: в пуле процессов, а если пул недоступен - в этом процессе"""
+        if len(paths) > 1 and self.workers > 1:
+            try:
+                with ProcessPoolExecutor(max_workers=min(self.workers, len(paths))) as pool:
+                    return list(pool.map(count_file, paths))
+            except (OSError, NotImplementedError):
+                pass
+        return [count_file(path) for path in paths]
+
+    def _stale(self, cache, files):
+        """Файлы, которых нет в кэше или которые изменились, и исчезнувшие файлы"""
+        stale, vanished = [], set()
+        for name in files:
+            try:
+                stat = os.stat(os.path.join(self.log_dir, name))
+            except FileNotFoundError:
+                vanished.add(name)
+                continue
+            cached = cache.get(name)
+            if cached is None or cached['size'] != stat.st_size or cached['mtime'] != stat.st_mtime_ns:
+                stale.append((name, stat))
+        return stale, vanished
+
+    def analyze(self, date_from=None, date_to=None):
+        """Сводка за период с date_from по date_to включительно
+
+        Возвращает {'files', 'parsed', 'entries', 'users', 'actions', 'hours', 'user_actions'};
+        счетчики - Counter, ключ user_actions - (пользователь, действие).
+        """
+        with self._lock:
+            cache = self._load_cache()
+            # Ротация журналов идет в другом потоке: файл из списка может быть сжат (другое
+            # имя) или удален до stat или во время разбора. Тогда каталог читается заново:
+            # сжатая копия дня разбирается, а уже разобранные файлы берутся из кэша
+            parsed = 0
+            for _ in range(RESCAN_ATTEMPTS):
+                files = self._files(date_from, date_to)
+                stale, vanished = self._stale(cache, files)
+                if stale:
+                    counts = self._count_all([os.path.join(self.log_dir, name) for name, _ in stale])
+                    for (name, stat), result in zip(stale, counts):
+                        if result is None:
+                            vanished.add(name)
+                            continue
+                        cache[name] = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'counts': result}
+                        parsed += 1
+                if not vanished:
+                    break
+            files = [name for name in files if name not in vanished]
+
+            if parsed:
+                # Файлы, удаленные или переименованные ротацией, из кэша убираем
+                existing = set(os.listdir(self.log_dir))
+                cache = {name: item for name, item in cache.items() if name in existing}
+                try:
+                    self._save_cache(cache)
+                except OSError:
+                    pass
+
+        summary = {name: Counter() for name in COUNTERS}
+        entries = 0
+        for name in files:
+            counts = cache[name]['counts']
+            for counter in COUNTERS:
+                summary[counter].update(counts[counter])
+            entries += counts['entries']
+        summary['user_actions'] = Counter({
+            tuple(key.split(KEY_SEPARATOR, 1)): value for key, value in summary['user_actions'].items()
+        })
+        summary.update({'files': len(files), 'parsed': parsed, 'entries': entries})
+        return summary
@@ -0,0 +1,203 @@
+# services/log_index.py
+import json
+import os
+
+# Расширения файлов журнала: текст "время | пользователь | действие | детали" и JSON Lines
+TEXT_SUFFIX = '.log'
+JSONL_SUFFIX = '.jsonl'
+INDEX_SUFFIX = '.idx'
+
+
+def format_entry(entry, fmt='text'):
+    """Строка файла журнала для записи {'ts', 'user', 'action', 'details'}"""
+    if fmt == 'jsonl':
+        return json.dumps(entry, ensure_ascii=False) + "\n"
+    return f"{entry['ts']} | {entry['user']} | {entry['action']} | {entry['details']}\n"
+
+
+def parse_line(line):
+    """Запись журнала из строки любого из двух форматов или None"""
+    line = line.rstrip("\n")
+    if line.startswith('{'):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return None
+        return entry if isinstance(entry, dict) and 'ts' in entry else None
+    parts = line.split(" | ", 3)
+    if len(parts) < 3:
+        return None
+    return {'ts': parts[0], 'user': parts[1], 'action': parts[2], 'details': parts[3] if len(parts) > 3 else ''}
+
+
+def entry_to_text(entry):
+    return format_entry(entry).rstrip("\n")
+
+
+class LogIndex:
+    """Индекс файла журнала за день: смещения записей по пользователю, действию и часу
+
+    Хранится рядом с файлом журнала (activity_ГГГГ-ММ-ДД.log.idx) в формате JSON Lines:
+    строка заголовка и по строке на каждое обновление с записями, разобранными в этот раз
+    (байты файла журнала from..size). Обновление только дописывает строку в конец, файл
+    индекса целиком не перечитывается и не перезаписывается. При открытии индекс
+    дочитывает только записи, появившиеся после последнего обновления.
+    """
+
+    VERSION = 2
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        self._reset()
+
+    def _reset(self):
+        self.size = 0
+        self.offsets = []
+        self.users = {}
+        self.actions = {}
+        self.hours = {}
+        # Файл индекса нужно записать заново (его нет, другой версии или файл журнала перезаписан)
+        self._rewrite = True
+
+    @classmethod
+    def open(cls, path):
+        """Индекс файла журнала, дополненный записями, появившимися после сохранения"""
+        index = cls(path)
+        index._load()
+        index.update()
+        return index
+
+    def _add(self, offset, user, action, hour):
+        number = len(self.offsets)
+        self.offsets.append(offset)
+        self.users.setdefault(user, []).append(number)
+        self.actions.setdefault(action, []).append(number)
+        self.hours.setdefault(hour, []).append(number)
+
+    def _load(self):
+        try:
+            with open(self.index_path, 'rb') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return
+        try:
+            header = json.loads(lines[0]) if lines else None
+        except ValueError:
+            header = None
+        if not isinstance(header, dict) or header.get('version') != self.VERSION:
+            return
+        for line in lines[1:]:
+            # Недописанная строка (процесс прерван) или повтор обновления из другого
+            # процесса: пропускаем, следующее обновление продолжит цепочку from = size
+            try:
+                batch = json.loads(line)
+            except ValueError:
+                continue
+            if batch.get('from') != self.size:
+                continue
+            offset = self.size
+            for delta, user, action, hour in batch['entries']:
+                offset += delta
+                self._add(offset, user, action, hour)
+            self.size = batch['size']
+        self._rewrite = False
+
+    def _batch(self, start, entries):
+        """Строка индекса: записи [(смещение, пользователь, действие, час)], разобранные с байта start"""
+        rows, previous = [], start
+        for offset, user, action, hour in entries:
+            rows.append([offset - previous, user, action, hour])
+            previous = offset
+        batch = {'from': start, 'size': self.size, 'entries': rows}
+        return (json.dumps(batch, ensure_ascii=False, separators=(',', ':')) + "\n").encode('utf-8')
+
+    def _entries(self):
+        """Все записи индекса по порядку (для записи файла индекса заново)"""
+        keys = [{number: key for key, numbers in table.items() for number in numbers}
+                for table in (self.users, self.actions, self.hours)]
+        return [(offset, *(table[number] for table in keys)) for number, offset in enumerate(self.offsets)]
+
+    def _save(self, start, entries):
+        if self._rewrite:
+            header = json.dumps({'version': self.VERSION}) + "\n"
+            temp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(header.encode('utf-8') + self._batch(0, self._entries()))
+            os.replace(temp_path, self.index_path)
+            self._rewrite = False
+            return
+        with open(self.index_path, 'a+b') as f:
+            line = self._batch(start, entries)
+            if f.seek(0, os.SEEK_END):
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # Хвост недописанной строки отделяем, чтобы не испортить новую
+                    line = b"\n" + line
+            f.write(line)
+
+    def update(self):
+        """Разбор записей, дописанных после последнего обновления; True - индекс изменился"""
+        try:
+            file_size = os.path.getsize(self.path)
+        except OSError:
+            return False
+        if file_size < self.size:
+            # Файл перезаписан (восстановлен, обрезан) - строим индекс заново
+            self._reset()
+        if file_size == self.size:
+            return False
+
+        start = offset = self.size
+        entries = []
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    # Строка еще дописывается: разберем в следующий раз
+                    break
+                entry = parse_line(raw.decode('utf-8', errors='replace'))
+                if entry is not None:
+                    entries.append((offset, str(entry['user']), str(entry['action']), str(entry['ts'])[11:13]))
+                    self._add(*entries[-1])
+                offset += len(raw)
+
+        if offset == start:
+            return False
+        self.size = offset
+        try:
+            self._save(start, entries)
+        except OSError:
+            # Каталог только для чтения: индекс работает в памяти
+            pass
+        return True
+
+    def find(self, user=None, action=None, hour_from=None, hour_to=None):
+        """Номера записей по условиям; часы - полуинтервал [hour_from, hour_to)"""
+        selections = []
+        if user is not None:
+            selections.append(set(self.users.get(user, [])))
+        if action is not None:
+            selections.append(set(self.actions.get(action, [])))
+        if hour_from is not None or hour_to is not None:
+            low = hour_from if hour_from is not None else 0
+            high = hour_to if hour_to is not None else 24
+            selected = set()
+            for hour in range(low, high):
+                selected.update(self.hours.get(f"{hour:02d}", []))
+            selections.append(selected)
+
+        if not selections:
+            return list(range(len(self.offsets)))
+        selections.sort(key=len)
+        result = selections[0].intersection(*selections[1:])
+        return sorted(result)
+
+    def read(self, numbers):
+        """Записи с данными номерами (чтение только нужных строк файла)"""
+        with open(self.path, 'rb') as f:
+            for number in numbers:
+                f.seek(self.offsets[number])
+                entry = parse_line(f.readline().decode('utf-8', errors='replace'))
+                if entry is not None:
+                    yield entry
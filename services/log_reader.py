@@ -0,0 +1,145 @@
+# services/log_reader.py
+import gzip
+import json
+import lzma
+import mmap
+import os
+import time
+from collections import deque
+from services.log_index import JSONL_SUFFIX, parse_line
+
+BLOCK_SIZE = 64 * 1024
+
+# Расширение сжатого журнала -> функция открытия с потоковой распаковкой
+DECOMPRESSORS = {
+    '.gz': gzip.open,
+    '.xz': lzma.open,
+}
+
+
+def is_compressed(path):
+    return os.path.splitext(path)[1] in DECOMPRESSORS
+
+
+def open_log(path):
+    """Файл журнала для чтения в двоичном режиме; сжатые распаковываются на лету"""
+    opener = DECOMPRESSORS.get(os.path.splitext(path)[1], open)
+    return opener(path, 'rb')
+
+
+def read_entries(path):
+    """Все записи файла журнала (в том числе сжатого) по порядку; генератор"""
+    with open_log(path) as f:
+        for raw in f:
+            entry = parse_line(raw.decode('utf-8', errors='replace'))
+            if entry is not None:
+                yield entry
+
+
+def tail_lines(path, n, block_size=BLOCK_SIZE):
+    """Последние n строк файла: чтение блоками с конца, без чтения всего файла
+
+    Сжатый файл с конца не прочитать: он распаковывается потоком с окном из n строк.
+    """
+    if n <= 0:
+        return []
+    if is_compressed(path):
+        with open_log(path) as f:
+            return [line.rstrip(b"\n").decode('utf-8', errors='replace') for line in deque(f, maxlen=n)]
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b''
+        # n + 1 перевод строки: первая строка в data может быть неполной
+        while position > 0 and data.count(b"\n") <= n:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    lines = data.splitlines()
+    if position > 0:
+        lines = lines[1:]
+    return [line.decode('utf-8', errors='replace') for line in lines[-n:]]
+
+
+def search_needle(path, text):
+    """Подстрока строки файла (bytes) для поиска text в записи через search_file или None
+
+    В JSON Lines кавычки, обратная косая черта и управляющие символы экранированы, поэтому
+    и искомая строка экранируется так же. Строка, которая может захватывать границу полей
+    текстового представления записи (" | " или пробел по краю), в JSON не найдется
+    подстрокой - для нее None: разбираются все строки файла.
+    """
+    if not text:
+        return None
+    base = os.path.splitext(path)[0] if is_compressed(path) else path
+    if not base.endswith(JSONL_SUFFIX):
+        return text.encode('utf-8')
+    if '|' in text or text != text.strip():
+        return None
+    return json.dumps(text, ensure_ascii=False)[1:-1].encode('utf-8')
+
+
+def search_file(path, needle=None):
+    """Записи файла, строка которых содержит needle (bytes); генератор
+
+    Файл отображается в память (mmap): поиск подстроки идет по всему файлу без разбиения
+    на строки, разбираются только строки с совпадениями. Сжатый файл распаковывается потоком.
+    """
+    if is_compressed(path):
+        with open_log(path) as f:
+            for raw in f:
+                if needle and needle not in raw:
+                    continue
+                entry = parse_line(raw.decode('utf-8', errors='replace'))
+                if entry is not None:
+                    yield entry
+        return
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            position = 0
+            size = len(mm)
+            while position < size:
+                if needle:
+                    found = mm.find(needle, position)
+                    if found == -1:
+                        return
+                    start = mm.rfind(b"\n", 0, found) + 1
+                else:
+                    start = position
+                end = mm.find(b"\n", start)
+                end = size if end == -1 else end
+                entry = parse_line(mm[start:end].decode('utf-8', errors='replace'))
+                if entry is not None:
+                    yield entry
+                position = end + 1
+
+
+def follow_file(path_for_today, poll_interval=1.0, stop=None):
+    """Новые записи журнала по мере их появления (как tail -f); генератор
+
+    path_for_today() возвращает путь к файлу текущего дня: после полуночи чтение
+    переходит на новый файл. stop() - условие остановки (по умолчанию бесконечно).
+    """
+    path = path_for_today()
+    position = os.path.getsize(path) if os.path.exists(path) else 0
+    buffer = b''
+    while stop is None or not stop():
+        current = path_for_today()
+        if current != path:
+            path, position, buffer = current, 0, b''
+        if os.path.exists(path) and os.path.getsize(path) > position:
+            with open(path, 'rb') as f:
+                f.seek(position)
+                chunk = f.read()
+            position += len(chunk)
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                entry = parse_line(line.decode('utf-8', errors='replace'))
+                if entry is not None:
+                    yield entry
+            continue
+        time.sleep(poll_interval)
@@ -0,0 +1,205 @@
+# services/log_rotation.py
+import gzip
+import lzma
+import os
+import re
+import shutil
+import threading
+import time
+from contextlib import nullcontext
+from datetime import date, timedelta
+from services.log_index import INDEX_SUFFIX
+from services.logger import find_log_writer
+
+# Сжатие -> расширение сжатого файла
+COMPRESSORS = {
+    'gzip': ('.gz', gzip.open),
+    'lzma': ('.xz', lzma.open),
+}
+
+# Файл, измененный позже, еще может быть открыт писателем журнала (запись около полуночи)
+RECENT_WRITE_SECONDS = 60
+
+# Файл журнала за день: дата, формат и расширение сжатия (если сжат)
+ROTATED_FILE_RE = re.compile(r'^activity_(\d{4}-\d{2}-\d{2})\.(log|jsonl)(\.gz|\.xz)?$')
+
+# Файл дня, переименованный перед сжатием (остается после сбоя посреди сжатия)
+COMPRESSING_FILE_RE = re.compile(r'^(activity_\d{4}-\d{2}-\d{2}\.(?:log|jsonl))\.\d+\.compressing$')
+
+
+class LogRotator:
+    """Сжатие журналов закрытых дней и удаление старых журналов
+
+    Файлы дней, закончившихся compress_after_days дней назад и раньше, сжимаются (gzip
+    или lzma) в фоновом потоке.
+    Журналы старше retention_days удаляются; если задан max_total_bytes, удаляются и
+    самые старые дни, пока общий размер каталога журналов не уложится в предел.
+    Файл текущего дня не сжимается и не удаляется.
+    """
+
+    def __init__(self, log_dir, compression='gzip', compress_after_days=1, retention_days=365,
+                 max_total_bytes=0, interval=3600.0):
+        if compression not in COMPRESSORS and compression != 'none':
+            raise ValueError(f"Неизвестный способ сжатия журналов: {compression}")
+        self.log_dir = log_dir
+        self.compression = compression
+        self.compress_after_days = compress_after_days
+        self.retention_days = retention_days
+        self.max_total_bytes = max_total_bytes
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_report = None
+
+    def _files(self):
+        """Файлы журнала: [(дата, имя, размер)] по возрастанию даты"""
+        files = []
+        for name in os.listdir(self.log_dir):
+            match = ROTATED_FILE_RE.match(name)
+            if match:
+                files.append((match.group(1), name, os.path.getsize(os.path.join(self.log_dir, name))))
+        files.sort()
+        return files
+
+    def _compress(self, name):
+        """Сжатие файла потоком; возвращает освобожденные байты
+
+        Файл сначала переименовывается, пока писатель журнала закрыл его и не пишет:
+        запись, пришедшая во время сжатия, попадет в новый файл дня, который сожмется
+        следующим проходом, а не пропадет вместе с удаляемым исходным файлом.
+        """
+        source = os.path.join(self.log_dir, name)
+        work_path = f"{source}.{os.getpid()}.compressing"
+        writer = find_log_writer(self.log_dir)
+        with writer.released(source) if writer is not None else nullcontext():
+            os.replace(source, work_path)
+        return self._compress_file(work_path, source)
+
+    def _compress_file(self, work_path, source):
+        suffix, opener = COMPRESSORS[self.compression]
+        target = source + suffix
+        original_size = os.path.getsize(work_path)
+        before = os.path.getsize(target) if os.path.exists(target) else 0
+
+        # Если сжатый файл уже есть (запись пришла после сжатия), дописываем новый поток:
+        # gzip и xz читают склеенные потоки как один файл
+        temp_path = f"{target}.{os.getpid()}.tmp"
+        if before:
+            shutil.copyfile(target, temp_path)
+        with open(work_path, 'rb') as src, opener(temp_path, 'ab') as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        shutil.copystat(work_path, temp_path)
+        os.replace(temp_path, target)
+        os.remove(work_path)
+
+        # Индекс ссылается на смещения несжатого файла
+        index_path = source + INDEX_SUFFIX
+        if os.path.exists(index_path):
+            os.remove(index_path)
+        return original_size - (os.path.getsize(target) - before)
+
+    def _resume_compressing(self):
+        """Досжатие файлов, переименованных перед сжатием, которое прервалось сбоем"""
+        saved = 0
+        for name in os.listdir(self.log_dir):
+            match = COMPRESSING_FILE_RE.match(name)
+            if not match:
+                continue
+            work_path = os.path.join(self.log_dir, name)
+            # Переименование обновляет ctime (mtime остается от записи журнала):
+            # недавно переименованный файл, возможно, сейчас сжимает другой процесс
+            if time.time() - os.path.getctime(work_path) < RECENT_WRITE_SECONDS:
+                continue
+            saved += self._compress_file(work_path, os.path.join(self.log_dir, match.group(1)))
+        return saved
+
+    def _delete_day(self, files, date_str):
+        deleted = []
+        for day, name, _ in files:
+            if day == date_str:
+                path = os.path.join(self.log_dir, name)
+                os.remove(path)
+                if os.path.exists(path + INDEX_SUFFIX):
+                    os.remove(path + INDEX_SUFFIX)
+                deleted.append(name)
+        return deleted
+
+    def rotate(self, today=None):
+        """Один проход сжатия и очистки: {'compressed', 'deleted', 'saved_bytes', 'total_bytes'}"""
+        today = today or date.today()
+        today_str = today.isoformat()
+        report = {'compressed': [], 'deleted': [], 'saved_bytes': 0, 'total_bytes': 0}
+
+        with self._lock:
+            files = self._files()
+            if self.retention_days:
+                keep_from = (today - timedelta(days=self.retention_days)).isoformat()
+                for day in sorted({day for day, _, _ in files if day < keep_from}):
+                    report['deleted'].extend(self._delete_day(files, day))
+
+            if self.compression != 'none':
+                report['saved_bytes'] += self._resume_compressing()
+                compress_until = (today - timedelta(days=self.compress_after_days)).isoformat()
+                for day, name, _ in self._files():
+                    if day > compress_until or day >= today_str or name.endswith(('.gz', '.xz')):
+                        continue
+                    if time.time() - os.path.getmtime(os.path.join(self.log_dir, name)) < RECENT_WRITE_SECONDS:
+                        continue
+                    report['saved_bytes'] += self._compress(name)
+                    report['compressed'].append(name)
+
+            files = self._files()
+            total = sum(size for _, _, size in files)
+            if self.max_total_bytes:
+                for day in sorted({day for day, _, _ in files if day < today_str}):
+                    if total <= self.max_total_bytes:
+                        break
+                    total -= sum(size for file_day, _, size in files if file_day == day)
+                    report['deleted'].extend(self._delete_day(files, day))
+            report['total_bytes'] = total
+
+        self.last_report = report
+        return report
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.rotate()
+            except OSError:
+                # Файл занят или каталог недоступен: повторим на следующем проходе
+                pass
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """Запуск фоновой ротации (сразу и затем каждые interval секунд)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"log-rotator-{self.log_dir}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+_rotators = {}
+_rotators_lock = threading.Lock()
+
+
+def get_log_rotator(log_dir="logs"):
+    """Общий для процесса ротатор журналов каталога log_dir"""
+    key = os.path.abspath(log_dir)
+    with _rotators_lock:
+        rotator = _rotators.get(key)
+        if rotator is None:
+            rotator = LogRotator(
+                log_dir,
+                compression=os.getenv('LOG_COMPRESSION', 'gzip'),
+                compress_after_days=int(os.getenv('LOG_COMPRESS_AFTER_DAYS', '1')),
+                retention_days=int(os.getenv('LOG_RETENTION_DAYS', '365')),
+                max_total_bytes=int(float(os.getenv('LOG_MAX_TOTAL_MB', '0')) * 1024 * 1024),
+                interval=float(os.getenv('LOG_ROTATE_INTERVAL', '3600'))
+            )
+            _rotators[key] = rotator
+        return rotator
@@ -1,34 +1,351 @@
 # services/logger.py
+import atexit
 import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime
+from services.log_index import JSONL_SUFFIX, TEXT_SUFFIX, LogIndex, entry_to_text, format_entry, parse_line
+from services.log_reader import (DECOMPRESSORS, follow_file, is_compressed, read_entries, search_file,
+                                 search_needle, tail_lines)
+
+# Файл журнала за день в любом из форматов, в том числе сжатый при ротации
+LOG_FILE_RE = re.compile(r'^activity_(\d{4}-\d{2}-\d{2})\.(?:log|jsonl)(?:\.gz|\.xz)?$')
+
+# Сигнал остановки фонового писателя
+_STOP = object()
+
+
+class LogWriter:
+    """Фоновая запись журнала действий
+
+    Записи ставятся в очередь и пишутся отдельным потоком пачками: пачка сбрасывается на
+    диск, когда набралось batch_size записей или прошло flush_interval секунд с первой
+    записи пачки, а также по flush() и при завершении процесса. Файл дня держится открытым
+    до первой записи следующего дня (или простоя после полуночи).
+    """
+
+    def __init__(self, log_dir, batch_size=100, flush_interval=1.0, max_queue=10000):
+        self.log_dir = log_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._file = None
+        self._closed = False
+        self._latencies = deque(maxlen=1000)   # ожидание в очереди до записи на диск, мс
+        self._stats = {'written': 0, 'batches': 0, 'blocked': 0, 'write_ms': 0.0, 'max_latency_ms': 0.0}
+        self._thread = threading.Thread(target=self._run, name=f"log-writer-{log_dir}", daemon=True)
+        self._thread.start()
+
+    def path_for(self, date_str, suffix=TEXT_SUFFIX):
+        return os.path.join(self.log_dir, f"activity_{date_str}{suffix}")
+
+    def put(self, date_str, line, suffix=TEXT_SUFFIX):
+        """Постановка записи в очередь; после close() запись идет сразу на диск"""
+        item = (self.path_for(date_str, suffix), line, time.monotonic())
+        if self._closed:
+            self._write([item])
+            return
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            # Писатель не успевает: ждем места, а не теряем записи журнала
+            with self._lock:
+                self._stats['blocked'] += 1
+            self._queue.put(item)
+
+    def flush(self, timeout=5.0):
+        """Ожидание записи на диск всего, что поставлено в очередь до вызова"""
+        if self._closed or not self._thread.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        """Запись оставшегося и остановка потока"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _open(self, path):
+        if self._file is not None and self._file.name == path:
+            return
+        if self._file is not None:
+            self._file.close()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @contextmanager
+    def released(self, path):
+        """Блок, в котором писатель не держит файл path открытым и не пишет в журнал
+
+        Ротатор переименовывает файл дня внутри блока: следующая запись откроет новый файл
+        по тому же пути, а не допишет в переименованный.
+        """
+        with self._lock:
+            if self._file is not None and os.path.abspath(self._file.name) == os.path.abspath(path):
+                self._close_file()
+            yield
+
+    def _write(self, batch):
+        started = time.monotonic()
+        with self._lock:
+            # Пачка может переходить через полночь: каждая запись идет в файл своего дня
+            for path, line, _ in batch:
+                self._open(path)
+                self._file.write(line)
+            self._file.flush()
+            finished = time.monotonic()
+            for _, _, queued in batch:
+                latency = (finished - queued) * 1000
+                self._latencies.append(latency)
+                self._stats['max_latency_ms'] = max(self._stats['max_latency_ms'], latency)
+            self._stats['written'] += len(batch)
+            self._stats['batches'] += 1
+            self._stats['write_ms'] += (finished - started) * 1000
+
+    def _run(self):
+        pending = []
+        deadline = None
+        while True:
+            timeout = self.flush_interval if not pending else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP or isinstance(item, threading.Event):
+                if pending:
+                    self._write(pending)
+                    pending = []
+                if item is _STOP:
+                    with self._lock:
+                        self._close_file()
+                    return
+                item.set()
+                continue
+
+            if item is not None:
+                pending.append(item)
+                if len(pending) == 1:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(pending) < self.batch_size:
+                    continue
+
+            if pending:
+                self._write(pending)
+                pending = []
+            elif self._file is not None and datetime.now().strftime("%Y-%m-%d") not in self._file.name:
+                # Наступил новый день, а записей нет: файл прошлого дня больше не нужен
+                with self._lock:
+                    self._close_file()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            latencies = sorted(self._latencies)
+        stats['queue_depth'] = self._queue.qsize()
+        stats['avg_latency_ms'] = sum(latencies) / len(latencies) if latencies else 0.0
+        stats['p95_latency_ms'] = latencies[int(len(latencies) * 0.95)] if latencies else 0.0
+        stats['avg_write_ms'] = stats['write_ms'] / stats['batches'] if stats['batches'] else 0.0
+        return stats
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_log_writer(log_dir):
+    """Общий для процесса писатель журнала каталога log_dir"""
+    key = os.path.abspath(log_dir)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = LogWriter(
+                log_dir,
+                batch_size=int(os.getenv('LOG_BATCH_SIZE', '100')),
+                flush_interval=float(os.getenv('LOG_FLUSH_INTERVAL', '1.0')),
+                max_queue=int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+            )
+            _writers[key] = writer
+        return writer
+
+
+def find_log_writer(log_dir):
+    """Писатель журнала каталога log_dir, если он уже создан в этом процессе, иначе None"""
+    with _writers_lock:
+        return _writers.get(os.path.abspath(log_dir))
+
+
+@atexit.register
+def close_log_writers():
+    """Запись очередей всех писателей журнала (вызывается и при завершении процесса)"""
+    with _writers_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        writer.close()
 
 
 class Logger:
-    def __init__(self, log_dir="logs"):
+    """Журнал действий пользователей: файл на каждый день
+
+    fmt - 'text' (строки "время | пользователь | действие | детали") или 'jsonl'
+    (JSON-объект на строку); по умолчанию из LOG_FORMAT.
+    """
+
+    def __init__(self, log_dir="logs", fmt=None):
         self.log_dir = log_dir
         if not os.path.exists(log_dir):
             os.makedirs(log_dir)
+        self.fmt = fmt or os.getenv('LOG_FORMAT', 'text')
+        if self.fmt not in ('text', 'jsonl'):
+            raise ValueError(f"Неизвестный формат журнала: {self.fmt}")
+        self.writer = get_log_writer(log_dir)
 
     def log(self, user, action, details=""):
-        """Запись действия в лог"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = f"{timestamp} | {user} | {action} | {details}\n"
+        """Запись действия в лог (в очередь фонового писателя)"""
+        now = datetime.now()
+        entry = {
+            'ts': now.strftime("%Y-%m-%d %H:%M:%S"),
+            'user': user,
+            'action': action,
+            'details': details,
+        }
 
         # Дневной лог-файл
-        date_str = datetime.now().strftime("%Y-%m-%d")
-        log_file = os.path.join(self.log_dir, f"activity_{date_str}.log")
+        self.writer.put(now.strftime("%Y-%m-%d"), format_entry(entry, self.fmt),
+                        JSONL_SUFFIX if self.fmt == 'jsonl' else TEXT_SUFFIX)
+
+    def flush(self):
+        """Запись на диск всех поставленных в очередь записей"""
+        self.writer.flush()
+
+    def close(self):
+        self.writer.close()
+
+    def get_stats(self):
+        """Задержка записи и глубина очереди фонового писателя"""
+        return self.writer.get_stats()
+
+    def _day_files(self, date_str):
+        """Существующие файлы журнала за день (формат мог меняться в течение дня)
 
-        with open(log_file, "a", encoding="utf-8") as f:
-            f.write(log_entry)
+        Сжатый файл идет перед несжатым: несжатый может появиться, если запись дня
+        пришла уже после ротации.
+        """
+        paths = []
+        for suffix in (TEXT_SUFFIX, JSONL_SUFFIX):
+            path = self.writer.path_for(date_str, suffix)
+            paths.extend(path + extension for extension in DECOMPRESSORS)
+            paths.append(path)
+        return [path for path in paths if os.path.exists(path)]
 
     def get_logs(self, date_str=None):
-        """Чтение логов за указанную дату"""
+        """Чтение логов за указанную дату (строки в текстовом формате)"""
         if date_str is None:
             date_str = datetime.now().strftime("%Y-%m-%d")
 
-        log_file = os.path.join(self.log_dir, f"activity_{date_str}.log")
+        self.flush()
+        logs = []
+        for log_file in self._day_files(date_str):
+            if log_file.endswith(TEXT_SUFFIX):
+                with open(log_file, "r", encoding="utf-8") as f:
+                    logs.extend(f.read().splitlines())
+            else:
+                logs.extend(entry_to_text(entry) for entry in read_entries(log_file))
+        return logs
+
+    def query(self, date_str=None, user=None, action=None, hour_from=None, hour_to=None):
+        """Записи за день по пользователю, действию и часам [hour_from, hour_to)
+
+        Поиск идет по индексу (activity_ГГГГ-ММ-ДД.*.idx): читаются только подходящие строки.
+        Сжатые файлы не индексируются и просматриваются потоком.
+        Возвращает список словарей {'ts', 'user', 'action', 'details'}.
+        """
+        if date_str is None:
+            date_str = datetime.now().strftime("%Y-%m-%d")
+
+        self.flush()
+        entries = []
+        low = f"{hour_from:02d}" if hour_from is not None else "00"
+        high = f"{hour_to:02d}" if hour_to is not None else "24"
+        for log_file in self._day_files(date_str):
+            if is_compressed(log_file):
+                entries.extend(
+                    entry for entry in read_entries(log_file)
+                    if (user is None or entry['user'] == user)
+                    and (action is None or entry['action'] == action)
+                    and low <= entry['ts'][11:13] < high
+                )
+                continue
+            index = LogIndex.open(log_file)
+            entries.extend(index.read(index.find(user, action, hour_from, hour_to)))
+        return entries
+
+    def _log_dates(self):
+        """Даты, за которые есть файлы журнала, по возрастанию"""
+        dates = set()
+        for name in os.listdir(self.log_dir):
+            match = LOG_FILE_RE.match(name)
+            if match:
+                dates.add(match.group(1))
+        return sorted(dates)
+
+    def tail(self, n=100):
+        """Последние n записей журнала (с переходом на предыдущие дни, если нужно)
+
+        Файлы читаются блоками с конца, целиком не загружаются.
+        """
+        self.flush()
+        entries = []
+        for date_str in reversed(self._log_dates()):
+            needed = n - len(entries)
+            day = []
+            for log_file in self._day_files(date_str):
+                day.extend(entry for entry in map(parse_line, tail_lines(log_file, needed)) if entry is not None)
+            day.sort(key=lambda entry: entry['ts'])
+            entries = day[-needed:] + entries
+            if len(entries) >= n:
+                break
+        return entries
+
+    def follow(self, poll_interval=1.0, stop=None):
+        """Новые записи журнала по мере появления (генератор, см. follow_file)"""
+        suffix = JSONL_SUFFIX if self.fmt == 'jsonl' else TEXT_SUFFIX
+        return follow_file(lambda: self.writer.path_for(datetime.now().strftime("%Y-%m-%d"), suffix),
+                           poll_interval, stop)
+
+    def search(self, date_from=None, date_to=None, text=None, user=None, action=None):
+        """Записи за период с date_from по date_to включительно (генератор)
+
+        text - подстрока записи, user и action - точное совпадение. Файлы просматриваются
+        через mmap, записи выдаются по мере нахождения, без загрузки дней в память.
+        """
+        self.flush()
+        needle = text or user or action
+        low = date_from.isoformat() if date_from else ''
+        high = date_to.isoformat() if date_to else '9999-99-99'
 
-        if os.path.exists(log_file):
-            with open(log_file, "r", encoding="utf-8") as f:
-                return f.read().splitlines()
-        return []
\ No newline at end of file
+        for date_str in self._log_dates():
+            if not low <= date_str <= high:
+                continue
+            for log_file in self._day_files(date_str):
+                for entry in search_file(log_file, search_needle(log_file, needle)):
+                    if user is not None and entry['user'] != user:
+                        continue
+                    if action is not None and entry['action'] != action:
+                        continue
+                    if text and text not in entry_to_text(entry):
+                        continue
+                    yield entry
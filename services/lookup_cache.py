@@ -0,0 +1,187 @@
+# services/lookup_cache.py
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from services.notifications import get_change_listener
+
+# Канал, в который триггеры на Автомобиль и Владелец пишут измененные номера и ФИО
+CHANNEL = 'lookup_changed'
+
+
+class TTLCache:
+    """Ограниченный LRU-кэш со сроком жизни записей
+
+    generation увеличивается при каждом сбросе записей: put с поколением, прочитанным
+    до запроса к БД, отбрасывается, если за время запроса кэш сбрасывался.
+    """
+
+    def __init__(self, maxsize=1000, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = OrderedDict()      # ключ -> (значение, время записи)
+        self._generation = 0
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'invalidations': 0,
+                       'stale_puts': 0}
+
+    @property
+    def generation(self):
+        with self._lock:
+            return self._generation
+
+    def get(self, key):
+        """Значение из кэша или None"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self._stats['misses'] += 1
+                return None
+            value, stored = item
+            if time.monotonic() - stored > self.ttl:
+                del self._data[key]
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._data.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def put(self, key, value, generation=None):
+        """Запись в кэш; generation - значение self.generation до чтения value из БД"""
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                # Пока value читалось, пришел сброс - значение могло устареть
+                self._stats['stale_puts'] += 1
+                return
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._generation += 1
+            if self._data.pop(key, None) is not None:
+                self._stats['invalidations'] += 1
+
+    def invalidate_where(self, predicate):
+        """Удаление записей, для которых predicate(ключ, значение) истинно"""
+        with self._lock:
+            self._generation += 1
+            keys = [key for key, (value, _) in self._data.items() if predicate(key, value)]
+            for key in keys:
+                del self._data[key]
+            self._stats['invalidations'] += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._stats['invalidations'] += len(self._data)
+            self._data.clear()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._data)
+        stats['maxsize'] = self.maxsize
+        stats['ttl'] = self.ttl
+        return stats
+
+
+class LookupCache(TTLCache):
+    """Кэш запросов диспетчера по номеру автомобиля и ФИО владельца
+
+    Ключи: ('owner_by_license', номер) и ('car_info_by_owner', ФИО).
+    Записи сбрасываются при изменениях через AutoService и по уведомлениям триггеров.
+    Как и ReferenceCache, пока слушающее соединение не установлено, кэш не используется:
+    пропущенные уведомления иначе остались бы незамеченными до истечения ttl.
+    Строки хранятся и выдаются копиями: изменение результата вызывающим кэш не портит.
+    """
+
+    def __init__(self, maxsize=1000, ttl=60.0, listener=None):
+        super().__init__(maxsize, ttl)
+        self.listener = listener or get_change_listener()
+        self.listener.subscribe(CHANNEL, self._on_notify)
+        self.listener.on_reset(self.clear)
+
+    @property
+    def active(self):
+        return self.listener.active
+
+    def get(self, key):
+        if not self.active:
+            with self._lock:
+                self._stats['misses'] += 1
+            return None
+        rows = super().get(key)
+        return None if rows is None else [dict(row) for row in rows]
+
+    def put(self, key, value, generation=None):
+        if self.active:
+            super().put(key, [dict(row) for row in value], generation)
+
+    def invalidate_changes(self, plates=(), owners=()):
+        """Сброс всего, что зависит от данных номеров и ФИО владельцев, за один проход"""
+        plates, owners = set(plates), set(owners)
+        if not plates and not owners:
+            return
+        with self._lock:
+            self._generation += 1
+            keys = [
+                key for key, (rows, _) in self._data.items()
+                if (key[0] == 'owner_by_license'
+                    and (key[1] in plates or any(row['ФИО'] in owners for row in rows)))
+                or (key[0] == 'car_info_by_owner'
+                    and (key[1] in owners or any(row['Номер_госрегистрации'] in plates for row in rows)))
+            ]
+            for key in keys:
+                del self._data[key]
+            self._stats['invalidations'] += len(keys)
+
+    def invalidate_plate(self, номер):
+        """Сброс всего, что зависит от номера автомобиля"""
+        self.invalidate_changes(plates=[номер])
+
+    def invalidate_owner(self, фио):
+        """Сброс всего, что зависит от владельца с данным ФИО"""
+        self.invalidate_changes(owners=[фио])
+
+    def _on_notify(self, payload):
+        # Уведомление на оператор: {"plates": [...], "owners": [...]}; пустой объект - сброс всего
+        try:
+            change = json.loads(payload)
+        except ValueError:
+            change = None
+        if not isinstance(change, dict):
+            self.clear()
+            return
+        plates = list(change.get('plates') or [])
+        owners = list(change.get('owners') or [])
+        # Уведомления построчных триггеров до миграции 0012
+        if change.get('plate'):
+            plates.append(change['plate'])
+        if change.get('owner'):
+            owners.append(change['owner'])
+        if plates or owners:
+            self.invalidate_changes(plates, owners)
+        else:
+            self.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_lookup_cache():
+    """Общий для процесса кэш запросов по номеру и владельцу"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LookupCache(
+                maxsize=int(os.getenv('LOOKUP_CACHE_SIZE', '1000')),
+                ttl=float(os.getenv('LOOKUP_CACHE_TTL', '60'))
+            )
+        return _cache
@@ -0,0 +1,117 @@
+# services/notifications.py
+import select
+import threading
+import time
+import psycopg2
+from config.database import Database
+
+
+class ChangeListener:
+    """Фоновое соединение с LISTEN, раздающее уведомления NOTIFY подписчикам
+
+    Обработчики reset вызываются при (пере)подключении и при обрыве: пока соединение
+    не установлено, часть уведомлений может быть потеряна и кэши должны сброситься.
+    """
+
+    def __init__(self, conn_params, retry_interval=5.0):
+        self.conn_params = conn_params
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+        self._subscribers = {}          # канал -> [обработчик(payload)]
+        self._reset_handlers = []
+        self._active = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self, channel, callback):
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(callback)
+
+    def on_reset(self, callback):
+        with self._lock:
+            self._reset_handlers.append(callback)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._listen, name="change-listener", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def active(self):
+        return self._active.is_set()
+
+    def _reset(self):
+        with self._lock:
+            handlers = list(self._reset_handlers)
+        for handler in handlers:
+            handler()
+
+    def _dispatch(self, notify):
+        with self._lock:
+            handlers = list(self._subscribers.get(notify.channel, []))
+        for handler in handlers:
+            handler(notify.payload)
+
+    def _listen_new_channels(self, conn, listened):
+        with self._lock:
+            channels = [channel for channel in self._subscribers if channel not in listened]
+        if channels:
+            with conn.cursor() as cursor:
+                for channel in channels:
+                    cursor.execute(f"LISTEN {channel}")
+            listened.update(channels)
+            return True
+        return False
+
+    def _listen(self):
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(**self.conn_params)
+                conn.autocommit = True
+                listened = set()
+                self._listen_new_channels(conn, listened)
+                # Изменения до подписки могли быть пропущены
+                self._reset()
+                self._active.set()
+                last_check = time.monotonic()
+
+                while not self._stop.is_set():
+                    if self._listen_new_channels(conn, listened):
+                        self._reset()
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        if time.monotonic() - last_check >= self.retry_interval:
+                            # Тишина - проверяем, что соединение живо
+                            with conn.cursor() as cursor:
+                                cursor.execute("SELECT 1")
+                            last_check = time.monotonic()
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._dispatch(conn.notifies.pop(0))
+            except (psycopg2.Error, OSError):
+                pass
+            finally:
+                self._active.clear()
+                self._reset()
+                if conn is not None and not conn.closed:
+                    conn.close()
+            self._stop.wait(self.retry_interval)
+
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def get_change_listener():
+    """Общий для процесса слушатель уведомлений (запускается при первом обращении)"""
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            _listener = ChangeListener(Database().pool.conn_params)
+            _listener.start()
+        return _listener
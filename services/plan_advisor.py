@@ -0,0 +1,435 @@
+# services/plan_advisor.py
+import json
+import os
+import re
+from datetime import date, datetime, timedelta
+from config.database import Database
+from models.partitions import partitioned_index_statements
+from services import queries
+
+# Образцы параметров из текущих данных: последний ремонт дает номер, владельца, работника
+# и неисправность, для которых запросы сервиса возвращают строки
+SAMPLES_QUERY = """
+SELECT а.Номер_госрегистрации AS plate, в.ФИО AS owner, р.ФИО AS worker,
+       н.Тип_неисправности AS fault, фр.Время_устранения AS repaired_at
+FROM Факт_ремонта фр
+JOIN Автомобиль а ON фр.ID_Автомобиля = а.ID_Автомобиля
+JOIN Владелец в ON а.ID_Владельца = в.ID_Владельца
+JOIN Работник р ON фр.ID_Работника = р.ID_Работника
+JOIN Неисправность н ON фр.ID_Неисправности = н.ID_Неисправности
+ORDER BY фр.Время_устранения DESC
+LIMIT 1
+"""
+
+# Колонки таблиц, секции (-> секционированная таблица) и ключи существующих индексов
+COLUMNS_QUERY = """
+SELECT c.relname AS table, c.relkind = 'p' AS partitioned, array_agg(a.attname ORDER BY a.attnum) AS columns
+FROM pg_class c
+JOIN pg_namespace ns ON ns.oid = c.relnamespace
+JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+WHERE ns.nspname = current_schema() AND c.relkind IN ('r', 'p') AND NOT c.relispartition
+GROUP BY c.relname, c.relkind
+"""
+
+PARTITION_ROOTS_QUERY = """
+SELECT c.relname AS name, r.relname AS root
+FROM pg_class c
+JOIN pg_namespace ns ON ns.oid = c.relnamespace
+JOIN pg_class r ON r.oid = pg_partition_root(c.oid)
+WHERE ns.nspname = current_schema() AND c.relispartition AND c.relkind = 'r'
+"""
+
+INDEXES_QUERY = """
+SELECT c.relname AS table, i.relname AS index, array_agg(a.attname ORDER BY k.n) AS columns
+FROM pg_index x
+JOIN pg_class c ON c.oid = x.indrelid
+JOIN pg_class i ON i.oid = x.indexrelid
+JOIN pg_namespace ns ON ns.oid = c.relnamespace
+CROSS JOIN LATERAL unnest(x.indkey::int2[]) WITH ORDINALITY AS k(attnum, n)
+JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = k.attnum
+WHERE ns.nspname = current_schema() AND NOT c.relispartition AND k.n <= x.indnkeyatts
+GROUP BY c.relname, i.relname
+"""
+
+SCAN_NODES = ('Seq Scan', 'Index Scan', 'Index Only Scan', 'Bitmap Heap Scan')
+SORT_NODES = ('Sort', 'Incremental Sort')
+
+# Идентификатор в выражении плана: "в кавычках" или без них
+IDENTIFIER_RE = re.compile(r'"([^"]+)"|([^\W\d]\w*)')
+
+# Насколько должны вырасти время или число прочитанных блоков, чтобы считать это регрессией
+REGRESSION_RATIO = 1.5
+REGRESSION_MIN_MS = 1.0
+REGRESSION_MIN_BLOCKS = 100
+
+SNAPSHOT_PREFIX = 'plans_'
+
+
+def plan_queries(sample=None, page_size=20, top_n=3):
+    """Именованные читающие запросы сервиса: [(имя, запрос, параметры)]
+
+    Имена совпадают с именами в статистике запросов. Запросы на запись не разбираются:
+    EXPLAIN ANALYZE выполняет запрос.
+    """
+    sample = sample or {}
+    plate = sample.get('plate') or ''
+    owner = sample.get('owner') or ''
+    worker = sample.get('worker') or ''
+    fault = sample.get('fault') or ''
+    last_day = sample['repaired_at'].date() if sample.get('repaired_at') else date.today()
+    date_from = last_day - timedelta(days=30)
+    period = queries.period_params(date_from, last_day)
+
+    statements = [
+        ('owner_by_license', queries.OWNER_BY_LICENSE, (plate,)),
+        ('car_info_by_owner', queries.CAR_INFO_BY_OWNER, (owner,)),
+        ('fixed_faults_by_owner', queries.FIXED_FAULTS_BY_OWNER, (owner,)),
+        ('repair_details', queries.REPAIR_DETAILS, (owner, fault)),
+        ('cars_repaired_by_employee', queries.CARS_REPAIRED_BY_EMPLOYEE, (worker,)),
+        ('owners_by_fault_type', queries.OWNERS_BY_FAULT_TYPE, (fault,)),
+        ('car_card', queries.CAR_CARD, (plate,)),
+        ('fault_report_by_owner', queries.FAULT_REPORT_BY_OWNER, (owner,)),
+        ('fault_report_all', queries.FAULT_REPORT_ALL, None),
+        ('data_version', queries.DATA_VERSION, None),
+        ('repairs_by_day', queries.REPAIRS_BY_DAY, period),
+    ]
+    statements.extend(queries.station_report_queries(top_n=top_n))
+    # Отчет за период читает Факт_ремонта, а не сводки: тот же подзапрос деталей - другой план
+    statements.extend((f"{name}[period]", query, params) for name, query, params
+                      in queries.station_report_queries(date_from, last_day, top_n))
+    statements.extend([
+        ('all_owners', queries.ALL_OWNERS, None),
+        ('all_employees', queries.ALL_EMPLOYEES, None),
+        ('all_cars', queries.ALL_CARS, None),
+        ('all_faults', queries.ALL_FAULTS, None),
+        ('all_repairs', queries.ALL_REPAIRS, None),
+    ])
+    statements.extend((f"page_{listing}", queries.page_query(listing, False), (page_size + 1,))
+                      for listing in queries.PAGED_LISTINGS)
+    return statements
+
+
+def walk(node, parent=None):
+    """Узлы плана в прямом порядке: (узел, родитель)"""
+    yield node, parent
+    for child in node.get('Plans', []):
+        yield from walk(child, node)
+
+
+def _rows_scanned(node):
+    loops = node.get('Actual Loops', 1) or 1
+    return int((node.get('Actual Rows', 0) + node.get('Rows Removed by Filter', 0)) * loops)
+
+
+def _index_name(table, columns):
+    name = f"idx_{table}_{'_'.join(columns)}".lower()
+    # Имя длиннее 63 байт PostgreSQL обрежет сам, но с предупреждением
+    return name.encode('utf-8')[:63].decode('utf-8', errors='ignore')
+
+
+def merge_proposals(proposals):
+    """Предложения без повторов: индекс, ключ которого - начало ключа другого, не нужен"""
+    keys = [[column.split()[0] for column in proposal['columns']] for proposal in proposals]
+    merged = []
+    for i, proposal in enumerate(proposals):
+        covered = any(
+            j != i and other['table'] == proposal['table'] and keys[j][:len(keys[i])] == keys[i]
+            and (len(keys[j]) > len(keys[i]) or j < i)
+            for j, other in enumerate(proposals)
+        )
+        if not covered:
+            merged.append(proposal)
+    return merged
+
+
+class PlanAdvisor:
+    """Разбор планов запросов сервиса и подбор индексов
+
+    Для каждого именованного запроса выполняется EXPLAIN (ANALYZE, BUFFERS) на текущих
+    данных. Отмечаются последовательные сканирования и сортировки, по их условиям и
+    ключам сортировки предлагаются составные (при возможности покрывающие) индексы.
+    Сводки планов сохраняются в снимки, чтобы сравнивать их с последующими запусками.
+    """
+
+    def __init__(self, db=None, snapshot_dir=None, min_rows=None):
+        self.db = db or Database()
+        self.snapshot_dir = snapshot_dir or os.getenv('PLAN_SNAPSHOT_DIR', 'plan_snapshots')
+        # Сканирования и сортировки меньшего числа строк не считаются проблемой
+        self.min_rows = min_rows if min_rows is not None else int(os.getenv('PLAN_ADVISOR_MIN_ROWS', '1000'))
+
+    # РАЗБОР ПЛАНОВ
+
+    def _load_schema(self, cursor):
+        cursor.execute(COLUMNS_QUERY)
+        tables = {row['table']: {'columns': list(row['columns']), 'partitioned': row['partitioned']}
+                  for row in cursor.fetchall()}
+        cursor.execute(PARTITION_ROOTS_QUERY)
+        roots = {row['name']: row['root'] for row in cursor.fetchall()}
+        cursor.execute(INDEXES_QUERY)
+        indexes = {}
+        for row in cursor.fetchall():
+            indexes.setdefault(row['table'], []).append((row['index'], list(row['columns'])))
+        return {'tables': tables, 'roots': roots, 'indexes': indexes}
+
+    def explain(self, query, params, cursor):
+        """План запроса в формате JSON (EXPLAIN ANALYZE выполняет запрос)"""
+        cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, VERBOSE, FORMAT JSON) {query}", params)
+        plan = cursor.fetchone()['QUERY PLAN']
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]
+
+    def analyze(self):
+        """Разбор планов всех запросов: [{'name', 'plan', 'summary', 'findings', 'proposals'}]
+
+        Запросы выполняются в одной транзакции только для чтения: ошибка одного запроса
+        (откат к точке сохранения) не мешает разбору остальных.
+        """
+        results = []
+        with self.db.transaction() as cursor:
+            cursor.execute("SET TRANSACTION READ ONLY")
+            schema = self._load_schema(cursor)
+            cursor.execute(SAMPLES_QUERY)
+            sample = cursor.fetchone()
+
+            for name, query, params in plan_queries(sample):
+                cursor.execute("SAVEPOINT plan_advisor")
+                try:
+                    plan = self.explain(query, params, cursor)
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT plan_advisor")
+                    results.append({'name': name, 'error': str(e).strip(), 'plan': None,
+                                    'summary': None, 'findings': [], 'proposals': []})
+                    continue
+                cursor.execute("RELEASE SAVEPOINT plan_advisor")
+                findings, proposals = self._inspect(plan['Plan'], schema)
+                results.append({
+                    'name': name,
+                    'error': None,
+                    'plan': plan,
+                    'summary': self.summarize(plan),
+                    'findings': findings,
+                    'proposals': proposals,
+                })
+        return results
+
+    def _table(self, node, schema):
+        relation = node.get('Relation Name')
+        return schema['roots'].get(relation, relation)
+
+    def _columns(self, expression, table, schema):
+        """Колонки таблицы, упомянутые в выражении плана, в порядке появления"""
+        known = set(schema['tables'].get(table, {}).get('columns', []))
+        found = []
+        for quoted, bare in IDENTIFIER_RE.findall(expression or ''):
+            column = quoted or bare
+            if column in known and column not in found:
+                found.append(column)
+        return found
+
+    def _filter_columns(self, node, table, schema):
+        """Колонки условия сканирования: сначала сравнения на равенство, затем диапазоны"""
+        equality, other = [], []
+        condition = ' AND '.join(filter(None, (node.get('Filter'), node.get('Index Cond'),
+                                               node.get('Recheck Cond'))))
+        for part in re.split(r'\bAND\b', condition):
+            target = equality if ' = ' in part else other
+            for column in self._columns(part, table, schema):
+                if column not in equality and column not in other:
+                    target.append(column)
+        return equality, other
+
+    def _covered(self, table, columns, schema):
+        """Имя существующего индекса, ключ которого начинается с columns"""
+        for index, index_columns in schema['indexes'].get(table, []):
+            if index_columns[:len(columns)] == columns:
+                return index
+        return None
+
+    def _propose(self, table, key, output, reason, schema):
+        """Предложение индекса: {'table', 'columns', 'include', 'reason', 'statements', 'ddl'}
+
+        Для секционированной таблицы - последовательность ON ONLY / CONCURRENTLY по секциям /
+        ATTACH (partitioned_index_statements): обычный CREATE INDEX на ней блокирует запись
+        во все секции. Шаги выполняются по одному, вне транзакции.
+        """
+        bare_key = [column.split()[0] for column in key]
+        if not table or not bare_key or self._covered(table, bare_key, schema):
+            return None
+        include = [column for column in output if column not in bare_key]
+        all_columns = schema['tables'].get(table, {}).get('columns', [])
+        # Покрывающий индекс имеет смысл, только если запросу нужна малая часть колонок
+        if not include or len(include) > 3 or len(include) + len(bare_key) >= len(all_columns):
+            include = []
+        index = _index_name(table, bare_key)
+        definition = f"({', '.join(key)})"
+        if include:
+            definition += f" INCLUDE ({', '.join(include)})"
+        if schema['tables'].get(table, {}).get('partitioned', False):
+            partitions = sorted(name for name, root in schema['roots'].items() if root == table)
+            statements = partitioned_index_statements(index, table, definition, partitions)
+        else:
+            statements = [f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index} ON {table}{definition}"]
+        return {'table': table, 'columns': key, 'include': include, 'reason': reason,
+                'statements': statements, 'ddl': ";\n  ".join(statements)}
+
+    def _scan_under(self, node):
+        """Сканирование таблицы под узлом, если ниже нет соединений"""
+        while node.get('Node Type') not in SCAN_NODES:
+            children = node.get('Plans', [])
+            if len(children) != 1:
+                return None
+            node = children[0]
+        return node
+
+    def _inspect(self, root, schema):
+        findings, proposals = [], []
+
+        def add_proposal(proposal):
+            if proposal:
+                proposals.append(proposal)
+
+        for node, _ in walk(root):
+            node_type = node.get('Node Type')
+
+            if node_type == 'Seq Scan':
+                scanned = _rows_scanned(node)
+                if scanned < self.min_rows:
+                    continue
+                table = self._table(node, schema)
+                findings.append({
+                    'kind': 'seq_scan',
+                    'table': table,
+                    'relation': node.get('Relation Name'),
+                    'rows': scanned,
+                    'removed': int(node.get('Rows Removed by Filter', 0) * (node.get('Actual Loops', 1) or 1)),
+                    'filter': node.get('Filter'),
+                })
+                equality, other = self._filter_columns(node, table, schema)
+                if equality or other:
+                    output = self._columns(', '.join(node.get('Output', [])), table, schema)
+                    add_proposal(self._propose(table, equality + other, output,
+                                               f"последовательное сканирование {table} по условию", schema))
+
+            elif node_type in SORT_NODES:
+                rows = int(node.get('Actual Rows', 0) * (node.get('Actual Loops', 1) or 1))
+                on_disk = node.get('Sort Space Type') == 'Disk'
+                if rows < self.min_rows and not on_disk:
+                    continue
+                findings.append({
+                    'kind': 'sort',
+                    'rows': rows,
+                    'keys': node.get('Sort Key', []),
+                    'method': node.get('Sort Method'),
+                    'disk': on_disk,
+                })
+                scan = self._scan_under(node)
+                if scan is None:
+                    continue
+                table = self._table(scan, schema)
+                key = []
+                for sort_key in node.get('Sort Key', []):
+                    columns = self._columns(sort_key, table, schema)
+                    if len(columns) != 1:
+                        # Ключ - выражение или колонка другой таблицы: индексом не заменить
+                        key = []
+                        break
+                    key.append(f"{columns[0]} DESC" if sort_key.rstrip().endswith('DESC') else columns[0])
+                if key:
+                    equality, _ = self._filter_columns(scan, table, schema)
+                    output = self._columns(', '.join(scan.get('Output', [])), table, schema)
+                    add_proposal(self._propose(table, [c for c in equality if c not in key] + key, output,
+                                               f"сортировка {table} по {', '.join(key)}", schema))
+
+        return findings, merge_proposals(proposals)
+
+    @staticmethod
+    def summarize(plan):
+        """Сводка плана для снимка: форма плана, время и прочитанные блоки"""
+        root = plan['Plan']
+        shape = []
+        for node, _ in walk(root):
+            step = node['Node Type']
+            if node.get('Relation Name'):
+                step += f" on {node['Relation Name']}"
+            if node.get('Index Name'):
+                step += f" using {node['Index Name']}"
+            shape.append(step)
+        return {
+            'shape': shape,
+            'planning_ms': round(plan.get('Planning Time', 0.0), 3),
+            'execution_ms': round(plan.get('Execution Time', 0.0), 3),
+            'total_cost': root.get('Total Cost'),
+            'rows': root.get('Actual Rows'),
+            'shared_hit': root.get('Shared Hit Blocks', 0),
+            'shared_read': root.get('Shared Read Blocks', 0),
+        }
+
+    # СНИМКИ
+
+    def save_snapshot(self, results):
+        """Сохранение сводок планов в файл; возвращает путь"""
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        created = datetime.now()
+        path = os.path.join(self.snapshot_dir, f"{SNAPSHOT_PREFIX}{created:%Y%m%d_%H%M%S}.json")
+        snapshot = {
+            'created': created.isoformat(timespec='seconds'),
+            'queries': {item['name']: item['summary'] for item in results if item['summary']},
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False, indent=2)
+        return path
+
+    def list_snapshots(self):
+        """Сохраненные снимки, от новых к старым"""
+        if not os.path.isdir(self.snapshot_dir):
+            return []
+        names = [name for name in os.listdir(self.snapshot_dir)
+                 if name.startswith(SNAPSHOT_PREFIX) and name.endswith('.json')]
+        return [os.path.join(self.snapshot_dir, name) for name in sorted(names, reverse=True)]
+
+    def load_snapshot(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    @staticmethod
+    def diff(old, new):
+        """Сравнение снимков: [{'name', 'changes', 'regression', 'old_ms', 'new_ms'}]
+
+        old и new - словари 'queries' снимков (имя -> сводка плана).
+        """
+        report = []
+        for name in sorted(set(old) | set(new)):
+            before, after = old.get(name), new.get(name)
+            if before is None or after is None:
+                report.append({'name': name, 'changes': ['новый запрос' if before is None else 'запрос удален'],
+                               'regression': False,
+                               'old_ms': before and before['execution_ms'],
+                               'new_ms': after and after['execution_ms']})
+                continue
+
+            changes = []
+            regression = False
+            if before['shape'] != after['shape']:
+                changes.append('план изменился')
+                new_seq = [step for step in after['shape']
+                           if step.startswith('Seq Scan') and step not in before['shape']]
+                if new_seq:
+                    changes.append(f"новые последовательные сканирования: {', '.join(new_seq)}")
+                    regression = True
+
+            old_ms, new_ms = before['execution_ms'], after['execution_ms']
+            if new_ms > old_ms * REGRESSION_RATIO and new_ms - old_ms >= REGRESSION_MIN_MS:
+                changes.append(f"время {old_ms:.2f} -> {new_ms:.2f} мс")
+                regression = True
+
+            old_blocks = before['shared_hit'] + before['shared_read']
+            new_blocks = after['shared_hit'] + after['shared_read']
+            if new_blocks > old_blocks * REGRESSION_RATIO and new_blocks - old_blocks >= REGRESSION_MIN_BLOCKS:
+                changes.append(f"блоков {old_blocks} -> {new_blocks}")
+                regression = True
+
+            if changes:
+                report.append({'name': name, 'changes': changes, 'regression': regression,
+                               'old_ms': old_ms, 'new_ms': new_ms})
+        return report
@@ -0,0 +1,302 @@
+# services/queries.py
+# Тексты запросов, общие для синхронного и асинхронного сервисов
+from datetime import timedelta
+
+# ЗАПРОСЫ ДЛЯ ДИСПЕТЧЕРА
+
+OWNER_BY_LICENSE = """
+SELECT в.ФИО, в.Адрес 
+FROM Владелец в
+JOIN Автомобиль а ON в.ID_Владельца = а.ID_Владельца
+WHERE а.Номер_госрегистрации = %s
+"""
+
+CAR_INFO_BY_OWNER = """
+SELECT а.Номер_госрегистрации, а.Марка, а.Год_выпуска, а.Изготовитель
+FROM Автомобиль а
+JOIN Владелец в ON а.ID_Владельца = в.ID_Владельца
+WHERE в.ФИО = %s
+"""
+
+FIXED_FAULTS_BY_OWNER = """
+SELECT DISTINCT н.Тип_неисправности as тип_неисправности
+FROM Факт_ремонта фр
+JOIN Автомобиль а ON фр.ID_Автомобиля = а.ID_Автомобиля
+JOIN Владелец в ON а.ID_Владельца = в.ID_Владельца
+JOIN Неисправность н ON фр.ID_Неисправности = н.ID_Неисправности
+WHERE в.ФИО = %s
+ORDER BY н.Тип_неисправности
+"""
+
+REPAIR_DETAILS = """
+SELECT р.ФИО as Работник, а.Номер_госрегистрации, фр.Время_устранения
+FROM Факт_ремонта фр
+JOIN Автомобиль а ON фр.ID_Автомобиля = а.ID_Автомобиля
+JOIN Владелец в ON а.ID_Владельца = в.ID_Владельца
+JOIN Работник р ON фр.ID_Работника = р.ID_Работника
+JOIN Неисправность н ON фр.ID_Неисправности = н.ID_Неисправности
+WHERE в.ФИО = %s AND н.Тип_неисправности = %s
+ORDER BY фр.Время_устранения DESC
+"""
+
+CARS_REPAIRED_BY_EMPLOYEE = """
+SELECT DISTINCT а.Марка, а.Номер_госрегистрации, в.ФИО as Владелец, н.Тип_неисправности
+FROM Факт_ремонта фр
+JOIN Автомобиль а ON фр.ID_Автомобиля = а.ID_Автомобиля
+JOIN Владелец в ON а.ID_Владельца = в.ID_Владельца
+JOIN Работник р ON фр.ID_Работника = р.ID_Работника
+JOIN Неисправность н ON фр.ID_Неисправности = н.ID_Неисправности
+WHERE р.ФИО = %s
+ORDER BY а.Марка
+"""
+
+OWNERS_BY_FAULT_TYPE = """
+SELECT DISTINCT в.ФИО, а.Номер_госрегистрации, а.Марка
+FROM Факт_ремонта фр
+JOIN Автомобиль а ON фр.ID_Автомобиля = а.ID_Автомобиля
+JOIN Владелец в ON а.ID_Владельца = в.ID_Владельца
+JOIN Неисправность н ON фр.ID_Неисправности = н.ID_Неисправности
+WHERE н.Тип_неисправности = %s
+ORDER BY в.ФИО
+"""
+
+# Карточка автомобиля: поиск по уникальному номеру и строка Сводка_автомобиль (миграция 0011)
+# по первичному ключу, ремонты не перебираются
+CAR_CARD = """
+SELECT а.Номер_госрегистрации, а.Марка, а.Год_выпуска, в.ФИО as Владелец,
+       COALESCE(с.Ремонтов, 0) as Ремонтов, с.Последний_ремонт,
+       н.Тип_неисправности as Последняя_неисправность, р.ФИО as Последний_работник
+FROM Автомобиль а
+JOIN Владелец в ON а.ID_Владельца = в.ID_Владельца
+LEFT JOIN Сводка_автомобиль с ON с.ID_Автомобиля = а.ID_Автомобиля
+LEFT JOIN Неисправность н ON н.ID_Неисправности = с.ID_Последней_неисправности
+LEFT JOIN Работник р ON р.ID_Работника = с.ID_Последнего_работника
+WHERE а.Номер_госрегистрации = %s
+"""
+
+# СПРАВКИ И ОТЧЕТЫ
+
+FAULT_REPORT_BY_OWNER = """
+SELECT в.ФИО, а.Марка, а.Номер_госрегистрации, 
+       н.Тип_неисправности, фр.Время_устранения
+FROM Факт_ремонта фр
+JOIN Автомобиль а ON фр.ID_Автомобиля = а.ID_Автомобиля
+JOIN Владелец в ON а.ID_Владельца = в.ID_Владельца
+JOIN Неисправность н ON фр.ID_Неисправности = н.ID_Неисправности
+WHERE в.ФИО = %s
+ORDER BY фр.Время_устранения DESC
+"""
+
+FAULT_REPORT_ALL = """
+SELECT в.ФИО, а.Марка, а.Номер_госрегистрации, 
+       н.Тип_неисправности, фр.Время_устранения
+FROM Факт_ремонта фр
+JOIN Автомобиль а ON фр.ID_Автомобиля = а.ID_Автомобиля
+JOIN Владелец в ON а.ID_Владельца = в.ID_Владельца
+JOIN Неисправность н ON фр.ID_Неисправности = н.ID_Неисправности
+ORDER BY в.ФИО, фр.Время_устранения DESC
+"""
+
+# Период отчета о работе станции: границы сравниваются с ключом секционирования Факт_ремонта,
+# поэтому планировщик читает только секции нужных месяцев. NULL - без ограничения.
+PERIOD_FILTER = """
+фр.Время_устранения >= COALESCE(%(date_from)s::timestamp, '-infinity')
+AND фр.Время_устранения < COALESCE(%(date_to)s::timestamp, 'infinity')
+"""
+
+# Количество ремонтируемых автомобилей
+STATION_TOTAL_CARS = f"""
+SELECT COUNT(DISTINCT фр.ID_Автомобиля) as total_cars
+FROM Факт_ремонта фр
+WHERE {PERIOD_FILTER}
+"""
+
+# Детали ремонтов
+STATION_REPAIR_DETAILS = f"""
+SELECT а.Номер_госрегистрации, в.ФИО as Владелец, 
+       р.ФИО as Работник, н.Тип_неисправности, фр.Время_устранения
+FROM Факт_ремонта фр
+JOIN Автомобиль а ON фр.ID_Автомобиля = а.ID_Автомобиля
+JOIN Владелец в ON а.ID_Владельца = в.ID_Владельца
+JOIN Работник р ON фр.ID_Работника = р.ID_Работника
+JOIN Неисправность н ON фр.ID_Неисправности = н.ID_Неисправности
+WHERE {PERIOD_FILTER}
+ORDER BY фр.Время_устранения DESC
+LIMIT 50
+"""
+
+# Неисправности по маркам: top_n самых частых неисправностей каждой марки (NULL - все)
+STATION_FAULTS_BY_BRAND = f"""
+SELECT т.Марка, н.Тип_неисправности, т.Количество
+FROM (
+    SELECT а.Марка, фр.ID_Неисправности, COUNT(*) as Количество,
+           row_number() OVER (PARTITION BY а.Марка ORDER BY COUNT(*) DESC, фр.ID_Неисправности) AS место
+    FROM Факт_ремонта фр
+    JOIN Автомобиль а ON фр.ID_Автомобиля = а.ID_Автомобиля
+    WHERE {PERIOD_FILTER}
+    GROUP BY а.Марка, фр.ID_Неисправности
+) т
+JOIN Неисправность н ON т.ID_Неисправности = н.ID_Неисправности
+WHERE %(top_n)s::integer IS NULL OR т.место <= %(top_n)s::integer
+ORDER BY т.Марка, т.Количество DESC
+"""
+
+# Статистика по работникам
+STATION_EMPLOYEE_STATS = f"""
+SELECT р.ФИО, COUNT(*) as Количество_ремонтов
+FROM Факт_ремонта фр
+JOIN Работник р ON фр.ID_Работника = р.ID_Работника
+WHERE {PERIOD_FILTER}
+GROUP BY р.ФИО
+ORDER BY Количество_ремонтов DESC
+"""
+
+# Отчет за весь период по сводкам (миграция 0008): размер сводок не зависит от числа ремонтов
+STATION_TOTAL_CARS_ROLLUP = "SELECT COALESCE((SELECT Автомобилей FROM Сводка_станция), 0) as total_cars"
+
+# Сводки с еще не перенесенными изменениями - представления Итог_* (миграция 0017)
+STATION_FAULTS_BY_BRAND_ROLLUP = """
+SELECT т.Марка, н.Тип_неисправности, т.Количество
+FROM (
+    SELECT с.Марка, с.ID_Неисправности, с.Количество,
+           row_number() OVER (PARTITION BY с.Марка ORDER BY с.Количество DESC, с.ID_Неисправности) AS место
+    FROM Итог_марка_неисправность с
+) т
+JOIN Неисправность н ON т.ID_Неисправности = н.ID_Неисправности
+WHERE %(top_n)s::integer IS NULL OR т.место <= %(top_n)s::integer
+ORDER BY т.Марка, т.Количество DESC
+"""
+
+STATION_EMPLOYEE_STATS_ROLLUP = """
+SELECT р.ФИО, SUM(с.Количество) as Количество_ремонтов
+FROM Итог_работник с
+JOIN Работник р ON с.ID_Работника = р.ID_Работника
+GROUP BY р.ФИО
+ORDER BY Количество_ремонтов DESC
+"""
+
+# Число ремонтов по дням за период
+REPAIRS_BY_DAY = """
+SELECT День, Ремонтов
+FROM Итог_день
+WHERE День >= COALESCE(%(date_from)s::date, '-infinity') AND День < COALESCE(%(date_to)s::date, 'infinity')
+ORDER BY День
+"""
+
+# Версия данных для кэша отчетов (миграции 0009, 0013): число изменений пяти таблиц, видимых
+# в снимке. changes - несвернутые строки Изменение_данных
+DATA_VERSION = """
+SELECT (с.version + и.changes)::bigint AS version, и.changes
+FROM (SELECT COALESCE(SUM(Версия), 0) AS version FROM Версия_данных) с,
+     (SELECT count(*) AS changes FROM Изменение_данных) и
+"""
+
+# Свертка журнала изменений и изменений сводок (миграция 0017) - вызывается вместе:
+# оба растут с каждым изменением ремонтов
+COMPACT_DATA_CHANGES = "SELECT compact_data_changes() AS compacted, rollups_fold() AS folded"
+
+ALL_OWNERS = "SELECT * FROM Владелец ORDER BY ФИО"
+ALL_EMPLOYEES = "SELECT * FROM Работник ORDER BY ФИО"
+ALL_CARS = "SELECT * FROM Автомобиль ORDER BY Марка"
+ALL_FAULTS = "SELECT * FROM Неисправность ORDER BY Тип_неисправности"
+
+ALL_REPAIRS = """
+SELECT фр.id_Ремонта, в.ФИО as владелец, а.Номер_госрегистрации, а.Марка, 
+       р.ФИО as работник, н.Тип_неисправности, фр.Время_устранения
+FROM Факт_ремонта фр
+JOIN Автомобиль а ON фр.id_Автомобиля = а.id_Автомобиля
+JOIN Владелец в ON а.id_Владельца = в.id_Владельца
+JOIN Работник р ON фр.id_Работника = р.id_Работника
+JOIN Неисправность н ON фр.id_Неисправности = н.id_Неисправности
+ORDER BY фр.Время_устранения DESC
+"""
+
+# ПОСТРАНИЧНЫЕ СПИСКИ (keyset-пагинация)
+# key - ключ сортировки с первичным ключом в конце (по нему построены составные индексы),
+# row_key - те же колонки в строке результата
+
+PAGED_LISTINGS = {
+    'owners': {
+        'select': "SELECT * FROM Владелец",
+        'key': ('ФИО', 'ID_Владельца'),
+        'row_key': ('ФИО', 'id_Владельца'),
+        'descending': False,
+    },
+    'employees': {
+        'select': "SELECT * FROM Работник",
+        'key': ('ФИО', 'ID_Работника'),
+        'row_key': ('ФИО', 'id_Работника'),
+        'descending': False,
+    },
+    'cars': {
+        'select': "SELECT * FROM Автомобиль",
+        'key': ('Марка', 'ID_Автомобиля'),
+        'row_key': ('Марка', 'id_Автомобиля'),
+        'descending': False,
+    },
+    'faults': {
+        'select': "SELECT * FROM Неисправность",
+        'key': ('Тип_неисправности', 'ID_Неисправности'),
+        'row_key': ('Тип_неисправности', 'id_Неисправности'),
+        'descending': False,
+    },
+    'repairs': {
+        'select': """
+        SELECT фр.id_Ремонта, в.ФИО as владелец, а.Номер_госрегистрации, а.Марка, 
+               р.ФИО as работник, н.Тип_неисправности, фр.Время_устранения
+        FROM Факт_ремонта фр
+        JOIN Автомобиль а ON фр.id_Автомобиля = а.id_Автомобиля
+        JOIN Владелец в ON а.id_Владельца = в.id_Владельца
+        JOIN Работник р ON фр.id_Работника = р.id_Работника
+        JOIN Неисправность н ON фр.id_Неисправности = н.id_Неисправности
+        """,
+        'key': ('фр.Время_устранения', 'фр.ID_Ремонта'),
+        'row_key': ('Время_устранения', 'id_Ремонта'),
+        'descending': True,
+    },
+}
+
+
+def page_query(listing, with_token, backward=False):
+    """Запрос страницы: диапазон по ключу сортировки вместо OFFSET"""
+    spec = PAGED_LISTINGS[listing]
+    # При движении назад порядок и сравнение меняются на противоположные
+    descending = spec['descending'] != backward
+    columns = ', '.join(spec['key'])
+    where = ''
+    if with_token:
+        placeholders = ', '.join(['%s'] * len(spec['key']))
+        where = f" WHERE ({columns}) {'<' if descending else '>'} ({placeholders})"
+    order = ', '.join(f"{column}{' DESC' if descending else ''}" for column in spec['key'])
+    return f"{spec['select'].rstrip()}{where} ORDER BY {order} LIMIT %s"
+
+
+def station_report_queries(date_from=None, date_to=None, top_n=None):
+    """Подзапросы отчета о работе станции: [(имя, запрос, параметры)] в порядке результата
+
+    За весь период итоги берутся из сводок, за ограниченный период - из Факт_ремонта
+    с отсечением секций вне периода. top_n - сколько неисправностей выдавать по каждой марке.
+    """
+    params = period_params(date_from, date_to)
+    brand_params = dict(params, top_n=top_n)
+    if date_from is None and date_to is None:
+        return [
+            ('station_total_cars_rollup', STATION_TOTAL_CARS_ROLLUP, None),
+            ('station_repair_details', STATION_REPAIR_DETAILS, params),
+            ('station_faults_by_brand_rollup', STATION_FAULTS_BY_BRAND_ROLLUP, brand_params),
+            ('station_employee_stats_rollup', STATION_EMPLOYEE_STATS_ROLLUP, None),
+        ]
+    return [
+        ('station_total_cars', STATION_TOTAL_CARS, params),
+        ('station_repair_details', STATION_REPAIR_DETAILS, params),
+        ('station_faults_by_brand', STATION_FAULTS_BY_BRAND, brand_params),
+        ('station_employee_stats', STATION_EMPLOYEE_STATS, params),
+    ]
+
+
+def period_params(date_from=None, date_to=None):
+    """Параметры PERIOD_FILTER для периода с date_from по date_to включительно"""
+    return {
+        'date_from': date_from,
+        'date_to': date_to + timedelta(days=1) if date_to is not None else None,
+    }
@@ -0,0 +1,115 @@
+# services/reference_cache.py
+import threading
+from config.database import Database
+from services.notifications import get_change_listener
+
+# Канал уведомлений, в который пишут триггеры на справочных таблицах
+CHANNEL = 'reference_changed'
+
+# Справочник -> запрос загрузки (имя -> ID; для одинаковых ФИО берется меньший ID,
+# как и при поиске работника в add_repair)
+REFERENCE_QUERIES = {
+    'Работник': """
+    SELECT DISTINCT ON (ФИО) ФИО AS имя, ID_Работника AS id
+    FROM Работник
+    ORDER BY ФИО, ID_Работника
+    """,
+    'Неисправность': """
+    SELECT Тип_неисправности AS имя, ID_Неисправности AS id
+    FROM Неисправность
+    """,
+}
+
+
+class ReferenceCache:
+    """Кэш справочников (работники, типы неисправностей) в памяти процесса
+
+    Согласованность между процессами обеспечивается триггерами и LISTEN/NOTIFY:
+    пока слушающее соединение не установлено, кэш не используется и поиск идет в БД.
+    """
+
+    def __init__(self, db=None, listener=None):
+        self.db = db or Database()
+        self.listener = listener or get_change_listener()
+        self._lock = threading.Lock()
+        self._maps = {table: None for table in REFERENCE_QUERIES}
+        self._generation = {table: 0 for table in REFERENCE_QUERIES}
+        self._stats = {'hits': 0, 'misses': 0, 'loads': 0, 'invalidations': 0}
+        self.listener.subscribe(CHANNEL, self.invalidate)
+        self.listener.on_reset(self.invalidate)
+
+    @property
+    def active(self):
+        return self.listener.active
+
+    # ДАННЫЕ
+
+    def invalidate(self, table=None):
+        """Сброс справочника (или всех); загрузка произойдет при следующем обращении"""
+        with self._lock:
+            for name in REFERENCE_QUERIES:
+                if table is None or name.lower() == table.lower():
+                    self._maps[name] = None
+                    self._generation[name] += 1
+            self._stats['invalidations'] += 1
+
+    def _get_map(self, table):
+        with self._lock:
+            mapping = self._maps[table]
+            generation = self._generation[table]
+        if mapping is not None:
+            return mapping
+
+        rows = self.db.execute_query(REFERENCE_QUERIES[table], fetch=True, name=f"reference_{table}")
+        mapping = {row['имя']: row['id'] for row in rows}
+        with self._lock:
+            self._stats['loads'] += 1
+            # Если во время загрузки пришло уведомление, результат уже устарел
+            if self._generation[table] == generation:
+                self._maps[table] = mapping
+        return mapping
+
+    def _lookup(self, table, name):
+        if not self.active:
+            with self._lock:
+                self._stats['misses'] += 1
+            return None
+        value = self._get_map(table).get(name)
+        with self._lock:
+            self._stats['hits' if value is not None else 'misses'] += 1
+        return value
+
+    def get_worker_id(self, фио):
+        """ID работника по ФИО или None (неизвестен кэшу - искать в БД)"""
+        return self._lookup('Работник', фио)
+
+    def get_fault_id(self, тип_неисправности):
+        """ID неисправности по типу или None (неизвестна кэшу - искать в БД)"""
+        return self._lookup('Неисправность', тип_неисправности)
+
+    def refresh(self):
+        """Принудительная перезагрузка всех справочников"""
+        self.invalidate()
+        for table in REFERENCE_QUERIES:
+            self._get_map(table)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['sizes'] = {table: len(mapping) if mapping is not None else None
+                              for table, mapping in self._maps.items()}
+        stats['active'] = self.active
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_reference_cache():
+    """Общий для процесса кэш справочников"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ReferenceCache()
+        return _cache
@@ -0,0 +1,170 @@
+# services/report_cache.py
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+# Типы значений отчетов, которых нет в JSON: сохраняются как {"$type": ..., "value": строка}
+TYPE_KEY = '$type'
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {TYPE_KEY: 'datetime', 'value': value.isoformat()}
+    if isinstance(value, date):
+        return {TYPE_KEY: 'date', 'value': value.isoformat()}
+    if isinstance(value, time):
+        return {TYPE_KEY: 'time', 'value': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {TYPE_KEY: 'decimal', 'value': str(value)}
+    if isinstance(value, timedelta):
+        return {TYPE_KEY: 'timedelta', 'value': str(value.total_seconds())}
+    raise TypeError(f"Значение типа {type(value).__name__} не сохраняется в кэш отчетов")
+
+
+DECODERS = {
+    'datetime': datetime.fromisoformat,
+    'date': date.fromisoformat,
+    'time': time.fromisoformat,
+    'decimal': Decimal,
+    'timedelta': lambda value: timedelta(seconds=float(value)),
+}
+
+
+def _decode_object(obj):
+    if TYPE_KEY in obj and obj[TYPE_KEY] in DECODERS:
+        return DECODERS[obj[TYPE_KEY]](obj['value'])
+    return obj
+
+
+class ReportCache:
+    """Кэш результатов отчетов, привязанных к версии данных
+
+    Ключ - имя отчета и параметры; запись действительна, пока версия данных
+    (число изменений пяти таблиц, см. миграцию 0013) не изменилась. Если задан
+    directory, каждая запись сохраняется в отдельный JSON-файл и переживает перезапуск
+    программы. Файл пишется вне блокировки кэша, поэтому сохранение большого отчета
+    не задерживает чтение других.
+    """
+
+    def __init__(self, maxsize=32, directory=None, max_rows=50000):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._data = OrderedDict()      # (отчет, параметры) -> (версия, результат)
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0}
+        self._load()
+
+    def _file_path(self, key):
+        raw = json.dumps(key, default=_encode_value, ensure_ascii=False, sort_keys=True)
+        return os.path.join(self.directory, hashlib.sha1(raw.encode('utf-8')).hexdigest() + '.json')
+
+    def _load(self):
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f, object_hook=_decode_object)
+                key = (entry['report'], tuple(entry['params']))
+                entries.append((os.path.getmtime(path), key, entry['version'], entry['result']))
+            except (OSError, ValueError, KeyError, TypeError):
+                # Поврежденный или недописанный файл - запись просто не восстанавливается
+                continue
+        # Самые свежие записи - в конце, как после put; не поместившиеся удаляются
+        entries.sort(key=lambda entry: entry[0])
+        excess = max(len(entries) - self.maxsize, 0)
+        self._remove([key for _, key, _, _ in entries[:excess]])
+        for _, key, version, result in entries[excess:]:
+            self._data[key] = (version, result)
+
+    def _write(self, key, version, result):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._file_path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'report': key[0], 'params': list(key[1]), 'version': version, 'result': result},
+                          f, default=_encode_value, ensure_ascii=False)
+            os.replace(temp_path, path)
+        except (OSError, TypeError, ValueError):
+            # Кэш на диске необязателен: запись остается только в памяти
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def _remove(self, keys):
+        for key in keys:
+            try:
+                os.remove(self._file_path(key))
+            except OSError:
+                pass
+
+    def get(self, report, params, version):
+        """Результат отчета для данной версии данных или None"""
+        with self._lock:
+            item = self._data.get((report, params))
+            if item is None or item[0] != version:
+                self._stats['misses'] += 1
+                return None
+            self._data.move_to_end((report, params))
+            self._stats['hits'] += 1
+            return item[1]
+
+    def put(self, report, params, version, result):
+        key = (report, params)
+        evicted = []
+        with self._lock:
+            self._data[key] = (version, result)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                evicted.append(self._data.popitem(last=False)[0])
+            self._stats['stores'] += 1
+        if self.directory:
+            self._remove(evicted)
+            self._write(key, version, result)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+        if self.directory and os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith('.json'):
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except OSError:
+                        pass
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._data)
+        stats['maxsize'] = self.maxsize
+        stats['directory'] = self.directory
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_report_cache():
+    """Общий для процесса кэш отчетов"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ReportCache(
+                maxsize=int(os.getenv('REPORT_CACHE_SIZE', '32')),
+                directory=os.getenv('REPORT_CACHE_DIR') or None,
+                max_rows=int(os.getenv('REPORT_CACHE_MAX_ROWS', '50000'))
+            )
+        return _cache
@@ -0,0 +1,92 @@
+# services/rollups.py
+from config.database import Database
+
+# Сводка -> запрос расхождений между сводкой и исходными данными (ключ, факт, сводка)
+ROLLUP_CHECKS = {
+    'Сводка_марка_неисправность': """
+    WITH факт AS (
+        SELECT а.Марка, фр.ID_Неисправности, COUNT(*) AS n
+        FROM Факт_ремонта фр
+        JOIN Автомобиль а ON а.ID_Автомобиля = фр.ID_Автомобиля
+        GROUP BY а.Марка, фр.ID_Неисправности
+    )
+    SELECT COALESCE(ф.Марка, с.Марка) || ' / ' || COALESCE(ф.ID_Неисправности, с.ID_Неисправности) AS ключ,
+           ф.n AS факт, с.Количество AS сводка
+    FROM факт ф
+    FULL JOIN Итог_марка_неисправность с
+        ON с.Марка = ф.Марка AND с.ID_Неисправности = ф.ID_Неисправности
+    WHERE ф.n IS DISTINCT FROM с.Количество
+    """,
+    'Сводка_работник': """
+    WITH факт AS (
+        SELECT ID_Работника, COUNT(*) AS n FROM Факт_ремонта GROUP BY ID_Работника
+    )
+    SELECT COALESCE(ф.ID_Работника, с.ID_Работника)::text AS ключ, ф.n AS факт, с.Количество AS сводка
+    FROM факт ф
+    FULL JOIN Итог_работник с ON с.ID_Работника = ф.ID_Работника
+    WHERE ф.n IS DISTINCT FROM с.Количество
+    """,
+    'Сводка_день': """
+    WITH факт AS (
+        SELECT Время_устранения::date AS день, COUNT(*) AS n FROM Факт_ремонта GROUP BY Время_устранения::date
+    )
+    SELECT COALESCE(ф.день, с.День)::text AS ключ, ф.n AS факт, с.Ремонтов AS сводка
+    FROM факт ф
+    FULL JOIN Итог_день с ON с.День = ф.день
+    WHERE ф.n IS DISTINCT FROM с.Ремонтов
+    """,
+    'Сводка_автомобиль': """
+    WITH факт AS (
+        SELECT ID_Автомобиля, COUNT(*) AS n,
+               (array_agg(ID_Ремонта ORDER BY Время_устранения DESC, ID_Ремонта DESC))[1] AS последний
+        FROM Факт_ремонта
+        GROUP BY ID_Автомобиля
+    )
+    SELECT COALESCE(ф.ID_Автомобиля, с.ID_Автомобиля)::text AS ключ,
+           ф.n || ' (последний #' || ф.последний || ')' AS факт,
+           с.Ремонтов || ' (последний #' || с.ID_Последнего_ремонта || ')' AS сводка
+    FROM факт ф
+    FULL JOIN Сводка_автомобиль с ON с.ID_Автомобиля = ф.ID_Автомобиля
+    WHERE ф.n IS DISTINCT FROM с.Ремонтов OR ф.последний IS DISTINCT FROM с.ID_Последнего_ремонта
+    """,
+    'Сводка_станция': """
+    SELECT 'Автомобилей' AS ключ, ф.n AS факт, с.Автомобилей AS сводка
+    FROM (SELECT COUNT(DISTINCT ID_Автомобиля) AS n FROM Факт_ремонта) ф
+    LEFT JOIN Сводка_станция с ON TRUE
+    WHERE ф.n IS DISTINCT FROM с.Автомобилей
+    """,
+}
+
+
+class ReportRollups:
+    """Проверка и пересчет сводок отчета о работе станции (см. миграции 0008, 0017)
+
+    Сводки по маркам, работникам и дням проверяются через представления Итог_*,
+    то есть вместе с еще не перенесенными изменениями.
+    """
+
+    def __init__(self, db=None):
+        self.db = db or Database()
+
+    def check(self):
+        """Расхождения сводок с исходными данными: {сводка: [{'ключ', 'факт', 'сводка'}]}
+
+        Все сводки и Факт_ремонта читаются в одном снимке (REPEATABLE READ),
+        поэтому параллельные записи не дают ложных расхождений.
+        """
+        mismatches = {}
+        with self.db.transaction() as cursor:
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+            for table, query in ROLLUP_CHECKS.items():
+                cursor.execute(query)
+                mismatches[table] = cursor.fetchall()
+        return mismatches
+
+    def fold(self):
+        """Перенос накопленных изменений в сводки; возвращает число перенесенных строк"""
+        return self.db.execute_query("SELECT rollups_fold() AS folded", fetch=True,
+                                     name='rollups_fold')[0]['folded']
+
+    def rebuild(self):
+        """Полный пересчет сводок (запись ремонтов на это время блокируется)"""
+        self.db.execute_query("SELECT rollups_rebuild()", transaction=True, name='rollups_rebuild')
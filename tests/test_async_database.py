@@ -0,0 +1,98 @@
+# tests/test_async_database.py
+"""Асинхронный пул и AsyncAutoService на локальном PostgreSQL
+
+Тесты выполняются, только если задана строка подключения к тестовой базе:
+
+    TEST_DB_CONNINFO="dbname=auto_service_test user=postgres" python -m pytest tests
+
+Схема тестовой базы приводится к последней версии миграциями из models/migrations.
+"""
+import asyncio
+import os
+import pytest
+
+pytest.importorskip("pytest_asyncio")
+
+from psycopg_pool import PoolTimeout
+from config.async_database import AsyncDatabase
+from services.async_auto_service import AsyncAutoService
+
+CONNINFO = os.getenv('TEST_DB_CONNINFO')
+
+pytestmark = [
+    pytest.mark.skipif(not CONNINFO, reason="TEST_DB_CONNINFO не задан - тестовая база не настроена"),
+    pytest.mark.asyncio,
+]
+
+
+@pytest.fixture(scope="module", autouse=True)
+def migrated_schema():
+    """Схема тестовой базы в последней версии (миграции применяет синхронный Migrator)"""
+    from config.database import ConnectionPool, Database
+    from models.migrator import Migrator
+
+    pool = ConnectionPool(minconn=0, maxconn=2, dsn=CONNINFO)
+    try:
+        Migrator(Database(pool=pool, router=False)).migrate()
+    finally:
+        pool.closeall()
+
+
+@pytest.fixture
+def pool_env(monkeypatch):
+    """Размер и тайм-аут пула AsyncDatabase задаются теми же переменными, что и у Database"""
+    def configure(max_size, timeout=5.0):
+        monkeypatch.setenv('DB_POOL_MIN', '1')
+        monkeypatch.setenv('DB_POOL_MAX', str(max_size))
+        monkeypatch.setenv('DB_POOL_TIMEOUT', str(timeout))
+    return configure
+
+
+async def test_connection_is_returned_to_pool(pool_env):
+    pool_env(max_size=1)
+    async with AsyncDatabase(CONNINFO) as db:
+        # С одним соединением в пуле каждый следующий запрос ждал бы предыдущий до тайм-аута
+        for value in range(5):
+            result = await db.execute_query("SELECT %s::int AS value", (value,), fetch=True)
+            assert result == [{'value': value}]
+        assert db.pool.get_stats()['pool_available'] == 1
+
+
+async def test_transaction_rolls_back_on_error(pool_env):
+    pool_env(max_size=1)
+    async with AsyncDatabase(CONNINFO) as db:
+        with pytest.raises(Exception):
+            await db.execute_query("SELECT 1 / 0", transaction=True)
+        # Соединение вернулось в пул исправным, без незавершенной транзакции
+        assert await db.execute_query("SELECT 1 AS one", fetch=True) == [{'one': 1}]
+
+
+async def test_pool_timeout_when_exhausted(pool_env):
+    pool_env(max_size=1, timeout=0.3)
+    async with AsyncDatabase(CONNINFO) as db:
+        async with db.pool.connection():
+            started = asyncio.get_running_loop().time()
+            with pytest.raises(PoolTimeout):
+                await db.execute_query("SELECT 1", fetch=True)
+            assert asyncio.get_running_loop().time() - started < 2.0
+        assert await db.execute_query("SELECT 1 AS one", fetch=True) == [{'one': 1}]
+
+
+async def test_station_report(pool_env):
+    pool_env(max_size=4)
+    async with AsyncAutoService(AsyncDatabase(CONNINFO)) as service:
+        total_cars, repair_details, faults_by_brand, employee_stats = await service.get_station_report()
+        assert isinstance(total_cars, int)
+        assert isinstance(repair_details, list)
+        assert isinstance(faults_by_brand, list)
+        assert isinstance(employee_stats, list)
+
+
+async def test_queries_run_concurrently(pool_env):
+    pool_env(max_size=4)
+    async with AsyncDatabase(CONNINFO) as db:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await asyncio.gather(*[db.execute_query("SELECT pg_sleep(0.5)") for _ in range(4)])
+        # Четыре запроса по 0.5 с на четырех соединениях - заметно быстрее, чем подряд
+        assert loop.time() - started < 1.5
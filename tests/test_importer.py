@@ -0,0 +1,64 @@
+# tests/test_importer.py
+"""Нормализация строк файлов импорта (без базы данных)"""
+import csv
+import io
+from datetime import datetime, timedelta
+
+import pytest
+
+from services.importer import (_parse_chunk, normalize_license_plate, normalize_name, normalize_time,
+                               normalize_year)
+
+
+def test_normalize_name_collapses_spaces():
+    assert normalize_name("  Иванов   Сергей\tПетрович ", 'ФИО') == "Иванов Сергей Петрович"
+    assert normalize_name("   ", 'Адрес', required=False) is None
+    with pytest.raises(ValueError):
+        normalize_name("", 'ФИО')
+    with pytest.raises(ValueError):
+        normalize_name("х" * 51, 'Марка', 50)
+
+
+def test_normalize_license_plate_translates_latin():
+    # Латинские A, B, C, X и т. д. переводятся в одинаковые по написанию кириллические
+    assert normalize_license_plate(" a 123 bc 77 ") == "А123ВС77"
+    assert normalize_license_plate("Х999ХХ199") == "Х999ХХ199"
+    with pytest.raises(ValueError):
+        normalize_license_plate("Ж123ВС77")
+    with pytest.raises(ValueError):
+        normalize_license_plate("А12ВС77")
+
+
+def test_normalize_year():
+    assert normalize_year("2015") == 2015
+    with pytest.raises(ValueError):
+        normalize_year("двадцать")
+    with pytest.raises(ValueError):
+        normalize_year("1899")
+    with pytest.raises(ValueError):
+        normalize_year(str(datetime.now().year + 2))
+
+
+def test_normalize_time():
+    assert normalize_time("2024-03-01 10:15") == "2024-03-01 10:15:00"
+    assert normalize_time("  ") is None
+    with pytest.raises(ValueError):
+        normalize_time("01.03.2024")
+    with pytest.raises(ValueError):
+        normalize_time((datetime.now() + timedelta(days=1)).isoformat(sep=' '))
+
+
+def test_parse_chunk_accepts_and_rejects():
+    records = [
+        (2, ["a123bc77", "Лада", "2015", "АвтоВАЗ", "Иванов  Сергей"]),
+        (3, ["плохой", "Лада", "2015", "АвтоВАЗ", "Иванов"]),
+        (4, ["", " "]),
+        (5, ["В456ОР99", "Киа", "2020", "", "Петрова Анна"]),
+    ]
+    text, accepted, rejects = _parse_chunk('cars', records)
+    assert accepted == 2
+    assert [(line_no, row) for line_no, _, row in rejects] == [(3, records[1][1])]
+    rows = list(csv.reader(io.StringIO(text)))
+    assert rows[0] == ['2', 'А123ВС77', 'Лада', '2015', 'АвтоВАЗ', 'Иванов Сергей']
+    # Пустое необязательное поле - NULL в COPY
+    assert rows[1] == ['5', 'В456ОР99', 'Киа', '2020', '', 'Петрова Анна']
@@ -0,0 +1,127 @@
+# tests/test_log_index.py
+"""Индекс файла журнала, поиск по файлу и чтение последних строк"""
+import gzip
+
+from services.log_index import LogIndex, format_entry
+from services.log_reader import search_file, search_needle, tail_lines
+
+
+def entry(number, user='alice', action='LOGIN', details=''):
+    return {'ts': f"2026-01-01 {number % 24:02d}:15:00", 'user': user, 'action': action,
+            'details': details or f"запись {number}"}
+
+
+def write_entries(path, entries, fmt='text'):
+    with open(path, 'a', encoding='utf-8') as f:
+        for item in entries:
+            f.write(format_entry(item, fmt))
+
+
+def test_index_find_and_read(tmp_path):
+    path = str(tmp_path / "activity_2026-01-01.log")
+    write_entries(path, [entry(0), entry(1, 'bob'), entry(2, action='EDIT'), entry(13, 'bob', 'EDIT')])
+
+    index = LogIndex.open(path)
+    assert index.find(user='bob') == [1, 3]
+    assert index.find(user='bob', action='EDIT') == [3]
+    assert index.find(hour_from=1, hour_to=3) == [1, 2]
+    assert index.find(user='nobody') == []
+    assert [item['details'] for item in index.read(index.find(action='EDIT'))] == ["запись 2", "запись 13"]
+
+
+def test_index_appends_batches(tmp_path):
+    path = str(tmp_path / "activity_2026-01-01.jsonl")
+    write_entries(path, [entry(0), entry(1)], 'jsonl')
+    LogIndex.open(path)
+    with open(path + '.idx', 'rb') as f:
+        saved = f.read()
+
+    write_entries(path, [entry(2, 'bob')], 'jsonl')
+    index = LogIndex.open(path)
+    assert index.find(user='bob') == [2]
+    with open(path + '.idx', 'rb') as f:
+        data = f.read()
+    # Файл индекса дописывается: прежнее содержимое не меняется
+    assert data.startswith(saved) and len(data.splitlines()) == len(saved.splitlines()) + 1
+
+    reopened = LogIndex.open(path)
+    assert reopened.offsets == index.offsets
+    assert reopened.users == index.users
+
+
+def test_index_skips_partial_line_and_torn_sidecar(tmp_path):
+    path = str(tmp_path / "activity_2026-01-01.log")
+    write_entries(path, [entry(0)])
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write("2026-01-01 05:00:00 | bob")
+    index = LogIndex.open(path)
+    assert len(index.offsets) == 1
+
+    with open(path + '.idx', 'ab') as f:
+        f.write(b'{"from":')
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(" | LOGIN | \n")
+    index = LogIndex.open(path)
+    assert index.find(user='bob') == [1]
+    assert LogIndex.open(path).find(user='bob') == [1]
+
+
+def test_index_rebuilt_after_truncation(tmp_path):
+    path = str(tmp_path / "activity_2026-01-01.log")
+    write_entries(path, [entry(0), entry(1), entry(2)])
+    LogIndex.open(path)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(format_entry(entry(5, 'carol')))
+    index = LogIndex.open(path)
+    assert index.find() == [0]
+    assert index.find(user='carol') == [0]
+
+
+def test_search_file_text(tmp_path):
+    path = str(tmp_path / "activity_2026-01-01.log")
+    write_entries(path, [entry(0), entry(1, 'bob'), entry(2)])
+    found = list(search_file(path, search_needle(path, 'bob')))
+    assert [item['user'] for item in found] == ['bob']
+    assert len(list(search_file(path))) == 3
+
+
+def test_search_file_jsonl_escaped_needle(tmp_path):
+    path = str(tmp_path / "activity_2026-01-01.jsonl")
+    write_entries(path, [entry(0, details='путь C:\\tmp'), entry(1, details='name="X"'), entry(2)], 'jsonl')
+    assert [item['details'] for item in search_file(path, search_needle(path, 'name="X"'))] == ['name="X"']
+    assert [item['details'] for item in search_file(path, search_needle(path, 'C:\\tmp'))] == ['путь C:\\tmp']
+
+
+def test_search_needle_for_field_boundaries(tmp_path):
+    path = str(tmp_path / "activity_2026-01-01.jsonl")
+    # Подстрока текстового вида записи через границу полей в JSON не найдется
+    assert search_needle(path, 'alice | LOGIN') is None
+    assert search_needle(path, 'alice ') is None
+    assert search_needle(str(tmp_path / "activity_2026-01-01.log"), 'alice | LOGIN') == 'alice | LOGIN'.encode()
+
+
+def test_search_file_compressed(tmp_path):
+    path = str(tmp_path / "activity_2026-01-01.jsonl")
+    write_entries(path, [entry(0), entry(1, 'bob')], 'jsonl')
+    with open(path, 'rb') as source, gzip.open(path + '.gz', 'wb') as target:
+        target.write(source.read())
+    found = list(search_file(path + '.gz', search_needle(path + '.gz', 'bob')))
+    assert [item['user'] for item in found] == ['bob']
+
+
+def test_tail_lines(tmp_path):
+    path = str(tmp_path / "activity_2026-01-01.log")
+    lines = [f"строка {number}" for number in range(100)]
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+    # Маленький блок: чтение с конца в несколько шагов, в том числе посреди символа UTF-8
+    assert tail_lines(path, 3, block_size=7) == lines[-3:]
+    assert tail_lines(path, 500, block_size=64) == lines
+    assert tail_lines(path, 0) == []
+
+
+def test_tail_lines_compressed(tmp_path):
+    path = str(tmp_path / "activity_2026-01-01.log.gz")
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write("a\nb\nc\n")
+    assert tail_lines(path, 2) == ['b', 'c']
@@ -0,0 +1,53 @@
+# tests/test_migrator.py
+"""Разбор файлов миграций без базы данных: операторы и имена объектов"""
+from models.migrator import fold_identifier, split_statements
+
+
+def test_split_keeps_dollar_quoted_body():
+    sql = """
+    CREATE FUNCTION f() RETURNS integer AS $$
+    BEGIN
+        RETURN 1;
+    END;
+    $$ LANGUAGE plpgsql;
+    SELECT f();
+    """
+    statements = split_statements(sql)
+    assert len(statements) == 2
+    assert statements[0].startswith("CREATE FUNCTION f()")
+    assert statements[0].endswith("LANGUAGE plpgsql")
+    assert "RETURN 1;" in statements[0]
+    assert statements[1] == "SELECT f()"
+
+
+def test_split_keeps_tagged_dollar_quotes():
+    sql = "SELECT $sql$ a; $$ b; $sql$; SELECT 2"
+    assert split_statements(sql) == ["SELECT $sql$ a; $$ b; $sql$", "SELECT 2"]
+
+
+def test_split_ignores_semicolons_in_comments_and_strings():
+    sql = """
+    -- комментарий; не разделитель
+    SELECT ';' AS a, 'it''s; fine' AS b /* блок; комментария */;
+    SELECT "столбец;1" FROM t;
+    """
+    statements = split_statements(sql)
+    assert len(statements) == 2
+    assert "'it''s; fine'" in statements[0]
+    assert "/* блок; комментария */" in statements[0]
+    assert statements[1] == 'SELECT "столбец;1" FROM t'
+
+
+def test_split_drops_comment_only_statements():
+    sql = """
+    SELECT 1;
+    -- migrate: no-transaction
+    -- только комментарии
+    """
+    assert split_statements(sql) == ["SELECT 1"]
+
+
+def test_fold_identifier_lowers_only_latin():
+    assert fold_identifier("idx_Ремонт_Time") == "idx_Ремонт_time"
+    assert fold_identifier("Факт_ремонта") == "Факт_ремонта"
+    assert fold_identifier("ABC_xyz_09") == "abc_xyz_09"
@@ -0,0 +1,72 @@
+# tests/test_plan_advisor.py
+"""Подбор индексов и сравнение снимков планов (без базы данных)"""
+from services.plan_advisor import PlanAdvisor, merge_proposals
+
+
+def proposal(table, *columns):
+    return {'table': table, 'columns': list(columns), 'include': [], 'reason': '', 'ddl': ''}
+
+
+def summary(execution_ms=1.0, shape=("Index Scan on t",), hit=10, read=0):
+    return {'shape': list(shape), 'planning_ms': 0.1, 'execution_ms': execution_ms,
+            'total_cost': 1.0, 'rows': 1, 'shared_hit': hit, 'shared_read': read}
+
+
+def test_merge_drops_prefix_of_longer_key():
+    merged = merge_proposals([proposal('t', 'a'), proposal('t', 'a', 'b DESC'), proposal('u', 'a')])
+    assert [(item['table'], item['columns']) for item in merged] == [('t', ['a', 'b DESC']), ('u', ['a'])]
+
+
+def test_merge_keeps_first_of_duplicates():
+    first, second = proposal('t', 'a', 'b'), proposal('t', 'a', 'b DESC')
+    assert merge_proposals([first, second]) == [first]
+
+
+def test_merge_keeps_different_order():
+    proposals = [proposal('t', 'a', 'b'), proposal('t', 'b', 'a')]
+    assert merge_proposals(proposals) == proposals
+
+
+def test_propose_partitioned_table_builds_per_partition():
+    advisor = PlanAdvisor(db=object(), snapshot_dir='unused', min_rows=0)
+    schema = {
+        'tables': {'t': {'columns': ['id', 'a', 'b', 'c', 'd'], 'partitioned': True}},
+        'roots': {'t_2026_01': 't', 't_default': 't', 'other_1': 'other'},
+        'indexes': {},
+    }
+    result = advisor._propose('t', ['a'], ['b'], 'причина', schema)
+    assert result['statements'] == [
+        "CREATE INDEX IF NOT EXISTS idx_t_a ON ONLY t (a) INCLUDE (b)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_t_a_2026_01 ON t_2026_01 (a) INCLUDE (b)",
+        "ALTER INDEX idx_t_a ATTACH PARTITION idx_t_a_2026_01",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_t_a_default ON t_default (a) INCLUDE (b)",
+        "ALTER INDEX idx_t_a ATTACH PARTITION idx_t_a_default",
+    ]
+
+    schema['tables']['t']['partitioned'] = False
+    result = advisor._propose('t', ['a'], ['b'], 'причина', schema)
+    assert result['statements'] == ["CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_t_a ON t(a) INCLUDE (b)"]
+
+    schema['indexes']['t'] = [('idx_existing', ['a', 'c'])]
+    assert advisor._propose('t', ['a'], ['b'], 'причина', schema) is None
+
+
+def test_diff_reports_regressions():
+    old = {'same': summary(), 'slower': summary(2.0), 'seq': summary(), 'gone': summary()}
+    new = {'same': summary(1.2), 'slower': summary(10.0), 'seq': summary(shape=("Seq Scan on t",)),
+           'added': summary()}
+    report = {item['name']: item for item in PlanAdvisor.diff(old, new)}
+
+    assert 'same' not in report
+    assert report['slower']['regression'] and report['slower']['changes'] == ["время 2.00 -> 10.00 мс"]
+    assert report['seq']['regression']
+    assert "новые последовательные сканирования: Seq Scan on t" in report['seq']['changes']
+    assert report['gone']['changes'] == ['запрос удален'] and not report['gone']['regression']
+    assert report['added']['changes'] == ['новый запрос'] and report['added']['new_ms'] == 1.0
+
+
+def test_diff_blocks_threshold():
+    old = {'q': summary(hit=100)}
+    assert PlanAdvisor.diff(old, {'q': summary(hit=180)}) == []
+    report = PlanAdvisor.diff(old, {'q': summary(hit=400)})
+    assert report[0]['regression'] and report[0]['changes'] == ["блоков 100 -> 400"]
@@ -0,0 +1,41 @@
+# tests/test_query_stats.py
+"""Перцентили гистограммы задержек LatencyHistogram"""
+from config.query_stats import LatencyHistogram
+
+
+def test_empty_histogram():
+    assert LatencyHistogram().percentile(50) == 0
+
+
+def test_small_values_are_exact():
+    histogram = LatencyHistogram()
+    for micros in range(1, 11):
+        histogram.record(micros)
+    assert histogram.percentile(50) == 5
+    assert histogram.percentile(100) == 10
+    assert histogram.count == 10
+    assert histogram.total == 55
+
+
+def test_percentiles_within_relative_error():
+    histogram = LatencyHistogram()
+    values = list(range(1000, 101000, 100))
+    for micros in values:
+        histogram.record(micros)
+    error = 1 / 2 ** LatencyHistogram.SUB_BUCKET_BITS
+    for percent in (50, 90, 99):
+        exact = values[int(round(len(values) * percent / 100.0)) - 1]
+        assert abs(histogram.percentile(percent) - exact) <= exact * error
+
+
+def test_percentile_does_not_exceed_max():
+    histogram = LatencyHistogram()
+    histogram.record(1_000_003)
+    assert histogram.percentile(99) == 1_000_003
+    assert histogram.max == 1_000_003
+
+
+def test_negative_values_are_clamped():
+    histogram = LatencyHistogram()
+    histogram.record(-5)
+    assert histogram.percentile(50) == 0